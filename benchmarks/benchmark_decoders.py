@@ -0,0 +1,115 @@
+import argparse
+import json
+import math
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.pipeline_loader import MODEL_ID, load_pipeline
+from common.prompt_embeddings import PromptEmbeddingCache
+from common.prompts import FINAL_SET_PROMPTS
+from common.results_store import RESULTS_DB, ResultsStore
+from common.sampling import sample
+from common.stage_timer import StageTimer, host_info
+from common.tiny_vae import decode_tiny, tiny_vae_available
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def decode_full(pipe, latents):
+    return pipe.vae.decode(latents / pipe.vae.config.scaling_factor, return_dict=False)[0].clamp(-1.0, 1.0)
+
+
+def psnr(images, reference):
+    """PSNR in dB of images against reference, both in [-1, 1]"""
+    mse = (((images.float() - reference.float()) / 2.0) ** 2).mean().item()
+    return float("inf") if mse == 0 else 10 * math.log10(1.0 / mse)
+
+
+@torch.no_grad()
+def run_benchmark(pipe, latents, warmup=1, runs=3):
+    """Time both decoders on every latent; returns (timer summary, PSNR of tiny vs full per latent)"""
+    decoders = {"full_vae": lambda x: decode_full(pipe, x), "tiny_vae": decode_tiny}
+    timer = StageTimer(synchronize=torch.cuda.synchronize if pipe.device.type == "cuda" else None)
+    for decode in decoders.values():
+        for _ in range(warmup):
+            decode(latents[0])
+    timer.reset()
+
+    scores = []
+    for latent in latents:
+        decoded = {}
+        for _ in range(runs):
+            for name, decode in decoders.items():
+                with timer.stage(name):
+                    decoded[name] = decode(latent)
+        scores.append(psnr(decoded["tiny_vae"], decoded["full_vae"]))
+    return timer.summary(), scores
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Full SD VAE vs TAESD tiny decoder: latency and PSNR")
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=3, help="Timed decodes per latent and decoder")
+    parser.add_argument("--output", default=str(RESULTS_DIR / "decoders.json"))
+    args = parser.parse_args()
+
+    print("Full VAE vs Tiny Decoder (TAESD)")
+    print("="*60)
+    if not tiny_vae_available():
+        print("❌ TAESD weights not found; run: python -m common.tiny_vae")
+        sys.exit(1)
+
+    pipe = load_pipeline()
+    embedding_cache = PromptEmbeddingCache(pipe, MODEL_ID)
+    prompts = list(FINAL_SET_PROMPTS)
+
+    print(f"\nGenerating latents for {len(prompts)} prompts...")
+    latents = []
+    for seed, prompt in enumerate(prompts):
+        prompt_embeds, negative_prompt_embeds = embedding_cache.encode_pair(prompt)
+        latents.append(sample(pipe, prompt_embeds, negative_prompt_embeds, guidance_scales=[7.5], seeds=[seed],
+                              num_inference_steps=args.steps, output_type="latent").images)
+
+    print("Decoding...")
+    stages, scores = run_benchmark(pipe, latents, runs=args.runs)
+
+    results = {
+        "benchmark": "decoders",
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "host": host_info(),
+        "config": {"model_id": MODEL_ID, "profile": pipe.performance_profile, "num_steps": args.steps,
+                   "num_prompts": len(prompts), "runs": args.runs},
+        "stages": stages,
+        "speedup": stages["full_vae"]["p50"] / stages["tiny_vae"]["p50"],
+        "psnr_db": scores,
+        "mean_psnr_db": sum(scores) / len(scores),
+        "min_psnr_db": min(scores),
+    }
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    store = ResultsStore()
+    run_id = store.start_run("benchmark", "decoders", profile=pipe.performance_profile, host=results["host"],
+                             config=results["config"])
+    rows = []
+    for name, stats in stages.items():
+        for stat in ("p50", "p95", "max"):
+            rows.append(("stage_seconds", stats[stat], "s", "lower", {"stage": name, "stat": stat}))
+    rows.append(("psnr_db", results["mean_psnr_db"], "dB", "higher", None))
+    store.record_many(run_id, rows)
+    store.close()
+
+    print("\n" + "="*60)
+    print("RESULTS")
+    print("="*60)
+    for name, stats in stages.items():
+        print(f"  {name:9s}: p50 {stats['p50'] * 1000:7.1f}ms, p95 {stats['p95'] * 1000:7.1f}ms")
+    print(f"  Tiny decoder speedup: {results['speedup']:.1f}x")
+    print(f"  PSNR vs full VAE: mean {results['mean_psnr_db']:.2f} dB, min {results['min_psnr_db']:.2f} dB")
+    print(f"\n✓ Results saved to: {args.output}")
+    print(f"✓ Recorded as run #{run_id} in {RESULTS_DB}")
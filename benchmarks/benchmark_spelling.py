@@ -0,0 +1,70 @@
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.prompts import FINAL_SET_PROMPTS
+from common.spell_corrector import SpellCorrector
+
+
+def add_typos(prompt, rng, rate=0.3):
+    """Misspell roughly `rate` of the words (swap, drop or double a letter)"""
+    words = []
+    for word in prompt.split(" "):
+        if len(word) > 3 and rng.random() < rate:
+            i = rng.randrange(1, len(word) - 1)
+            kind = rng.choice(["swap", "drop", "double"])
+            if kind == "swap":
+                word = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+            elif kind == "drop":
+                word = word[:i] + word[i + 1:]
+            else:
+                word = word[:i] + word[i] + word[i:]
+        words.append(word)
+    return " ".join(words)
+
+
+def time_corrector(correct, prompts):
+    outputs = []
+    start_time = time.perf_counter()
+    for prompt in prompts:
+        outputs.append(correct(prompt))
+    return time.perf_counter() - start_time, outputs
+
+
+if __name__ == '__main__':
+    from textblob import TextBlob
+
+    print("Spell Correction Benchmark: TextBlob vs symmetric-delete corrector")
+    print("="*60)
+
+    rng = random.Random(0)
+    prompts = list(FINAL_SET_PROMPTS)
+    prompts += [add_typos(prompt, rng) for prompt in FINAL_SET_PROMPTS for _ in range(3)]
+    print(f"Prompts: {len(prompts)} ({len(FINAL_SET_PROMPTS)} clean + typo variants)\n")
+
+    build_start = time.perf_counter()
+    corrector = SpellCorrector()
+    build_seconds = time.perf_counter() - build_start
+    print(f"Index build (one-time): {build_seconds:.2f}s\n")
+
+    textblob_seconds, textblob_outputs = time_corrector(lambda p: str(TextBlob(p).correct()), prompts)
+    cold_seconds, fast_outputs = time_corrector(corrector.correct, prompts)
+    warm_seconds, _ = time_corrector(corrector.correct, prompts)
+
+    agreement = sum(a.split() == b.split() for a, b in zip(textblob_outputs, fast_outputs)) / len(prompts)
+
+    print("="*60)
+    print("RESULTS (per prompt)")
+    print("="*60)
+    print(f"  TextBlob.correct():     {textblob_seconds / len(prompts) * 1000:8.2f} ms")
+    print(f"  SpellCorrector (cold):  {cold_seconds / len(prompts) * 1000:8.2f} ms "
+          f"({textblob_seconds / cold_seconds:.0f}x faster)")
+    print(f"  SpellCorrector (warm):  {warm_seconds / len(prompts) * 1000:8.2f} ms "
+          f"({textblob_seconds / warm_seconds:.0f}x faster)")
+    print(f"  Same words as TextBlob: {agreement:.0%}")
+
+    print("\nSample corrections:")
+    for prompt, fixed in list(zip(prompts, fast_outputs))[len(FINAL_SET_PROMPTS):len(FINAL_SET_PROMPTS) + 5]:
+        print(f"  '{prompt}'\n    → '{fixed}'")
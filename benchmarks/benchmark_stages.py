@@ -0,0 +1,125 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.image_writer import encode_image
+from common.pipeline_loader import load_pipeline
+from common.prompts import FINAL_SET_PROMPTS
+from common.results_store import RESULTS_DB, ResultsStore
+from common.sampling import sample
+from common.stage_timer import StageTimer, host_info, peak_rss_mb
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def run_once(pipe, prompt, seed, num_steps, cfg_scale, timer, guidance_interval=None):
+    """One timed generation: text encoding, denoising, decode, safety check, PNG encoding"""
+    with timer.stage("total"):
+        with timer.stage("text_encoding"):
+            # Encoded directly (no embedding cache) so the encoder cost is measured every run
+            prompt_embeds, negative_prompt_embeds = pipe.encode_prompt(prompt, pipe.device, 1, True, "")
+        output = sample(pipe, prompt_embeds, negative_prompt_embeds, guidance_scales=[cfg_scale], seeds=[seed],
+                        num_inference_steps=num_steps, guidance_interval=guidance_interval, timer=timer)
+        with timer.stage("png_encode"):
+            encode_image(output.images[0], "png")
+
+
+def store_results(results):
+    """Record per-stage percentiles, throughput and peak RSS in the results store"""
+    store = ResultsStore()
+    config = results["config"]
+    run_id = store.start_run("benchmark", "stages", profile=config["profile"], host=results["host"], config=config)
+    rows = []
+    for name, stats in results["stages"].items():
+        for stat in ("p50", "p95", "max"):
+            rows.append(("stage_seconds", stats[stat], "s", "lower", {"stage": name, "stat": stat}))
+    rows.append(("images_per_minute", results["images_per_minute"], "img/min", "higher", None))
+    if results["peak_rss_mb"] is not None:
+        rows.append(("peak_rss_mb", results["peak_rss_mb"], "MB", "lower", None))
+    store.record_many(run_id, rows)
+    store.close()
+    return run_id
+
+
+def run_benchmark(pipe, prompts, num_steps=20, cfg_scale=7.5, warmup=2, runs=5, guidance_interval=None):
+    """Warm up, then time `runs` generations per prompt with fixed seeds"""
+    synchronize = torch.cuda.synchronize if pipe.device.type == "cuda" else None
+    timer = StageTimer(synchronize=synchronize)
+
+    for i in range(warmup):
+        run_once(pipe, prompts[0], i, num_steps, cfg_scale, timer, guidance_interval)
+    timer.reset()
+
+    for run in range(runs):
+        for seed, prompt in enumerate(prompts):
+            run_once(pipe, prompt, seed, num_steps, cfg_scale, timer, guidance_interval)
+        print(f"  Run {run + 1}/{runs}: {timer.samples['total'][-1]:.1f}s (last image)")
+
+    stages = timer.summary()
+    return {
+        "benchmark": "stages",
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "host": host_info(),
+        "config": {
+            "profile": pipe.performance_profile,
+            "active_features": pipe.active_features,
+            "scheduler": type(pipe.scheduler).__name__,
+            "num_steps": num_steps,
+            "cfg_scale": cfg_scale,
+            "guidance_interval": guidance_interval,
+            "num_prompts": len(prompts),
+            "warmup": warmup,
+            "runs": runs,
+        },
+        "stages": stages,
+        "images_per_minute": 60.0 / stages["total"]["mean"],
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Stage-level generation benchmark")
+    parser.add_argument("--profile", default=None, help="Performance profile (default: T2I_PROFILE)")
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--cfg", type=float, default=7.5)
+    parser.add_argument("--prompts", type=int, default=3, help="Number of final-set prompts per run")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--guidance-interval", type=float, default=None,
+                        help="Apply CFG only to this fraction of the steps (default: all)")
+    parser.add_argument("--output", default=None, help="JSON output path")
+    args = parser.parse_args()
+
+    print("Stage-Level Generation Benchmark")
+    print("="*60)
+
+    # The loader's own warm-up is skipped; run_benchmark does its own warm-up runs
+    pipe = load_pipeline(args.profile, warmup=False)
+    results = run_benchmark(pipe, FINAL_SET_PROMPTS[:args.prompts], args.steps, args.cfg, args.warmup, args.runs,
+                            args.guidance_interval)
+
+    output = Path(args.output) if args.output else \
+        RESULTS_DIR / f"stages_{pipe.performance_profile}_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print("\n" + "="*60)
+    interval = results["config"]["guidance_interval"]
+    guidance = f", CFG for the first {interval:.0%} of steps" if interval is not None else ""
+    print(f"RESULTS ({results['config']['profile']}, {results['host']['torch_num_threads']} threads{guidance})")
+    print("="*60)
+    print(f"  {'stage':16s} {'count':>6s} {'p50':>9s} {'p95':>9s} {'max':>9s}")
+    for name, stats in results["stages"].items():
+        print(f"  {name:16s} {stats['count']:6d} {stats['p50'] * 1000:7.1f}ms "
+              f"{stats['p95'] * 1000:7.1f}ms {stats['max'] * 1000:7.1f}ms")
+    print(f"\n  Images/minute: {results['images_per_minute']:.2f}")
+    if results["peak_rss_mb"] is not None:
+        print(f"  Peak RSS:      {results['peak_rss_mb']:.0f} MB")
+    print(f"\n✓ Results saved to: {output}")
+    print(f"✓ Recorded as run #{store_results(results)} in {RESULTS_DB}")
@@ -0,0 +1,95 @@
+import argparse
+import sys
+from pathlib import Path
+
+import torch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.deep_cache import DeepCache, unet_flops
+from common.pipeline_loader import MODEL_ID, load_pipeline
+from common.prompt_embeddings import PromptEmbeddingCache
+from common.prompts import FINAL_SET_PROMPTS
+from feature_eval import RESULTS_DIR, generate_run, new_results, print_saved, save_results, score_runs
+
+
+def step_flops(pipe, embedding_cache, prompt):
+    """FLOPs of a full and of a cached (shallow) UNet step for one CFG image pair"""
+    prompt_embeds, negative_prompt_embeds = embedding_cache.encode_pair(prompt)
+    hidden_states = torch.cat([negative_prompt_embeds, prompt_embeds]).to(pipe.device)
+    latents = torch.randn(2, pipe.unet.config.in_channels, 64, 64, dtype=prompt_embeds.dtype, device=pipe.device)
+    timestep = pipe.scheduler.config.num_train_timesteps // 2
+    with torch.no_grad(), DeepCache(pipe.unet) as cache:
+        cache(0, latents, timestep, hidden_states)  # fills the deep features
+        full = unet_flops(pipe.unet, latents, timestep, hidden_states)
+        shallow = unet_flops(pipe.unet, latents, timestep, hidden_states, cache.features)
+    return full, shallow
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Speed and quality of DeepCache feature reuse against full UNet steps")
+    parser.add_argument("--intervals", type=int, nargs="+", default=[2, 3, 5])
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--cfg", type=float, default=7.5)
+    parser.add_argument("--output", default=str(RESULTS_DIR / "deep_cache.json"))
+    args = parser.parse_args()
+
+    print("DeepCache Feature Reuse vs Full UNet Steps")
+    print("="*60)
+
+    pipe = load_pipeline()
+    embedding_cache = PromptEmbeddingCache(pipe, MODEL_ID)
+    prompts = list(FINAL_SET_PROMPTS)
+
+    full_flops, shallow_flops = step_flops(pipe, embedding_cache, prompts[0])
+    print(f"UNet step: {full_flops / 1e12:.2f} TFLOPs full, {shallow_flops / 1e12:.2f} TFLOPs cached "
+          f"({shallow_flops / full_flops:.1%})")
+
+    runs = {}
+    for interval in [None] + args.intervals:
+        print(f"\n{'Full UNet every step' if interval is None else f'Full UNet every {interval} steps'}...")
+        runs[interval] = generate_run(pipe, embedding_cache, prompts, args.steps, args.cfg,
+                                      deep_cache_interval=interval)
+    profile = pipe.performance_profile
+
+    pipe = embedding_cache = None
+    quality = score_runs(runs, prompts, baseline=None)
+    baseline_seconds = runs[None].seconds_per_image
+
+    results = new_results("deep_cache", profile, prompts, args.steps, args.cfg)
+    results["unet_flops"] = {"full_step": full_flops, "cached_step": shallow_flops}
+    for interval, run in runs.items():
+        mean_cached = run.mean("cached_steps")
+        # The sampler makes one UNet call per scheduler timestep (21 for 20 PNDM steps)
+        mean_calls = run.mean("unet_calls")
+        seconds = run.seconds_per_image
+        results["runs"].append({
+            "interval": interval,
+            "mean_cached_steps": mean_cached,
+            "mean_unet_calls": mean_calls,
+            # Per image, for its CFG pair
+            "unet_flops_skipped": mean_cached * (full_flops - shallow_flops),
+            "unet_flops_skipped_fraction": mean_cached * (full_flops - shallow_flops) / (mean_calls * full_flops),
+            "seconds_per_image": seconds,
+            "seconds_saved_per_image": baseline_seconds - seconds,
+            "speedup": baseline_seconds / seconds,
+            **quality[interval],
+        })
+
+    rows = []
+    for run in results["runs"]:
+        params = {"deep_cache": run["interval"]}
+        rows.append(("seconds_per_image", run["seconds_per_image"], "s", "lower", params))
+        rows.append(("unet_flops_skipped_fraction", run["unet_flops_skipped_fraction"], None, "higher", params))
+        rows.append(("clip_score", run["mean_clip"], None, "higher", params))
+    run_id = save_results(results, args.output, rows)
+
+    print("\n" + "="*60)
+    print("RESULTS")
+    print("="*60)
+    for run in results["runs"]:
+        label = "every step" if run["interval"] is None else f"every {run['interval']} steps"
+        print(f"  Full UNet {label:14s}: {run['seconds_per_image']:6.1f}s/image "
+              f"(saved {run['seconds_saved_per_image']:5.1f}s, {run['speedup']:.2f}x), "
+              f"UNet FLOPs skipped {run['unet_flops_skipped_fraction']:5.1%}, "
+              f"CLIP {run['mean_clip']:.2f}, similarity to full {run['mean_image_similarity']:.3f}")
+    print_saved(args.output, run_id)
@@ -0,0 +1,66 @@
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.pipeline_loader import MODEL_ID, load_pipeline
+from common.prompt_embeddings import PromptEmbeddingCache
+from common.prompts import FINAL_SET_PROMPTS
+from feature_eval import RESULTS_DIR, generate_run, new_results, print_saved, save_results, score_runs
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Validate adaptive early exit against fixed-step outputs")
+    parser.add_argument("--steps", type=int, default=20, help="Fixed step count (maximum for adaptive runs)")
+    parser.add_argument("--cfg", type=float, default=7.5)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.01, 0.02, 0.05])
+    parser.add_argument("--output", default=str(RESULTS_DIR / "early_exit.json"))
+    args = parser.parse_args()
+
+    print("Adaptive Early Exit vs Fixed Steps")
+    print("="*60)
+
+    pipe = load_pipeline()
+    embedding_cache = PromptEmbeddingCache(pipe, MODEL_ID)
+    prompts = list(FINAL_SET_PROMPTS)
+
+    runs = {}
+    for threshold in [None] + args.thresholds:
+        print(f"\nFixed {args.steps} steps..." if threshold is None else f"\nAdaptive, threshold {threshold}...")
+        runs[threshold] = generate_run(pipe, embedding_cache, prompts, args.steps, args.cfg,
+                                       early_exit_threshold=threshold)
+    profile = pipe.performance_profile
+
+    pipe = embedding_cache = None
+    quality = score_runs(runs, prompts, baseline=None)
+
+    results = new_results("early_exit", profile, prompts, args.steps, args.cfg)
+    for threshold, run in runs.items():
+        steps_used = [steps for output in run.outputs for steps in output.steps_used]
+        results["runs"].append({
+            "threshold": threshold,
+            "mean_steps": sum(steps_used) / len(steps_used),
+            "steps_used": steps_used,
+            "seconds_per_image": run.seconds_per_image,
+            **quality[threshold],
+            "clip_drop": quality[None]["mean_clip"] - quality[threshold]["mean_clip"],
+        })
+
+    rows = []
+    for run in results["runs"]:
+        # The fixed-step baseline is {"early_exit_threshold": None}, like the other scripts' baselines
+        params = {"early_exit_threshold": run["threshold"]}
+        rows.append(("seconds_per_image", run["seconds_per_image"], "s", "lower", params))
+        rows.append(("steps_used", run["mean_steps"], "steps", "lower", params))
+        rows.append(("clip_score", run["mean_clip"], None, "higher", params))
+    run_id = save_results(results, args.output, rows)
+
+    print("\n" + "="*60)
+    print("RESULTS")
+    print("="*60)
+    for run in results["runs"]:
+        label = f"Fixed {args.steps:2d} steps" if run["threshold"] is None else f"Threshold {run['threshold']:<6}"
+        print(f"  {label:16s}: {run['mean_steps']:4.1f} steps, {run['seconds_per_image']:6.1f}s/image, "
+              f"CLIP {run['mean_clip']:.2f} (drop {run['clip_drop']:+.2f}), "
+              f"similarity to fixed {run['mean_image_similarity']:.3f} (min {run['min_image_similarity']:.3f})")
+    print_saved(args.output, run_id)
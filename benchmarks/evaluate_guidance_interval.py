@@ -0,0 +1,74 @@
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.pipeline_loader import MODEL_ID, load_pipeline
+from common.prompt_embeddings import PromptEmbeddingCache
+from common.prompts import FINAL_SET_PROMPTS
+from feature_eval import RESULTS_DIR, generate_run, new_results, print_saved, save_results, score_runs
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Speed vs CLIP score of CFG limited to the early steps")
+    parser.add_argument("--intervals", type=float, nargs="+", default=[0.8, 0.6, 0.4])
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--cfg", type=float, default=7.5)
+    parser.add_argument("--output", default=str(RESULTS_DIR / "guidance_interval.json"))
+    args = parser.parse_args()
+
+    print("Guidance Interval vs CFG on Every Step")
+    print("="*60)
+
+    pipe = load_pipeline()
+    embedding_cache = PromptEmbeddingCache(pipe, MODEL_ID)
+    prompts = list(FINAL_SET_PROMPTS)
+
+    runs = {}
+    for interval in [None] + args.intervals:
+        print(f"\nCFG on {'every step' if interval is None else f'first {interval:.0%} of steps'}...")
+        runs[interval] = generate_run(pipe, embedding_cache, prompts, args.steps, args.cfg,
+                                      guidance_interval=interval)
+    profile = pipe.performance_profile
+
+    pipe = embedding_cache = None
+    quality = score_runs(runs, prompts, baseline=None)
+    baseline_seconds = runs[None].seconds_per_image
+    # Counts come from the sampler, which steps over every scheduler timestep (21 for 20 PNDM steps)
+    baseline_rows = runs[None].mean("unet_rows")
+
+    results = new_results("guidance_interval", profile, prompts, args.steps, args.cfg)
+    for interval, run in runs.items():
+        seconds = run.seconds_per_image
+        results["runs"].append({
+            "guidance_interval": interval,
+            "unet_calls": run.mean("unet_calls"),
+            "guided_steps": run.mean("guided_steps"),
+            # Each unguided step evaluates the UNet on one row instead of two
+            "unet_rows": run.mean("unet_rows"),
+            "unet_rows_saved_fraction": 1 - run.mean("unet_rows") / baseline_rows,
+            "seconds_per_image": seconds,
+            "speedup": baseline_seconds / seconds,
+            **quality[interval],
+            "clip_drop": quality[None]["mean_clip"] - quality[interval]["mean_clip"],
+        })
+
+    rows = []
+    for run in results["runs"]:
+        params = {"guidance_interval": run["guidance_interval"]}
+        rows.append(("seconds_per_image", run["seconds_per_image"], "s", "lower", params))
+        rows.append(("clip_score", run["mean_clip"], None, "higher", params))
+    run_id = save_results(results, args.output, rows)
+
+    print("\n" + "="*60)
+    print("RESULTS")
+    print("="*60)
+    for run in results["runs"]:
+        interval = run["guidance_interval"]
+        label = "all steps" if interval is None else f"first {interval:.0%}"
+        print(f"  CFG on {label:10s} ({run['guided_steps']:4.1f}/{run['unet_calls']:.0f} UNet calls, "
+              f"{run['unet_rows_saved_fraction']:4.0%} fewer rows): "
+              f"{run['seconds_per_image']:6.1f}s/image ({run['speedup']:.2f}x), "
+              f"CLIP {run['mean_clip']:.2f} (drop {run['clip_drop']:+.2f}), "
+              f"similarity to full CFG {run['mean_image_similarity']:.3f}")
+    print_saved(args.output, run_id)
@@ -0,0 +1,90 @@
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.fid_stats import fid_against
+from common.image_writer import ImageWriter
+from common.pipeline_loader import MODEL_ID, load_pipeline
+from common.prompt_embeddings import PromptEmbeddingCache
+from common.prompts import FINAL_SET_PROMPTS
+from common.token_merging import apply_token_merging
+from feature_eval import RESULTS_DIR, generate_run, new_results, print_saved, save_results, score_runs
+
+REFERENCE_IMAGES = Path(__file__).resolve().parent.parent / "milestone3" / "reference_images_resized"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Speed and quality of token merging (ToMe) against no merging")
+    parser.add_argument("--ratios", type=float, nargs="+", default=[0.3, 0.5, 0.7])
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--cfg", type=float, default=7.5)
+    parser.add_argument("--reference", default=str(REFERENCE_IMAGES),
+                        help="Reference photos for FID (skipped if the folder is missing)")
+    parser.add_argument("--output", default=str(RESULTS_DIR / "token_merging.json"))
+    args = parser.parse_args()
+
+    print("Token Merging (ToMe) vs No Merging")
+    print("="*60)
+
+    pipe = load_pipeline()
+    embedding_cache = PromptEmbeddingCache(pipe, MODEL_ID)
+    prompts = list(FINAL_SET_PROMPTS)
+    image_root = RESULTS_DIR / "token_merging"
+
+    runs, image_dirs = {}, {}
+    with ImageWriter("png") as writer:
+        for ratio in [0.0] + args.ratios:
+            print(f"\nRatio {ratio} on {len(prompts)} prompts...")
+            apply_token_merging(pipe, ratio)
+            runs[ratio] = generate_run(pipe, embedding_cache, prompts, args.steps, args.cfg)
+            image_dirs[ratio] = image_root / f"ratio_{ratio}"
+            for i, image in enumerate(runs[ratio].images):
+                writer.submit(image, image_dirs[ratio] / f"image_{i:02d}.png",
+                              metadata={"prompt": prompts[i], "seed": i, "token_merging": ratio})
+    apply_token_merging(pipe, 0.0)
+    profile = pipe.performance_profile
+
+    pipe = embedding_cache = None
+    quality = score_runs(runs, prompts, baseline=0.0)
+
+    reference = Path(args.reference)
+    compute_fid = reference.is_dir() and len(list(reference.glob("*.jpg"))) >= 2
+    if not compute_fid:
+        print(f"\n⚠️ No reference images in {reference}; FID skipped")
+
+    results = new_results("token_merging", profile, prompts, args.steps, args.cfg,
+                          reference=str(reference) if compute_fid else None)
+    for ratio, run in runs.items():
+        results["runs"].append({
+            "ratio": ratio,
+            "seconds_per_image": run.seconds_per_image,
+            **quality[ratio],
+            "fid": fid_against(image_dirs[ratio], reference) if compute_fid else None,
+        })
+
+    base = results["runs"][0]
+    for run in results["runs"]:
+        run["speedup"] = base["seconds_per_image"] / run["seconds_per_image"]
+        run["clip_change"] = run["mean_clip"] - base["mean_clip"]
+        run["fid_change"] = run["fid"] - base["fid"] if compute_fid else None
+
+    rows = []
+    for run in results["runs"]:
+        params = {"token_merging": run["ratio"]}
+        rows.append(("seconds_per_image", run["seconds_per_image"], "s", "lower", params))
+        rows.append(("clip_score", run["mean_clip"], None, "higher", params))
+        if run["fid"] is not None:
+            rows.append(("fid", run["fid"], None, "lower", params))
+    run_id = save_results(results, args.output, rows)
+
+    print("\n" + "="*60)
+    print("RESULTS")
+    print("="*60)
+    for run in results["runs"]:
+        fid = f", FID {run['fid']:.1f} ({run['fid_change']:+.1f})" if run["fid"] is not None else ""
+        print(f"  Ratio {run['ratio']:<4}: {run['seconds_per_image']:6.1f}s/image ({run['speedup']:.2f}x), "
+              f"CLIP {run['mean_clip']:.2f} ({run['clip_change']:+.2f}), "
+              f"similarity to unmerged {run['mean_image_similarity']:.3f}{fid}")
+    print("\nFID on 10 images is noisy; compare the change between ratios, not the absolute value.")
+    print_saved(args.output, run_id)
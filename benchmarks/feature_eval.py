@@ -0,0 +1,115 @@
+"""
+Shared harness of the evaluate_*.py feature benchmarks.
+
+Each benchmark generates the final-set prompts (seed = prompt index) once per
+setting of one feature, then compares every setting against a baseline run on
+time, CLIP score and CLIP image similarity. The results are written as JSON
+under benchmarks/results/ and recorded in the results store. Only the
+per-feature arguments and summaries live in the scripts themselves.
+"""
+
+import json
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.clip_scoring import ClipScorer, load_clip
+from common.pipeline_loader import MODEL_ID
+from common.results_store import RESULTS_DB, ResultsStore
+from common.sampling import sample
+from common.stage_timer import host_info
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+@dataclass
+class Run:
+    """Images of one setting plus per-image seconds and sampler outputs"""
+    images: list = field(default_factory=list)
+    seconds: list = field(default_factory=list)
+    outputs: list = field(default_factory=list)
+
+    @property
+    def seconds_per_image(self):
+        return sum(self.seconds) / len(self.seconds)
+
+    def mean(self, attribute):
+        """Mean of a SampleOutput count (e.g. cached_steps) over the images"""
+        return sum(getattr(output, attribute) for output in self.outputs) / len(self.outputs)
+
+
+def generate_run(pipe, embedding_cache, prompts, num_steps, cfg_scale, warmup=True, **sample_kwargs):
+    """One image per prompt (seed = prompt index), each timed on its own"""
+    if warmup:
+        # Short untimed run with the same settings, so no setting (least of all the
+        # first, the baseline) is timed with first-call allocation costs
+        prompt_embeds, negative_prompt_embeds = embedding_cache.encode_pair(prompts[0])
+        sample(pipe, prompt_embeds, negative_prompt_embeds, guidance_scales=[cfg_scale], seeds=[0],
+               num_inference_steps=2, **sample_kwargs)
+
+    run = Run()
+    for seed, prompt in enumerate(prompts):
+        prompt_embeds, negative_prompt_embeds = embedding_cache.encode_pair(prompt)
+        start_time = time.perf_counter()
+        output = sample(pipe, prompt_embeds, negative_prompt_embeds, guidance_scales=[cfg_scale], seeds=[seed],
+                        num_inference_steps=num_steps, **sample_kwargs)
+        run.seconds.append(time.perf_counter() - start_time)
+        run.images += output.images
+        run.outputs.append(output)
+    print(f"  {run.seconds_per_image:.1f}s/image")
+    return run
+
+
+def score_runs(runs, prompts, baseline):
+    """CLIP score of every run and image similarity to the baseline run, keyed like runs
+
+    Load the diffusion model only around generation: callers drop their pipeline
+    references before this loads CLIP, so both models are never resident at once.
+    """
+    model, processor = load_clip()
+    scorer = ClipScorer(model, processor)
+    baseline_features = scorer.image_features(runs[baseline].images)
+    scores = {}
+    for key, run in runs.items():
+        clip = scorer.score_pairs(run.images, prompts)
+        # Cosine similarity of each image with its baseline counterpart
+        similarity = (scorer.image_features(run.images) * baseline_features).sum(dim=-1).tolist()
+        scores[key] = {
+            "mean_clip": sum(clip) / len(clip),
+            "mean_image_similarity": sum(similarity) / len(similarity),
+            "min_image_similarity": min(similarity),
+        }
+    return scores
+
+
+def new_results(name, profile, prompts, num_steps, cfg_scale, **config):
+    """Results skeleton shared by the feature benchmarks"""
+    return {
+        "benchmark": name,
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "host": host_info(),
+        "config": {"model_id": MODEL_ID, "profile": profile, "num_steps": num_steps, "cfg_scale": cfg_scale,
+                   "num_prompts": len(prompts), **config},
+        "runs": [],
+    }
+
+
+def save_results(results, output, rows):
+    """Write the JSON file and record the rows as one results-store run; returns the run id"""
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    store = ResultsStore()
+    run_id = store.start_run("benchmark", results["benchmark"], profile=results["config"]["profile"],
+                             host=results["host"], config=results["config"])
+    store.record_many(run_id, rows)
+    store.close()
+    return run_id
+
+
+def print_saved(output, run_id):
+    print(f"\n✓ Results saved to: {output}")
+    print(f"✓ Recorded as run #{run_id} in {RESULTS_DB}")
@@ -0,0 +1 @@
+"""Shared helpers used by the milestone scripts and the demo."""
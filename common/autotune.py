@@ -0,0 +1,210 @@
+"""
+Throughput autotuner for CPU generation settings.
+
+Searches torch threads, inter-op threads, OpenMP affinity and batch size on
+this machine with the real pipeline. The search is a bounded coordinate
+descent: each knob is tuned in turn while the others keep their best value
+so far. Every trial runs in a fresh process, because OpenMP only reads its
+environment at start-up. A trial loads the profile's (memory-mapped) pipeline,
+runs one untimed warm-up and then times short generations. The fastest
+setting by images per minute is written to host_profiles/<hostname>.json,
+which load_pipeline() applies automatically (see common/host_profile.py).
+
+    python -m common.autotune                       # default profile, 8-step probes
+    python -m common.autotune --max-trials 6 --steps 4
+"""
+
+import argparse
+import multiprocessing
+import os
+import queue
+import time
+import traceback
+from contextlib import contextmanager
+
+from common.host_profile import AFFINITY_SETTINGS, environment_for, save_host_profile
+from common.parallel_generation import available_cores, ensure_snapshot
+from common.stage_timer import host_info, percentile
+
+DEFAULT_CONFIG = {"num_threads": None, "num_interop_threads": 1, "affinity": "none", "batch_size": 1}
+BATCH_SIZES = (1, 2, 4)
+INTEROP_THREADS = (1, 2)
+# How often a waiting trial checks that its subprocess is still alive
+LIVENESS_POLL_SECONDS = 5.0
+
+
+def thread_candidates(num_cores):
+    """All cores, half and a quarter of them (distinct, at least 1)"""
+    return sorted({max(num_cores // divisor, 1) for divisor in (1, 2, 4)}, reverse=True)
+
+
+@contextmanager
+def child_environment(values):
+    """Temporarily set environment variables so a spawned child inherits them"""
+    previous = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                del os.environ[name]
+            else:
+                os.environ[name] = value
+
+
+def _trial(config, profile, prompt, num_steps, repeats, results):
+    try:
+        import torch
+
+        from common.pipeline_loader import MODEL_ID, load_pipeline
+        from common.prompt_embeddings import PromptEmbeddingCache
+        from common.sampling import sample
+
+        torch.set_num_threads(config["num_threads"])
+        torch.set_num_interop_threads(config["num_interop_threads"])
+        pipe = load_pipeline(profile, device="cpu", warmup=False, host_profile=False)
+        prompt_embeds, negative_prompt_embeds = PromptEmbeddingCache(pipe, MODEL_ID).encode_pair(prompt)
+        batch = config["batch_size"]
+        prompt_embeds = prompt_embeds.expand(batch, -1, -1)
+        negative_prompt_embeds = negative_prompt_embeds.expand(batch, -1, -1)
+
+        def generate():
+            sample(pipe, prompt_embeds, negative_prompt_embeds, guidance_scales=[7.5] * batch,
+                   seeds=list(range(batch)), num_inference_steps=num_steps)
+
+        generate()  # warm-up
+        latencies = []
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            generate()
+            latencies.append(time.perf_counter() - start_time)
+        results.put(("done", latencies))
+    except Exception:
+        results.put(("error", traceback.format_exc()))
+
+
+def run_trial(config, profile=None, prompt="A photo of a cat sitting on a windowsill", num_steps=8, repeats=2):
+    """Images per minute and latency of one config, measured in a fresh process"""
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    with child_environment(environment_for(config)):
+        process = context.Process(target=_trial, args=(config, profile, prompt, num_steps, repeats, results))
+        process.start()
+    while True:
+        try:
+            kind, payload = results.get(timeout=LIVENESS_POLL_SECONDS)
+            break
+        except queue.Empty:
+            if process.is_alive():
+                continue
+            try:
+                # The result may have arrived just as the process exited
+                kind, payload = results.get(timeout=1.0)
+                break
+            except queue.Empty:
+                raise RuntimeError(f"Autotune trial {config} crashed with exit code {process.exitcode}") from None
+    process.join()
+    if kind == "error":
+        raise RuntimeError(f"Autotune trial {config} failed:\n{payload}")
+    latencies = payload
+    return {
+        "config": dict(config),
+        "images_per_minute": config["batch_size"] * len(latencies) / sum(latencies) * 60.0,
+        "batch_latency_p50": percentile(latencies, 50),
+        "seconds_per_image": sum(latencies) / (len(latencies) * config["batch_size"]),
+    }
+
+
+def autotune(profile=None, num_steps=8, repeats=2, max_trials=12, time_budget=None):
+    """Coordinate-descent search; returns (best trial, successful trials), best is None if none succeeded
+
+    A trial that fails or crashes (e.g. out of memory at a large batch) counts
+    against the budget and is reported, but never becomes the best setting.
+    """
+    ensure_snapshot(profile)
+    num_cores = len(available_cores())
+    search = [
+        ("num_threads", thread_candidates(num_cores)),
+        ("num_interop_threads", INTEROP_THREADS),
+        ("affinity", tuple(AFFINITY_SETTINGS)),
+        ("batch_size", BATCH_SIZES),
+    ]
+    best_config = dict(DEFAULT_CONFIG, num_threads=num_cores)
+    trials, failures, measured = [], [], {}
+    start_time = time.time()
+
+    for knob, values in search:
+        for value in values:
+            config = dict(best_config, **{knob: value})
+            key = tuple(sorted(config.items()))
+            if key in measured:
+                continue
+            if len(trials) + len(failures) >= max_trials or (time_budget and time.time() - start_time > time_budget):
+                print("  Trial budget reached")
+                break
+            print(f"  [{len(trials) + len(failures) + 1}] threads={config['num_threads']} interop={config['num_interop_threads']} "
+                  f"affinity={config['affinity']} batch={config['batch_size']}...")
+            try:
+                trial = run_trial(config, profile, num_steps=num_steps, repeats=repeats)
+            except RuntimeError as exc:
+                print(f"      ⚠️ {exc}")
+                measured[key] = None
+                failures.append(config)
+                continue
+            measured[key] = trial
+            trials.append(trial)
+            print(f"      {trial['images_per_minute']:.2f} images/minute, "
+                  f"{trial['batch_latency_p50']:.1f}s per batch ({num_steps}-step probes)")
+        else:
+            succeeded = [trial for trial in measured.values() if trial is not None]
+            if succeeded:
+                best_config = max(succeeded, key=lambda t: t["images_per_minute"])["config"]
+            continue
+        break  # the budget stops the whole search, not just this knob
+
+    if not trials:
+        return None, trials
+    best = max(trials, key=lambda t: t["images_per_minute"])
+    return best, trials
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Tune threads, affinity and batch size for this host")
+    parser.add_argument("--profile", default=None, help="Performance profile (default: T2I_PROFILE)")
+    parser.add_argument("--steps", type=int, default=8, help="Denoising steps per probe generation")
+    parser.add_argument("--repeats", type=int, default=2, help="Timed generations per trial")
+    parser.add_argument("--max-trials", type=int, default=12)
+    parser.add_argument("--time-budget", type=float, default=None, help="Stop starting trials after N seconds")
+    args = parser.parse_args()
+
+    print("Throughput Autotuner")
+    print("="*60)
+    best, trials = autotune(args.profile, args.steps, args.repeats, args.max_trials, args.time_budget)
+    if best is None:
+        raise SystemExit("❌ No trial succeeded within the budget; host profile not saved")
+
+    from common.pipeline_loader import resolve_profile
+
+    host_profile = {
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "host": host_info(),
+        "profile": resolve_profile(args.profile)[0],
+        "num_steps": args.steps,
+        "config": best["config"],
+        "images_per_minute": best["images_per_minute"],
+        "trials": trials,
+    }
+    path = save_host_profile(host_profile)
+
+    print("\n" + "="*60)
+    print("RESULTS")
+    print("="*60)
+    print(f"  {'threads':>7s} {'interop':>7s} {'affinity':>8s} {'batch':>5s} {'img/min':>8s} {'s/batch':>8s}")
+    for trial in sorted(trials, key=lambda t: t["images_per_minute"], reverse=True):
+        config = trial["config"]
+        print(f"  {config['num_threads']:7d} {config['num_interop_threads']:7d} {config['affinity']:>8s} "
+              f"{config['batch_size']:5d} {trial['images_per_minute']:8.2f} {trial['batch_latency_p50']:8.1f}")
+    print(f"\n✓ Best: {best['config']} → saved to {path}")
+    exports = " ".join(f"{name}={value}" for name, value in environment_for(best["config"]).items())
+    print(f"  For OpenMP affinity in already-running shells: export {exports}")
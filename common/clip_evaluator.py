@@ -0,0 +1,217 @@
+"""
+Batched CLIP similarity evaluation of image files.
+
+calculate_clip_similarity.py ran CLIPModel once per (image, prompt) pair, with
+gradients enabled, and paired files with prompts by zip(sorted(glob), prompts).
+A missing file silently shifted every later pair. ClipEvaluator instead:
+
+  * pairs each file with its prompt explicitly: from a manifest (sweep
+    manifest.jsonl records with "file" and "prompt"), else from the generation
+    parameters embedded in the image (common/image_writer.py), else from the
+    1-based index in the file name (image_07.png -> prompts[6]). Files that
+    cannot be paired, and prompts without an image, are reported, never guessed;
+  * embeds all prompts in one text pass and the images in large batches
+    under inference mode, decoding them on a thread pool;
+  * scores everything with one matmul, the full image x prompt similarity
+    matrix, whose diagonal of pairs is the CLIP score. The rest of the matrix
+    gives retrieval accuracy (is an image closest to its own prompt?);
+  * caches image embeddings in SQLite (clip_embeddings.sqlite) by a hash of
+    the file bytes and the CLIP model, so re-scoring thousands of unchanged
+    images costs a file hash each.
+
+Scores are CLIPModel's logits_per_image, as in common/clip_scoring.py.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import torch
+from PIL import Image
+
+from common.clip_scoring import CLIP_MODEL_ID
+from common.image_writer import read_metadata
+
+CLIP_CACHE_DB = Path(os.environ.get(
+    "T2I_CLIP_CACHE_DB", Path(__file__).resolve().parent.parent / "clip_embeddings.sqlite"
+))
+IMAGE_SUFFIXES = {".png", ".webp", ".jpg", ".jpeg"}
+FILE_INDEX = re.compile(r"(\d+)$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS image_embeddings (
+    file_hash TEXT NOT NULL,
+    model_id TEXT NOT NULL,
+    features BLOB NOT NULL,
+    PRIMARY KEY (file_hash, model_id)
+);
+"""
+
+
+def file_hash(path):
+    """Content hash of a file's bytes"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class EmbeddingStore:
+    """Normalized CLIP image embeddings keyed by (file hash, model id) in one SQLite file"""
+
+    def __init__(self, path=CLIP_CACHE_DB, model_id=CLIP_MODEL_ID):
+        self.model_id = model_id
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def get_many(self, hashes):
+        """{hash: float32 vector} for the hashes that are stored"""
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        for start in range(0, len(unique), 500):
+            chunk = unique[start:start + 500]
+            rows = self._conn.execute(
+                f"SELECT file_hash, features FROM image_embeddings WHERE model_id = ? "
+                f"AND file_hash IN ({', '.join('?' * len(chunk))})", [self.model_id, *chunk]
+            )
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, items):
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO image_embeddings (file_hash, model_id, features) VALUES (?, ?, ?)",
+                [(key, self.model_id, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+            )
+
+
+def image_files(directory):
+    return sorted(path for path in Path(directory).iterdir() if path.suffix.lower() in IMAGE_SUFFIXES)
+
+
+def read_manifest(path):
+    """{file name: prompt} from a JSONL manifest of records with "file" and "prompt" (last record wins)"""
+    prompts = {}
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn last line from an interrupted write
+            if "file" in record and "prompt" in record:
+                prompts[Path(record["file"]).name] = record["prompt"]
+    return prompts
+
+
+def pair_images(files, prompts=None, manifest=None):
+    """Match files to prompts; returns (pairs of (file, prompt, source), unpaired files, prompts without an image)
+
+    Precedence per file: manifest entry, embedded metadata, then the number at the
+    end of the file name as a 1-based index into `prompts`.
+    """
+    by_name = read_manifest(manifest) if manifest else {}
+    pairs, unpaired, used_indices = [], [], set()
+    for path in files:
+        path = Path(path)
+        if path.name in by_name:
+            pairs.append((path, by_name[path.name], "manifest"))
+            continue
+        prompt = read_metadata(path).get("prompt")
+        if prompt:
+            pairs.append((path, prompt, "metadata"))
+            continue
+        match = FILE_INDEX.search(path.stem)
+        index = int(match.group(1)) - 1 if match else -1
+        if prompts and 0 <= index < len(prompts):
+            pairs.append((path, prompts[index], "filename"))
+            used_indices.add(index)
+        else:
+            unpaired.append(path)
+    paired_prompts = {prompt for _, prompt, _ in pairs}
+    missing = [p for i, p in enumerate(prompts or []) if i not in used_indices and p not in paired_prompts]
+    return pairs, unpaired, missing
+
+
+def _load_rgb(path):
+    with Image.open(path) as image:
+        return image.convert("RGB")
+
+
+class ClipEvaluator:
+    """Batched CLIP similarity of image files against prompts, with a file-hash embedding cache"""
+
+    def __init__(self, model, processor, batch_size=64, store=None, num_workers=None):
+        self.model = model
+        self.processor = processor
+        self.batch_size = batch_size
+        self.store = store
+        self.num_workers = num_workers or min(8, os.cpu_count() or 1)
+        self.cache_hits = 0
+
+    def text_features(self, prompts):
+        """Normalized features of every prompt, embedded in one pass"""
+        inputs = self.processor(text=list(prompts), return_tensors="pt", padding=True,
+                                truncation=True).to(self.model.device)
+        with torch.inference_mode():
+            features = self.model.get_text_features(**inputs)
+            return features / features.norm(dim=-1, keepdim=True)
+
+    def image_features(self, files):
+        """Normalized features of image files; stored embeddings are reused, misses embedded in batches"""
+        with ThreadPoolExecutor(self.num_workers) as pool:
+            hashes = list(pool.map(file_hash, files))
+            found = self.store.get_many(hashes) if self.store else {}
+            self.cache_hits = sum(key in found for key in hashes)
+            missing = list({key: path for key, path in zip(hashes, files) if key not in found}.items())
+            for start in range(0, len(missing), self.batch_size):
+                chunk = missing[start:start + self.batch_size]
+                images = list(pool.map(_load_rgb, [path for _, path in chunk]))
+                inputs = self.processor(images=images, return_tensors="pt").to(self.model.device)
+                with torch.inference_mode():
+                    features = self.model.get_image_features(**inputs)
+                    features = (features / features.norm(dim=-1, keepdim=True)).float().cpu().numpy()
+                new = [(key, row) for (key, _), row in zip(chunk, features)]
+                found.update(new)
+                if self.store:
+                    self.store.put_many(new)
+        return torch.from_numpy(np.stack([found[key] for key in hashes])).to(self.model.device)
+
+    def similarity_matrix(self, files, prompts):
+        """(len(files), len(prompts)) CLIP scores from a single matmul"""
+        image_features = self.image_features(files)
+        text_features = self.text_features(prompts).to(image_features.dtype)
+        with torch.inference_mode():
+            return (image_features @ text_features.T * self.model.logit_scale.exp()).float().cpu()
+
+    def evaluate(self, pairs):
+        """Per-pair scores and retrieval accuracy for (file, prompt, ...) pairs"""
+        files = [pair[0] for pair in pairs]
+        prompts = list(dict.fromkeys(pair[1] for pair in pairs))
+        column = {prompt: i for i, prompt in enumerate(prompts)}
+        matrix = self.similarity_matrix(files, prompts)
+        own = torch.tensor([column[pair[1]] for pair in pairs])
+        scores = matrix[torch.arange(len(pairs)), own]
+        return {
+            "scores": scores.tolist(),
+            "matrix": matrix,
+            "prompts": prompts,
+            # Fraction of images that score highest with their own prompt
+            "retrieval_accuracy": (matrix.argmax(dim=1) == own).float().mean().item(),
+        }
+
+    def score_files(self, files, prompts):
+        """CLIP score of each file with its own prompt"""
+        return self.evaluate(list(zip(files, prompts)))["scores"]
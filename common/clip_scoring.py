@@ -0,0 +1,135 @@
+"""
+CLIP text-image similarity used for quality checks.
+
+Scores match CLIPModel's logits_per_image (cosine similarity times the learned
+logit scale), the same number reported by calculate_clip_similarity.py and
+the demo's match score.
+
+ClipScorer embeds images in one batch under inference mode and caches the
+normalized features: text features by prompt, image features by a hash of the
+pixels. Re-scoring a prompt or an image it has already seen (e.g. one served
+from the result cache) costs no forward pass.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import torch
+from transformers import CLIPModel, CLIPProcessor
+
+CLIP_MODEL_ID = "openai/clip-vit-base-patch32"
+
+# clip_scores() scorers by (model, processor, batch size); a scorer keeps both alive, so ids stay unique
+_scorers = {}
+
+
+def load_clip(device="cpu"):
+    """Load the CLIP model and processor used for all similarity scores"""
+    model = CLIPModel.from_pretrained(CLIP_MODEL_ID).to(device).eval()
+    processor = CLIPProcessor.from_pretrained(CLIP_MODEL_ID)
+    return model, processor
+
+
+def image_hash(image):
+    """Content hash of a PIL image's pixels"""
+    digest = hashlib.sha256(f"{image.mode}:{image.size}".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class _LRU:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        return None
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class ClipScorer:
+    """Batched CLIP scoring with cached text and image features"""
+
+    def __init__(self, model, processor, batch_size=32, max_text_entries=1024, max_image_entries=4096):
+        self.model = model
+        self.processor = processor
+        self.batch_size = batch_size
+        self._text_cache = _LRU(max_text_entries)
+        self._image_cache = _LRU(max_image_entries)
+        self._lock = threading.Lock()
+
+    def text_features(self, prompts):
+        """Normalized text features, shape (len(prompts), dim)"""
+        with self._lock:
+            # Rows of this call are collected here: more distinct prompts than the cache
+            # holds would evict the first ones before they are read back
+            found = {}
+            for prompt in dict.fromkeys(prompts):
+                cached = self._text_cache.get(prompt)
+                if cached is not None:
+                    found[prompt] = cached
+            missing = [p for p in dict.fromkeys(prompts) if p not in found]
+            for start in range(0, len(missing), self.batch_size):
+                chunk = missing[start:start + self.batch_size]
+                inputs = self.processor(text=chunk, return_tensors="pt", padding=True).to(self.model.device)
+                with torch.inference_mode():
+                    features = self.model.get_text_features(**inputs)
+                    features = features / features.norm(dim=-1, keepdim=True)
+                for prompt, row in zip(chunk, features):
+                    self._text_cache.put(prompt, row)
+                    found[prompt] = row
+            return torch.stack([found[p] for p in prompts])
+
+    def image_features(self, images, hashes=None):
+        """Normalized image features, shape (len(images), dim); misses embedded in batches"""
+        hashes = hashes or [image_hash(image) for image in images]
+        with self._lock:
+            found, missing = {}, {}
+            for key, image in zip(hashes, images):
+                if key in found or key in missing:
+                    continue
+                cached = self._image_cache.get(key)
+                if cached is not None:
+                    found[key] = cached
+                else:
+                    missing[key] = image
+            keys = list(missing)
+            for start in range(0, len(keys), self.batch_size):
+                chunk = keys[start:start + self.batch_size]
+                inputs = self.processor(images=[missing[k] for k in chunk], return_tensors="pt").to(self.model.device)
+                with torch.inference_mode():
+                    features = self.model.get_image_features(**inputs)
+                    features = features / features.norm(dim=-1, keepdim=True)
+                for key, row in zip(chunk, features):
+                    self._image_cache.put(key, row)
+                    found[key] = row
+            return torch.stack([found[k] for k in hashes])
+
+    def score_pairs(self, images, prompts):
+        """Similarity of each image with its own prompt"""
+        image_features = self.image_features(images)
+        text_features = self.text_features(prompts)
+        with torch.inference_mode():
+            similarity = (image_features * text_features).sum(dim=-1) * self.model.logit_scale.exp()
+        return similarity.float().cpu().tolist()
+
+    def score(self, images, prompt):
+        """Similarity of every image with one prompt"""
+        return self.score_pairs(images, [prompt] * len(images))
+
+
+def clip_scores(model, processor, images, prompts, batch_size=16):
+    """Similarity of each image with its own prompt, computed in batches (features cached per model)"""
+    key = (id(model), id(processor), batch_size)
+    if key not in _scorers:
+        _scorers[key] = ClipScorer(model, processor, batch_size=batch_size)
+    return _scorers[key].score_pairs(images, prompts)
@@ -0,0 +1,107 @@
+"""
+Cross-step reuse of deep UNet features (DeepCache).
+
+Between adjacent timesteps the UNet's high-level features barely change.
+What does change is mostly carried by the full-resolution skip connection.
+DeepCache runs the whole UNet only every `interval` steps. On a full step it
+keeps the feature map that enters the last layer of the last up block. On the
+steps in between it computes only the shallow branch: conv_in, that last
+up-block layer (one ResNet and one transformer at 64x64) fed with the cached
+features, and conv_out. The rest of the down path, the mid block and the
+other up layers are skipped.
+
+    with DeepCache(pipe.unet, interval=3) as cache:
+        noise_pred = cache(step, model_input, t, encoder_hidden_states)
+    cache.full_steps, cache.cached_steps
+
+common.sampling.sample(deep_cache_interval=...) uses it. A compiled UNet
+(compile_unet) runs eagerly while the cache is active, because the shallow
+branch calls its blocks directly.
+"""
+
+import torch
+
+DEFAULT_CACHE_INTERVAL = 3
+
+
+def _positional_or_kwarg(args, kwargs, name):
+    return args[0] if args else kwargs[name]
+
+
+class DeepCache:
+    """Full UNet every `interval` steps, shallow branch with cached deep features in between"""
+
+    def __init__(self, unet, interval=DEFAULT_CACHE_INTERVAL):
+        if interval < 1:
+            raise ValueError("DeepCache interval must be at least 1")
+        self.unet = getattr(unet, "_orig_mod", unet)
+        self.interval = interval
+        self.full_steps = 0
+        self.cached_steps = 0
+        self.features = None
+        self._rows_key = None
+        self._capturing = False
+
+        layer = self.unet.up_blocks[-1].resnets[-1]
+        self._skip_channels = self.unet.conv_in.out_channels
+        self._hook = layer.register_forward_pre_hook(self._capture, with_kwargs=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._hook.remove()
+        self.features = None
+
+    def _capture(self, module, args, kwargs):
+        if self._capturing:
+            # The layer input is cat([deep features, conv_in skip]); keep the deep part
+            hidden_states = _positional_or_kwarg(args, kwargs, "input_tensor")
+            self.features = hidden_states[:, :-self._skip_channels]
+
+    def __call__(self, step, sample, timestep, encoder_hidden_states, rows_key=None):
+        """UNet noise prediction for this step; a new rows_key (batch rows changed) forces a full step"""
+        if step % self.interval == 0 or self.features is None or rows_key != self._rows_key:
+            self._capturing = True
+            try:
+                output = self.unet(sample, timestep, encoder_hidden_states=encoder_hidden_states,
+                                   return_dict=False)[0]
+            finally:
+                self._capturing = False
+            self._rows_key = rows_key
+            self.full_steps += 1
+            return output
+        self.cached_steps += 1
+        return shallow_forward(self.unet, sample, timestep, encoder_hidden_states, self.features)
+
+
+def shallow_forward(unet, sample, timestep, encoder_hidden_states, deep_features):
+    """UNet output from conv_in and the last up-block layer, with deep features taken from the cache"""
+    emb = unet.time_embedding(unet.get_time_embed(sample=sample, timestep=timestep), None)
+    skip = unet.conv_in(sample)
+
+    up_block = unet.up_blocks[-1]
+    hidden_states = up_block.resnets[-1](torch.cat([deep_features, skip], dim=1), emb)
+    if getattr(up_block, "has_cross_attention", False):
+        hidden_states = up_block.attentions[-1](hidden_states, encoder_hidden_states=encoder_hidden_states,
+                                                return_dict=False)[0]
+
+    if unet.conv_norm_out is not None:
+        hidden_states = unet.conv_act(unet.conv_norm_out(hidden_states))
+    return unet.conv_out(hidden_states)
+
+
+def unet_flops(unet, sample, timestep, encoder_hidden_states, deep_features=None):
+    """FLOPs of one full UNet call, or of the shallow branch if deep_features are given"""
+    from torch.utils.flop_counter import FlopCounterMode
+
+    unet = getattr(unet, "_orig_mod", unet)
+    with torch.no_grad(), FlopCounterMode(display=False) as counter:
+        if deep_features is None:
+            unet(sample, timestep, encoder_hidden_states=encoder_hidden_states, return_dict=False)
+        else:
+            shallow_forward(unet, sample, timestep, encoder_hidden_states, deep_features)
+    return counter.get_total_flops()
@@ -0,0 +1,59 @@
+"""
+Cached Inception reference statistics for FID.
+
+FID compares the mean and covariance of Inception pool3 activations of two
+image sets. The reference set (milestone3/reference_images_resized, 500 COCO
+photos) never changes between evaluations, but calculate_fid_given_paths
+embedded it again on every run. Its features are now computed once by the
+shared Inception engine (common/inception_metrics.py) and stored as .npz in
+fid_stats/. The file is keyed by a content hash of the reference files and a
+hash of the Inception weights, so adding, removing or editing a photo, or a
+different checkpoint, produces a new key and the features are recomputed. Each
+FID evaluation then only embeds the generated images.
+
+    python -m common.fid_stats milestone3/reference_images_resized   # precompute
+    fid = fid_against("milestone2/final_images", "milestone3/reference_images_resized")
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+from common.inception_metrics import BATCH_SIZE, features_path, fid, image_features, image_files, statistics
+
+
+def stats_path(reference_dir):
+    """Cache file for a reference folder's current contents under the current weights"""
+    return features_path(image_files(reference_dir), Path(reference_dir).name)
+
+
+def reference_statistics(reference_dir, batch_size=BATCH_SIZE, device=None):
+    """(mu, sigma) of a reference folder, from features cached in fid_stats/ (computed once)"""
+    return statistics(image_features(reference_dir, batch_size, device)["pool3"])
+
+
+def fid_against(generated, reference_dir, batch_size=BATCH_SIZE, device=None):
+    """FID of generated images (a folder or a list of files) against a reference folder's cached features"""
+    files = image_files(generated) if isinstance(generated, (str, Path)) else list(generated)
+    if len(files) < 2:
+        raise ValueError("FID needs at least 2 generated images")
+    reference = image_features(reference_dir, batch_size, device)
+    # Sweep groups are one-off file lists; only whole folders are worth caching
+    generated_features = image_features(generated, batch_size, device, cache=isinstance(generated, (str, Path)))
+    return fid(generated_features["pool3"], reference["pool3"])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Precompute FID reference features for an image folder")
+    parser.add_argument("reference_dir")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    path = stats_path(args.reference_dir)
+    if path.exists():
+        print(f"✓ Features are up to date: {path}")
+    else:
+        start_time = time.perf_counter()
+        image_features(args.reference_dir, args.batch_size)
+        print(f"✓ {len(image_files(args.reference_dir))} images embedded in "
+              f"{time.perf_counter() - start_time:.1f}s → {path}")
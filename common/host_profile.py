@@ -0,0 +1,99 @@
+"""
+Per-host CPU runtime settings found by the autotuner (common/autotune.py).
+
+The best torch thread count, inter-op threads, OpenMP affinity and batch size
+differ from machine to machine. `python -m common.autotune` measures them and
+writes host_profiles/<hostname>.json. load_pipeline() then applies it in
+every script and the demo. Settings the user has already made win: explicit
+OMP_* / KMP_* environment variables are never overwritten. T2I_HOST_PROFILE=off
+disables the host profile.
+
+OpenMP reads its affinity variables when its runtime starts. In a process that
+has already run parallel torch code, only the thread counts take effect. Use
+the `export` line that the autotuner prints to get the affinity as well.
+"""
+
+import json
+import os
+import socket
+from pathlib import Path
+
+HOST_PROFILE_DIR = Path(os.environ.get(
+    "T2I_HOST_PROFILE_DIR", Path(__file__).resolve().parent.parent / "host_profiles"
+))
+HOST_PROFILE_ENABLED = os.environ.get("T2I_HOST_PROFILE", "on").lower() not in ("0", "off", "false", "no")
+
+# OpenMP placement presets (GNU OpenMP variables plus the Intel/LLVM KMP equivalent)
+AFFINITY_SETTINGS = {
+    "none": {},
+    "close": {"OMP_PROC_BIND": "close", "OMP_PLACES": "cores", "KMP_AFFINITY": "granularity=fine,compact,1,0"},
+    "spread": {"OMP_PROC_BIND": "spread", "OMP_PLACES": "cores", "KMP_AFFINITY": "granularity=fine,scatter"},
+}
+
+_applied = None
+
+
+def host_profile_path(hostname=None):
+    hostname = hostname or socket.gethostname()
+    safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in hostname)
+    return HOST_PROFILE_DIR / f"{safe_name}.json"
+
+
+def load_host_profile(path=None):
+    """This host's autotuned profile, or None if there is none (or it is disabled)"""
+    if not HOST_PROFILE_ENABLED:
+        return None
+    try:
+        with open(path or host_profile_path()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_host_profile(profile, path=None):
+    path = Path(path or host_profile_path())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(profile, f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def environment_for(config):
+    """Environment variables that realize a tuned config in a new process"""
+    env = {"OMP_NUM_THREADS": str(config["num_threads"])}
+    env.update(AFFINITY_SETTINGS[config.get("affinity", "none")])
+    return env
+
+
+def apply_host_profile():
+    """Apply this host's tuned threads and affinity once per process; returns the config or None"""
+    global _applied
+    if _applied is not None:
+        return _applied or None
+    profile = load_host_profile()
+    if profile is None:
+        _applied = {}
+        return None
+
+    import torch
+
+    config = profile["config"]
+    user_threads = os.environ.get("OMP_NUM_THREADS")
+    for name, value in environment_for(config).items():
+        os.environ.setdefault(name, value)
+    if user_threads is None:
+        torch.set_num_threads(config["num_threads"])
+    try:
+        torch.set_num_interop_threads(config["num_interop_threads"])
+    except RuntimeError:
+        pass  # Only possible before the first inter-op parallel work in this process
+    _applied = config
+    return config
+
+
+def host_batch_size(default):
+    """Tuned images per denoising batch for this host, or the given default"""
+    profile = load_host_profile()
+    return profile["config"]["batch_size"] if profile else default
@@ -0,0 +1,214 @@
+"""
+One Inception pass for FID, Inception Score and KID.
+
+calculate_inception_score.py ran torchvision's Inception one image at a time,
+and FID ran pytorch-fid's Inception over the same images again. Here every
+image is decoded once, on a thread pool (PIL releases the GIL while decoding),
+resized to 299x299 exactly as pytorch-fid does, and sent through the FID
+Inception network in batches. A single forward returns both the pool3 features
+(2048-d, used by FID and KID) and the classifier logits (1008 classes, used by
+IS). The TF-ported FID weights (the same as torch-fidelity) are used for IS
+too, so all three metrics come from the same network.
+
+Features are cached as .npz in fid_stats/, keyed by a content hash of the
+image files and a hash of the Inception weights. Computing another metric,
+or re-running one on unchanged images, reads the arrays instead of running
+the network.
+
+    features = image_features("milestone2/final_images")
+    reference = image_features("milestone3/reference_images_resized")
+    fid(features["pool3"], reference["pool3"])
+    inception_score(features["logits"])
+    kid(features["pool3"], reference["pool3"])
+"""
+
+import functools
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image
+from pytorch_fid.fid_score import IMAGE_EXTENSIONS, calculate_frechet_distance
+from pytorch_fid.inception import FID_WEIGHTS_URL, InceptionV3
+from torch.hub import load_state_dict_from_url
+
+FEATURES_DIR = Path(os.environ.get(
+    "T2I_FID_STATS_DIR", Path(__file__).resolve().parent.parent / "fid_stats"
+))
+INCEPTION_SIZE = 299
+BATCH_SIZE = 32
+MIN_IMAGES_PER_SPLIT = 50  # fewer images than this per IS split make p(y) too noisy
+
+
+def image_files(directory):
+    """Image files of a directory (the extensions pytorch-fid reads), sorted by name"""
+    return sorted(
+        path for path in Path(directory).iterdir()
+        if path.is_file() and path.suffix.lower().lstrip(".") in IMAGE_EXTENSIONS
+    )
+
+
+def content_hash(files):
+    """Hash of the names and bytes of a set of files"""
+    digest = hashlib.sha256()
+    for path in files:
+        digest.update(Path(path).name.encode() + b"\0")
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class InceptionEngine(torch.nn.Module):
+    """FID Inception returning (pool3 features, logits) for images in [0, 1] at 299x299"""
+
+    def __init__(self):
+        super().__init__()
+        block = InceptionV3.BLOCK_INDEX_BY_DIM[2048]
+        self.blocks = InceptionV3([block], resize_input=False, normalize_input=False).blocks
+        state_dict = load_state_dict_from_url(FID_WEIGHTS_URL, progress=True)
+        self.fc = torch.nn.Linear(2048, state_dict["fc.weight"].shape[0])
+        self.fc.load_state_dict({"weight": state_dict["fc.weight"], "bias": state_dict["fc.bias"]})
+
+    def forward(self, images):
+        x = 2 * images - 1
+        for block in self.blocks:
+            x = block(x)
+        pool3 = x.flatten(1)
+        return pool3, self.fc(pool3)
+
+
+@functools.lru_cache(maxsize=None)
+def load_inception(device="cpu"):
+    return InceptionEngine().to(device).eval()
+
+
+@functools.lru_cache(maxsize=None)
+def weights_hash():
+    """Hash of the Inception weights, so new weights invalidate cached features"""
+    digest = hashlib.sha256()
+    for name, tensor in load_inception().state_dict().items():
+        digest.update(name.encode())
+        digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()
+
+
+def default_device():
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def load_image(path):
+    """Decode an image to a 3x299x299 float tensor in [0, 1] (pytorch-fid's bilinear resize)"""
+    with Image.open(path) as image:
+        pixels = np.asarray(image.convert("RGB"))
+    tensor = torch.from_numpy(pixels).permute(2, 0, 1).unsqueeze(0).float() / 255.0
+    if tensor.shape[-2:] != (INCEPTION_SIZE, INCEPTION_SIZE):
+        tensor = F.interpolate(tensor, size=(INCEPTION_SIZE, INCEPTION_SIZE), mode="bilinear", align_corners=False)
+    return tensor[0]
+
+
+def extract_features(files, batch_size=BATCH_SIZE, device=None, num_workers=None):
+    """{"pool3": (N, 2048), "logits": (N, 1008)} for a list of image files, one forward per batch"""
+    device = device or default_device()
+    model = load_inception(device)
+    files = [Path(path) for path in files]
+    pool3, logits = [], []
+    batches = [files[start:start + batch_size] for start in range(0, len(files), batch_size)]
+    with ThreadPoolExecutor(num_workers or min(8, os.cpu_count() or 1)) as pool, torch.inference_mode():
+        decoding = [pool.submit(load_image, path) for path in batches[0]] if batches else []
+        for n in range(len(batches)):
+            images = torch.stack([future.result() for future in decoding])
+            if n + 1 < len(batches):
+                # Decode the next batch while this one runs through the network
+                decoding = [pool.submit(load_image, path) for path in batches[n + 1]]
+            batch_pool3, batch_logits = model(images.to(device))
+            pool3.append(batch_pool3.double().cpu().numpy())
+            logits.append(batch_logits.double().cpu().numpy())
+    return {"pool3": np.concatenate(pool3), "logits": np.concatenate(logits)}
+
+
+def features_path(files, label="images"):
+    """Cache file for these files' current contents under the current weights"""
+    key = hashlib.sha256(f"{content_hash(files)}:{weights_hash()}".encode())
+    return FEATURES_DIR / f"{label}_{key.hexdigest()[:16]}.npz"
+
+
+def image_features(images, batch_size=BATCH_SIZE, device=None, num_workers=None, cache=True):
+    """Inception features of a folder or a list of image files, read from fid_stats/ when cached"""
+    if isinstance(images, (str, Path)):
+        files, label = image_files(images), Path(images).name
+    else:
+        files, label = [Path(path) for path in images], "images"
+    if not files:
+        raise ValueError(f"No images found in {images}")
+    path = features_path(files, label) if cache else None
+    if path is not None and path.exists():
+        with np.load(path) as cached:
+            return {"pool3": cached["pool3"], "logits": cached["logits"]}
+
+    features = extract_features(files, batch_size, device, num_workers)
+    if path is not None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Unique temp file: the FID, IS and KID scripts may embed the same set at once
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.stem}.", suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **features)
+            os.replace(tmp_name, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+            raise
+    return features
+
+
+def statistics(pool3):
+    """Mean and covariance of pool3 features"""
+    return pool3.mean(axis=0), np.cov(pool3, rowvar=False)
+
+
+def fid(pool3, reference_pool3):
+    """Fréchet Inception Distance between two sets of pool3 features"""
+    mu, sigma = statistics(pool3)
+    reference_mu, reference_sigma = statistics(reference_pool3)
+    return float(calculate_frechet_distance(mu, sigma, reference_mu, reference_sigma))
+
+
+def inception_score(logits, splits=10):
+    """(mean, std, splits used) of exp(E[KL(p(y|x) || p(y))]); fewer splits for small sets"""
+    splits = max(1, min(splits, len(logits) // MIN_IMAGES_PER_SPLIT))
+    log_p = torch.from_numpy(logits).log_softmax(dim=1).numpy()
+    p = np.exp(log_p)
+    scores = []
+    for part_p, part_log_p in zip(np.array_split(p, splits), np.array_split(log_p, splits)):
+        log_py = np.log(part_p.mean(axis=0))
+        kl = (part_p * (part_log_p - log_py)).sum(axis=1)
+        scores.append(np.exp(kl.mean()))
+    return float(np.mean(scores)), float(np.std(scores)), splits
+
+
+def kid(pool3, reference_pool3, subsets=100, subset_size=1000, seed=0):
+    """(mean, std) Kernel Inception Distance: unbiased MMD² with a cubic polynomial kernel over random subsets"""
+    subset_size = min(subset_size, len(pool3), len(reference_pool3))
+    if subset_size < 2:
+        raise ValueError("KID needs at least 2 images in each set")
+    rng = np.random.default_rng(seed)
+    dims = pool3.shape[1]
+    values = []
+    for _ in range(subsets):
+        x = pool3[rng.choice(len(pool3), subset_size, replace=False)]
+        y = reference_pool3[rng.choice(len(reference_pool3), subset_size, replace=False)]
+        k_xx = (x @ x.T / dims + 1) ** 3
+        k_yy = (y @ y.T / dims + 1) ** 3
+        k_xy = (x @ y.T / dims + 1) ** 3
+        m = subset_size
+        values.append((k_xx.sum() - np.trace(k_xx)) / (m * (m - 1)) + (k_yy.sum() - np.trace(k_yy)) / (m * (m - 1))
+                      - 2 * k_xy.mean())
+    return float(np.mean(values)), float(np.std(values))
@@ -0,0 +1,190 @@
+"""
+Pre-converted, memory-mapped model snapshots for fast cold starts.
+
+StableDiffusionPipeline.from_pretrained reads ~4 GB of fp32 weights, converts
+them and gives every process its own private copy. compile_snapshot() does
+that conversion once and writes each component as safetensors already in the
+profile's dtype and layout (4D conv weights stored NHWC for channels_last).
+load_snapshot() builds the modules on the meta device and assigns the
+tensors straight out of the memory-mapped files. Startup is near-instant, and
+read-only weight pages are shared through the page cache by every worker
+process that maps the same snapshot.
+
+The safety checker is not loaded until the first image is checked. A snapshot
+is built in a temporary directory and renamed into place with its manifest
+already written, so an interrupted or concurrent compile never leaves a
+half-written snapshot where the loader looks.
+
+One-time step (run from the repository root):
+
+    python -m common.model_snapshot --profile cpu-bf16
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import torch
+from accelerate import init_empty_weights
+from diffusers import AutoencoderKL, UNet2DConditionModel, StableDiffusionPipeline
+from diffusers.pipelines.stable_diffusion.safety_checker import StableDiffusionSafetyChecker
+from safetensors import safe_open
+from safetensors.torch import save_file
+from transformers import CLIPConfig, CLIPImageProcessor, CLIPTextConfig, CLIPTextModel, CLIPTokenizer
+
+SNAPSHOT_ROOT = Path(os.environ.get("T2I_SNAPSHOT_DIR", Path(__file__).resolve().parent.parent / "snapshots"))
+WEIGHTS_FILE = "model.safetensors"
+MANIFEST_FILE = "snapshot.json"
+
+
+def snapshot_path(model_id, dtype, channels_last):
+    """Directory of the snapshot for a model in a given dtype/layout"""
+    layout = "nhwc" if channels_last else "nchw"
+    return SNAPSHOT_ROOT / f"{model_id.replace('/', '--')}-{dtype}-{layout}"
+
+
+def snapshot_complete(directory):
+    """True if the directory holds a finished snapshot (the manifest is written last)"""
+    return (Path(directory) / MANIFEST_FILE).exists()
+
+
+def _save_weights(module, directory, channels_last):
+    directory.mkdir(parents=True, exist_ok=True)
+    tensors = {}
+    for name, tensor in module.state_dict().items():
+        tensor = tensor.detach()
+        if channels_last and tensor.dim() == 4:
+            # Stored NHWC so loading gives channels_last views without a copy
+            tensor = tensor.permute(0, 2, 3, 1)
+        tensors[name] = tensor.contiguous().clone()
+    layout = "nhwc" if channels_last else "nchw"
+    save_file(tensors, directory / WEIGHTS_FILE, metadata={"layout": layout})
+
+
+def _load_weights(directory):
+    """Memory-mapped tensors of one component (no copy for CPU tensors)"""
+    state = {}
+    with safe_open(directory / WEIGHTS_FILE, framework="pt") as f:
+        nhwc = (f.metadata() or {}).get("layout") == "nhwc"
+        for name in f.keys():
+            tensor = f.get_tensor(name)
+            if nhwc and tensor.dim() == 4:
+                tensor = tensor.permute(0, 3, 1, 2)
+            state[name] = tensor
+    return state
+
+
+def _materialize(build, directory):
+    with init_empty_weights():
+        module = build()
+    module.load_state_dict(_load_weights(directory), assign=True)
+    return module.eval()
+
+
+class LazySafetyChecker:
+    """Stands in for the safety checker and loads it on the first check"""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self._model = None
+
+    def __call__(self, images, clip_input):
+        if self._model is None:
+            config = CLIPConfig.from_pretrained(self.directory)
+            self._model = _materialize(lambda: StableDiffusionSafetyChecker(config), self.directory)
+            self._model = self._model.to(clip_input.device)
+        return self._model(images=images, clip_input=clip_input.to(self._model.dtype))
+
+
+def compile_snapshot(model_id, dtype="float32", channels_last=True):
+    """Convert a hub checkpoint into a snapshot directory; returns its path"""
+    final = snapshot_path(model_id, dtype, channels_last)
+    print(f"Loading {model_id} ({dtype})...")
+    pipe = StableDiffusionPipeline.from_pretrained(model_id, torch_dtype=getattr(torch, dtype))
+
+    print(f"Writing snapshot to {final}...")
+    final.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(dir=final.parent, prefix=f".{final.name}.", suffix=".tmp"))
+    try:
+        _write_snapshot(pipe, tmp_dir, model_id, dtype, channels_last)
+        _publish(tmp_dir, final)
+    finally:
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+    print("✓ Snapshot complete")
+    return final
+
+
+def _publish(tmp_dir, final):
+    """Move a finished snapshot into place; a complete one already there (another process) wins"""
+    try:
+        os.replace(tmp_dir, final)
+    except OSError:
+        if snapshot_complete(final):
+            return
+        shutil.rmtree(final)  # leftover of an interrupted compile from before atomic writes
+        os.replace(tmp_dir, final)
+
+
+def _write_snapshot(pipe, target, model_id, dtype, channels_last):
+    for name in ("unet", "vae"):
+        component = getattr(pipe, name)
+        component.save_config(target / name)
+        _save_weights(component, target / name, channels_last)
+    for name in ("text_encoder", "safety_checker"):
+        component = getattr(pipe, name)
+        component.config.save_pretrained(target / name)
+        # Only the UNet/VAE convolutions benefit from the NHWC layout
+        _save_weights(component, target / name, channels_last=False)
+    pipe.tokenizer.save_pretrained(target / "tokenizer")
+    pipe.scheduler.save_pretrained(target / "scheduler")
+    pipe.feature_extractor.save_pretrained(target / "feature_extractor")
+
+    manifest = {
+        "model_id": model_id,
+        "dtype": dtype,
+        "channels_last": channels_last,
+        "scheduler_class": type(pipe.scheduler).__name__,
+    }
+    with open(target / MANIFEST_FILE, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def load_snapshot(directory):
+    """Assemble a StableDiffusionPipeline from a snapshot directory (CPU, mmap-backed)"""
+    directory = Path(directory)
+    with open(directory / MANIFEST_FILE) as f:
+        manifest = json.load(f)
+
+    unet_config = UNet2DConditionModel.load_config(directory / "unet")
+    vae_config = AutoencoderKL.load_config(directory / "vae")
+    text_config = CLIPTextConfig.from_pretrained(directory / "text_encoder")
+
+    import diffusers
+    scheduler_class = getattr(diffusers, manifest["scheduler_class"])
+
+    return StableDiffusionPipeline(
+        vae=_materialize(lambda: AutoencoderKL.from_config(vae_config), directory / "vae"),
+        text_encoder=_materialize(lambda: CLIPTextModel(text_config), directory / "text_encoder"),
+        tokenizer=CLIPTokenizer.from_pretrained(directory / "tokenizer"),
+        unet=_materialize(lambda: UNet2DConditionModel.from_config(unet_config), directory / "unet"),
+        scheduler=scheduler_class.from_pretrained(directory / "scheduler"),
+        safety_checker=LazySafetyChecker(directory / "safety_checker"),
+        feature_extractor=CLIPImageProcessor.from_pretrained(directory / "feature_extractor"),
+    )
+
+
+if __name__ == '__main__':
+    from common.pipeline_loader import MODEL_ID, resolve_profile
+
+    parser = argparse.ArgumentParser(description="Write a pre-converted model snapshot for fast loading")
+    parser.add_argument("--profile", default=None, help="Performance profile whose dtype/layout to bake in")
+    parser.add_argument("--model-id", default=MODEL_ID)
+    args = parser.parse_args()
+
+    profile, settings = resolve_profile(args.profile)
+    print(f"Compiling snapshot for profile '{profile}'")
+    compile_snapshot(args.model_id, settings["dtype"], settings["channels_last"])
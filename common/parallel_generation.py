@@ -0,0 +1,220 @@
+"""
+Data-parallel image generation across CPU worker processes.
+
+One PyTorch process stops scaling long before a 64-core host is busy: the
+UNet's small per-step kernels leave most threads waiting. Several processes
+with smaller thread budgets do better. ParallelGenerator starts N worker
+processes. Each one is pinned to its own block of cores (Linux), runs
+torch.set_num_threads(threads), and loads the pipeline from the profile's
+memory-mapped snapshot. The read-only weights are therefore shared through the
+page cache instead of every worker holding its own ~4 GB copy. Jobs go through
+a shared queue, so a slow shard never leaves other workers idle. Results are
+streamed back in job order.
+
+autotune_split() times short probe runs for several workers × threads splits
+and returns the one with the highest images per minute.
+"""
+
+import multiprocessing
+import os
+import queue
+import time
+import traceback
+
+import torch
+
+from common.model_snapshot import compile_snapshot, snapshot_complete, snapshot_path
+from common.pipeline_loader import MODEL_ID, load_pipeline, resolve_profile
+from common.prompt_embeddings import PromptEmbeddingCache
+from common.sampling import sample
+
+# Rough activation memory of one worker generating 512x512 images (weights are shared)
+WORKER_MEMORY_GB = 3.0
+# How often the parent checks that workers are still alive while waiting for results
+LIVENESS_POLL_SECONDS = 5.0
+
+
+def available_cores():
+    """CPU ids this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count()))
+
+
+def available_memory_gb():
+    """MemAvailable from /proc/meminfo, or None where it cannot be read"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / (1024 * 1024)
+    except OSError:
+        pass
+    return None
+
+
+def candidate_splits(num_cores=None, min_threads=2):
+    """workers × threads splits that use all cores (powers of two workers), limited by free memory"""
+    num_cores = num_cores or len(available_cores())
+    memory = available_memory_gb()
+    max_workers = max(int(memory // WORKER_MEMORY_GB), 1) if memory else num_cores
+    splits = []
+    workers = 1
+    while workers <= num_cores and workers <= max_workers:
+        threads = num_cores // workers
+        if threads >= min_threads or workers == 1:
+            splits.append((workers, threads))
+        workers *= 2
+    return splits
+
+
+def ensure_snapshot(profile=None, model_id=MODEL_ID):
+    """Make sure the profile's snapshot exists so workers can share its mapped weights"""
+    _, settings = resolve_profile(profile)
+    path = snapshot_path(model_id, settings["dtype"], settings["channels_last"])
+    if not snapshot_complete(path):
+        compile_snapshot(model_id, settings["dtype"], settings["channels_last"])
+    return path
+
+
+def _worker(worker_id, cores, threads, profile, num_steps, cfg_scale, tasks, results):
+    try:
+        if cores and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cores)
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+
+        pipe = load_pipeline(profile, device="cpu", host_profile=False)
+        embedding_cache = PromptEmbeddingCache(pipe, MODEL_ID)
+        results.put(("ready", worker_id, None))
+
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            position, prompt, seed = task
+            start_time = time.perf_counter()
+            prompt_embeds, negative_prompt_embeds = embedding_cache.encode_pair(prompt)
+            output = sample(pipe, prompt_embeds, negative_prompt_embeds, guidance_scales=[cfg_scale],
+                            seeds=[seed], num_inference_steps=num_steps)
+            results.put(("done", position, (output.images[0], time.perf_counter() - start_time, worker_id)))
+    except Exception:
+        results.put(("error", worker_id, traceback.format_exc()))
+
+
+class ParallelGenerator:
+    """Pool of pinned generation workers; use as a context manager"""
+
+    def __init__(self, workers, threads, profile=None, num_steps=20, cfg_scale=7.5):
+        self.workers = workers
+        self.threads = threads
+        self.profile = profile
+        self.num_steps = num_steps
+        self.cfg_scale = cfg_scale
+        self._processes = []
+
+    def __enter__(self):
+        ensure_snapshot(self.profile)
+        context = multiprocessing.get_context("spawn")
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        cores = available_cores()
+
+        for worker_id in range(self.workers):
+            worker_cores = cores[worker_id * self.threads:(worker_id + 1) * self.threads]
+            # OpenMP reads its thread count at start-up; set it for the child only
+            previous = os.environ.get("OMP_NUM_THREADS")
+            os.environ["OMP_NUM_THREADS"] = str(self.threads)
+            try:
+                process = context.Process(
+                    target=_worker,
+                    args=(worker_id, worker_cores, self.threads, self.profile, self.num_steps, self.cfg_scale,
+                          self._tasks, self._results),
+                    daemon=True
+                )
+                process.start()
+            finally:
+                if previous is None:
+                    del os.environ["OMP_NUM_THREADS"]
+                else:
+                    os.environ["OMP_NUM_THREADS"] = previous
+            self._processes.append(process)
+
+        # Wait until every worker has loaded and warmed up, so timings exclude start-up
+        ready = 0
+        while ready < self.workers:
+            try:
+                kind, worker_id, payload = self._next_result()
+            except RuntimeError:
+                self._shutdown()
+                raise
+            if kind == "error":
+                self._shutdown()
+                raise RuntimeError(f"Generation worker {worker_id} failed:\n{payload}")
+            ready += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._shutdown()
+
+    def _next_result(self):
+        """Next worker message; raises if a worker died without reporting (OOM kill, segfault)"""
+        while True:
+            try:
+                return self._results.get(timeout=LIVENESS_POLL_SECONDS)
+            except queue.Empty:
+                for worker_id, process in enumerate(self._processes):
+                    if not process.is_alive():
+                        raise RuntimeError(f"Generation worker {worker_id} (pid {process.pid}) died "
+                                           f"with exit code {process.exitcode}")
+
+    def _shutdown(self):
+        for process in self._processes:
+            if process.is_alive():
+                self._tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+
+    def map(self, jobs):
+        """Generate (prompt, seed) jobs; yields (position, image, seconds, worker_id) in job order"""
+        jobs = list(jobs)
+        for position, (prompt, seed) in enumerate(jobs):
+            self._tasks.put((position, prompt, seed))
+
+        finished = {}
+        next_position = 0
+        while next_position < len(jobs):
+            kind, key, payload = self._next_result()
+            if kind == "error":
+                raise RuntimeError(f"Generation worker {key} failed:\n{payload}")
+            finished[key] = payload
+            while next_position in finished:
+                image, seconds, worker_id = finished.pop(next_position)
+                yield next_position, image, seconds, worker_id
+                next_position += 1
+
+
+def measure_split(workers, threads, prompts, profile=None, num_steps=4, cfg_scale=7.5, jobs_per_worker=2):
+    """Images per minute of one split on short probe generations (start-up excluded)"""
+    jobs = [(prompts[i % len(prompts)], i) for i in range(workers * jobs_per_worker)]
+    with ParallelGenerator(workers, threads, profile, num_steps, cfg_scale) as generator:
+        start_time = time.perf_counter()
+        for _ in generator.map(jobs):
+            pass
+        seconds = time.perf_counter() - start_time
+    return len(jobs) / seconds * 60.0
+
+
+def autotune_split(prompts, profile=None, splits=None, num_steps=4, cfg_scale=7.5):
+    """Try each workers × threads split; returns (best split, {split: images per minute})"""
+    splits = splits or candidate_splits()
+    throughput = {}
+    for workers, threads in splits:
+        print(f"  Probing {workers} worker(s) × {threads} thread(s)...")
+        throughput[(workers, threads)] = measure_split(workers, threads, prompts, profile, num_steps, cfg_scale)
+        print(f"    {throughput[(workers, threads)]:.2f} images/minute ({num_steps}-step probes)")
+    best = max(throughput, key=throughput.get)
+    return best, throughput
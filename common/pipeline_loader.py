@@ -0,0 +1,209 @@
+"""
+Shared Stable Diffusion loader with named CPU performance profiles.
+
+Every script and the demo used to load runwayml/stable-diffusion-v1-5 in
+float32 with no inference optimizations. They now call load_pipeline(), so a
+tuning change made here applies everywhere. The profile is picked with the
+T2I_PROFILE environment variable (default "cpu-fp32"), e.g.
+
+    T2I_PROFILE=cpu-bf16 python generate_final_set.py
+
+If a snapshot for the profile's dtype/layout exists (see model_snapshot.py) it
+is memory-mapped instead of going through from_pretrained. On CPU the host's
+autotuned thread settings (see host_profile.py) are applied first.
+"""
+
+import functools
+import os
+import time
+
+import torch
+from diffusers import StableDiffusionPipeline
+
+from common.host_profile import apply_host_profile, host_profile_path
+from common.model_snapshot import load_snapshot, snapshot_complete, snapshot_path
+from common.quality_gate import gate_passed
+from common.quantization import quantize_pipeline_int8
+from common.token_merging import apply_token_merging
+
+MODEL_ID = "runwayml/stable-diffusion-v1-5"
+
+# Each profile switches individual optimizations on or off:
+#   dtype             - weight dtype for all components
+#   autocast          - run the UNet under torch.autocast with this dtype (fp32 weights)
+#   channels_last     - NHWC memory format for the UNet and VAE convolutions
+#   sdpa              - fused scaled_dot_product_attention processors
+#   compile_unet      - torch.compile the UNet (slow first call, faster steps)
+#   attention_slicing - compute attention in slices (lower peak memory, slower)
+#   vae_slicing       - decode batched images one at a time (lower peak memory)
+#   quantize          - "int8": dynamic INT8 UNet/text-encoder linears (CPU, quality-gated)
+#   token_merging     - ToMe merge ratio for UNet self-attention, 0 = off (quality-gated)
+PERFORMANCE_PROFILES = {
+    "baseline": {
+        "dtype": "float32", "autocast": None, "channels_last": False, "sdpa": False,
+        "compile_unet": False, "attention_slicing": False, "vae_slicing": False,
+        "quantize": None, "token_merging": 0.0,
+    },
+    "cpu-fp32": {
+        "dtype": "float32", "autocast": None, "channels_last": True, "sdpa": True,
+        "compile_unet": False, "attention_slicing": False, "vae_slicing": False,
+        "quantize": None, "token_merging": 0.0,
+    },
+    "cpu-autocast": {
+        "dtype": "float32", "autocast": "bfloat16", "channels_last": True, "sdpa": True,
+        "compile_unet": False, "attention_slicing": False, "vae_slicing": False,
+        "quantize": None, "token_merging": 0.0,
+    },
+    "cpu-bf16": {
+        "dtype": "bfloat16", "autocast": None, "channels_last": True, "sdpa": True,
+        "compile_unet": False, "attention_slicing": False, "vae_slicing": False,
+        "quantize": None, "token_merging": 0.0,
+    },
+    "cpu-bf16-compile": {
+        "dtype": "bfloat16", "autocast": None, "channels_last": True, "sdpa": True,
+        "compile_unet": True, "attention_slicing": False, "vae_slicing": False,
+        "quantize": None, "token_merging": 0.0,
+    },
+    "low-memory": {
+        "dtype": "float32", "autocast": None, "channels_last": False, "sdpa": True,
+        "compile_unet": False, "attention_slicing": True, "vae_slicing": True,
+        "quantize": None, "token_merging": 0.0,
+    },
+    "cpu-int8": {
+        "dtype": "float32", "autocast": None, "channels_last": True, "sdpa": True,
+        "compile_unet": False, "attention_slicing": False, "vae_slicing": False,
+        "quantize": "int8", "token_merging": 0.0,
+    },
+    "cpu-tome": {
+        "dtype": "float32", "autocast": None, "channels_last": True, "sdpa": True,
+        "compile_unet": False, "attention_slicing": False, "vae_slicing": False,
+        "quantize": None, "token_merging": 0.5,
+    },
+}
+
+DEFAULT_PROFILE = os.environ.get("T2I_PROFILE", "cpu-fp32")
+
+
+def select_device():
+    """Best available device: CUDA, then Apple MPS, then CPU"""
+    if torch.cuda.is_available():
+        return "cuda"
+    if torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+def resolve_profile(profile=None, **overrides):
+    """Settings dict for a named profile, with individual settings overridden"""
+    profile = profile or DEFAULT_PROFILE
+    if profile not in PERFORMANCE_PROFILES:
+        raise ValueError(f"Unknown performance profile '{profile}'. "
+                         f"Choose from: {', '.join(PERFORMANCE_PROFILES)}")
+    settings = dict(PERFORMANCE_PROFILES[profile])
+    settings.update(overrides)
+    return profile, settings
+
+
+def token_merging_limit(profile=None):
+    """ToMe ratio a profile may use: its own ratio once it passed the CLIP quality gate, else 0"""
+    profile, settings = resolve_profile(profile)
+    return settings["token_merging"] if settings["token_merging"] and gate_passed(profile) else 0.0
+
+
+def _autocast_forward(forward, device_type, dtype):
+    @functools.wraps(forward)
+    def wrapped(*args, **kwargs):
+        with torch.autocast(device_type=device_type, dtype=dtype):
+            return forward(*args, **kwargs)
+    return wrapped
+
+
+def apply_optimizations(pipe, settings, device):
+    """Apply the profile's optimizations to a loaded pipeline; returns active features"""
+    active = [f"dtype={settings['dtype']}"]
+
+    if settings["quantize"] == "int8":
+        if torch.device(device).type != "cpu":
+            print(f"⚠️ INT8 dynamic quantization is CPU-only, skipped on {device}")
+        else:
+            quantize_pipeline_int8(pipe)
+            active.append("int8_dynamic")
+
+    if settings["sdpa"] and hasattr(torch.nn.functional, "scaled_dot_product_attention"):
+        from diffusers.models.attention_processor import AttnProcessor2_0
+        pipe.unet.set_attn_processor(AttnProcessor2_0())
+        pipe.vae.set_attn_processor(AttnProcessor2_0())
+        active.append("sdpa")
+
+    if settings["channels_last"]:
+        pipe.unet.to(memory_format=torch.channels_last)
+        pipe.vae.to(memory_format=torch.channels_last)
+        active.append("channels_last")
+
+    if settings["attention_slicing"]:
+        pipe.enable_attention_slicing()
+        active.append("attention_slicing")
+
+    if settings["vae_slicing"]:
+        pipe.vae.enable_slicing()
+        active.append("vae_slicing")
+
+    if settings["autocast"]:
+        device_type = torch.device(device).type
+        dtype = getattr(torch, settings["autocast"])
+        pipe.unet.forward = _autocast_forward(pipe.unet.forward, device_type, dtype)
+        active.append(f"autocast={settings['autocast']}")
+
+    if settings["token_merging"]:
+        apply_token_merging(pipe, settings["token_merging"])
+        active.append(f"token_merging={settings['token_merging']}")
+
+    if settings["compile_unet"]:
+        pipe.unet = torch.compile(pipe.unet)
+        active.append("compile_unet")
+
+    return active
+
+
+def warm_up(pipe, num_steps=2):
+    """Run one short generation so first-call costs (allocations, compilation) are paid up front"""
+    start_time = time.time()
+    with torch.no_grad():
+        pipe("warm-up", num_inference_steps=num_steps, guidance_scale=7.5)
+    return time.time() - start_time
+
+
+def load_pipeline(profile=None, model_id=MODEL_ID, device=None, warmup=True,
+                  enforce_quality_gate=True, host_profile=True, **overrides):
+    """Load Stable Diffusion with a named performance profile applied"""
+    profile, settings = resolve_profile(profile, **overrides)
+    device = device or select_device()
+    if host_profile and device == "cpu" and apply_host_profile():
+        print(f"✓ Host profile {host_profile_path().name}: {torch.get_num_threads()} threads")
+
+    gated = settings["quantize"] or settings["token_merging"]
+    if gated and enforce_quality_gate and not gate_passed(profile):
+        print(f"⚠️ Profile '{profile}' has not passed the CLIP quality gate; running without "
+              f"quantization/token merging (python -m common.quality_gate --profile {profile})")
+        settings["quantize"] = None
+        settings["token_merging"] = 0.0
+
+    snapshot = snapshot_path(model_id, settings["dtype"], settings["channels_last"])
+    use_snapshot = snapshot_complete(snapshot)
+    if use_snapshot:
+        pipe = load_snapshot(snapshot)
+    else:
+        pipe = StableDiffusionPipeline.from_pretrained(model_id, torch_dtype=getattr(torch, settings["dtype"]))
+    pipe = pipe.to(device)
+    active = apply_optimizations(pipe, settings, device)
+    if use_snapshot:
+        active.insert(0, "mmap_snapshot")
+
+    pipe.performance_profile = profile
+    pipe.active_features = active
+    print(f"✓ Performance profile '{profile}' on {device}: {', '.join(active)}")
+
+    if warmup:
+        seconds = warm_up(pipe)
+        print(f"✓ Warm-up generation finished in {seconds:.1f}s")
+    return pipe
@@ -0,0 +1,89 @@
+"""
+LRU memoization of CLIP text-encoder outputs.
+
+Stable Diffusion re-runs the text encoder for the prompt and for the
+unconditional/negative prompt (usually the empty string) on every pipe() call.
+This cache keys embeddings by model id and tokenizer output and hands them to
+the pipeline as prompt_embeds / negative_prompt_embeds, so repeated prompts,
+the shared "" unconditional embedding and parameter sweeps skip the encoder.
+"""
+
+import threading
+from collections import OrderedDict
+
+import torch
+
+
+class PromptEmbeddingCache:
+    """Bounded cache of text-encoder hidden states for one pipeline"""
+
+    def __init__(self, pipe, model_id, max_entries=256):
+        self.pipe = pipe
+        self.model_id = model_id
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _tokenize(self, texts):
+        tokenizer = self.pipe.tokenizer
+        return tokenizer(
+            texts,
+            padding="max_length",
+            max_length=tokenizer.model_max_length,
+            truncation=True,
+            return_tensors="pt"
+        )
+
+    def encode_batch(self, texts):
+        """Embeddings for a list of texts, running the encoder only for misses"""
+        tokens = self._tokenize(list(texts))
+        keys = [(self.model_id, tuple(ids.tolist())) for ids in tokens.input_ids]
+
+        with self._lock:
+            found = {}
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+                    self.hits += 1
+        missing = [i for i, key in enumerate(keys) if key not in found]
+        # Identical texts in one batch only need one encoder row
+        unique_missing = list({keys[i]: i for i in missing}.values())
+
+        if unique_missing:
+            with self._lock:
+                self.misses += len(unique_missing)
+            text_encoder = self.pipe.text_encoder
+            input_ids = tokens.input_ids[unique_missing].to(text_encoder.device)
+            attention_mask = None
+            if getattr(text_encoder.config, "use_attention_mask", False):
+                attention_mask = tokens.attention_mask[unique_missing].to(text_encoder.device)
+            with torch.no_grad():
+                hidden_states = text_encoder(input_ids, attention_mask=attention_mask)[0]
+            hidden_states = hidden_states.to(dtype=text_encoder.dtype)
+
+            with self._lock:
+                for row, i in enumerate(unique_missing):
+                    found[keys[i]] = hidden_states[row:row + 1]
+                    self._entries[keys[i]] = found[keys[i]]
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        return torch.cat([found[key] for key in keys], dim=0)
+
+    def encode(self, text):
+        """Embedding of a single text, shape (1, seq_len, hidden)"""
+        return self.encode_batch([text])
+
+    def encode_pair(self, prompt, negative_prompt=""):
+        """(prompt_embeds, negative_prompt_embeds) ready to pass to pipe()"""
+        embeds = self.encode_batch([prompt, negative_prompt or ""])
+        return embeds[:1], embeds[1:]
+
+    def warm(self, texts):
+        """Pre-compute embeddings for texts expected to be requested"""
+        texts = list(dict.fromkeys(texts))
+        for start in range(0, len(texts), 16):
+            self.encode_batch(texts[start:start + 16])
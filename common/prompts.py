@@ -0,0 +1,15 @@
+"""Prompt sets shared by the generation, evaluation and benchmark scripts."""
+
+# The 10 diverse prompts of the milestone2 final image set
+FINAL_SET_PROMPTS = [
+    "A majestic lion resting under an acacia tree in the African savanna",
+    "An astronaut floating in space with Earth in the background",
+    "A medieval castle on a cliff overlooking the ocean at dawn",
+    "A bustling night market in Tokyo with colorful neon signs",
+    "A peaceful mountain lake reflecting snow-capped peaks",
+    "An old library filled with ancient books and warm lamplight",
+    "A field of lavender flowers stretching to the horizon under blue sky",
+    "A steampunk robot playing chess in a Victorian study",
+    "A tropical beach with turquoise water and palm trees at golden hour",
+    "An autumn forest path covered with red and orange leaves"
+]
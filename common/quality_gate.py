@@ -0,0 +1,108 @@
+"""
+Quality gate for output-changing performance modes (e.g. INT8 quantization).
+
+Generates the milestone2 final-set prompts with a reference profile (fp32) and
+a candidate profile using identical seeds, then compares their average CLIP
+similarity. The candidate passes if its score is no more than `tolerance`
+below the reference. The verdict is stored in quality_gate.json, and
+load_pipeline() refuses to enable a gated mode that has not passed.
+
+    python -m common.quality_gate --profile cpu-int8 --tolerance 0.5
+"""
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+import torch
+
+from common.clip_scoring import clip_scores, load_clip
+from common.prompts import FINAL_SET_PROMPTS
+
+GATE_RESULTS_FILE = Path(os.environ.get(
+    "T2I_QUALITY_GATE_FILE", Path(__file__).resolve().parent.parent / "quality_gate.json"
+))
+DEFAULT_TOLERANCE = float(os.environ.get("T2I_QUALITY_TOLERANCE", "0.5"))  # CLIP score points
+
+
+def load_gate_results():
+    try:
+        with open(GATE_RESULTS_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def gate_passed(profile):
+    """True if the profile has a recorded, passing quality-gate run"""
+    return load_gate_results().get(profile, {}).get("passed", False)
+
+
+def _generate(pipe, prompts, num_steps, cfg_scale):
+    images = []
+    for i, prompt in enumerate(prompts):
+        generator = torch.Generator(device="cpu").manual_seed(i)
+        images.append(pipe(prompt, num_inference_steps=num_steps, guidance_scale=cfg_scale,
+                           generator=generator).images[0])
+    return images
+
+
+def run_quality_gate(profile, reference_profile="cpu-fp32", tolerance=DEFAULT_TOLERANCE,
+                     prompts=FINAL_SET_PROMPTS, num_steps=20, cfg_scale=7.5):
+    """Compare CLIP similarity of a candidate profile against the reference and record the verdict"""
+    from common.pipeline_loader import load_pipeline
+
+    results = {}
+    for name in (reference_profile, profile):
+        print(f"\nGenerating {len(prompts)} images with profile '{name}'...")
+        pipe = load_pipeline(name, enforce_quality_gate=False)
+        start_time = time.time()
+        images = _generate(pipe, prompts, num_steps, cfg_scale)
+        seconds = time.time() - start_time
+        del pipe
+
+        model, processor = load_clip()
+        scores = clip_scores(model, processor, images, prompts)
+        results[name] = {"clip_scores": scores, "mean_clip": sum(scores) / len(scores),
+                         "seconds_per_image": seconds / len(prompts)}
+        print(f"  Mean CLIP: {results[name]['mean_clip']:.4f} ({results[name]['seconds_per_image']:.1f}s/image)")
+
+    drop = results[reference_profile]["mean_clip"] - results[profile]["mean_clip"]
+    verdict = {
+        "passed": drop <= tolerance,
+        "reference_profile": reference_profile,
+        "reference_clip": results[reference_profile]["mean_clip"],
+        "candidate_clip": results[profile]["mean_clip"],
+        "clip_drop": drop,
+        "tolerance": tolerance,
+        "speedup": results[reference_profile]["seconds_per_image"] / results[profile]["seconds_per_image"],
+        "num_prompts": len(prompts),
+        "num_steps": num_steps,
+        "checked_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+    all_results = load_gate_results()
+    all_results[profile] = verdict
+    with open(GATE_RESULTS_FILE, "w") as f:
+        json.dump(all_results, f, indent=2)
+    return verdict
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="CLIP quality gate for a performance profile")
+    parser.add_argument("--profile", default="cpu-int8")
+    parser.add_argument("--reference", default="cpu-fp32")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Maximum allowed drop in mean CLIP score")
+    args = parser.parse_args()
+
+    print(f"Quality gate: '{args.profile}' vs '{args.reference}' (tolerance {args.tolerance})")
+    print("="*60)
+    verdict = run_quality_gate(args.profile, args.reference, args.tolerance)
+    print("\n" + "="*60)
+    print(f"CLIP drop: {verdict['clip_drop']:.4f} (tolerance {verdict['tolerance']})")
+    print(f"Speedup: {verdict['speedup']:.2f}x")
+    print("✓ PASSED - mode enabled" if verdict["passed"] else "❌ REJECTED - mode stays disabled")
+    print(f"Verdict saved to: {GATE_RESULTS_FILE}")
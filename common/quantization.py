@@ -0,0 +1,22 @@
+"""
+INT8 dynamic quantization for CPU inference.
+
+Replaces the nn.Linear layers of the UNet (attention q/k/v/out projections,
+feed-forward and time-embedding layers) and of the CLIP text encoder with
+dynamically quantized INT8 versions: weights are stored as int8 and
+activations are quantized on the fly, so the matmuls run in INT8. It requires
+float32 weights and is CPU-only.
+
+Because this changes the outputs, the mode is guarded by a quality gate
+(see quality_gate.py) that must pass before load_pipeline() enables it.
+"""
+
+import torch
+from torch.ao.quantization import quantize_dynamic
+
+
+def quantize_pipeline_int8(pipe):
+    """Quantize the UNet and text encoder linear layers in place"""
+    quantize_dynamic(pipe.unet, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    quantize_dynamic(pipe.text_encoder, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return pipe
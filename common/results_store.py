@@ -0,0 +1,243 @@
+"""
+SQLite store of generation, benchmark and metric results.
+
+Sweeps, benchmarks and the milestone3 metric scripts record a run here, tagged
+with the git commit, host and performance profile. Each run holds one row per
+measured value. The analysis plots read their numbers from the latest runs
+instead of hand-typed lists, and `compare` flags latency or memory
+regressions between two runs (or commits):
+
+    python -m common.results_store list
+    python -m common.results_store compare abc1234 latest --name cfg --threshold 0.10
+
+compare exits with status 1 when a regression beyond the threshold is found.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DB = Path(os.environ.get("T2I_RESULTS_DB", REPO_ROOT / "results.sqlite"))
+
+# Units compared by `compare`; every other measurement is reported but never flagged
+LATENCY_UNITS = {"s", "ms"}
+MEMORY_UNITS = {"MB"}
+DEFAULT_LATENCY_THRESHOLD = 0.10  # relative increase
+DEFAULT_MEMORY_THRESHOLD = 0.10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    git_commit TEXT,
+    profile TEXT,
+    host TEXT,
+    config TEXT
+);
+CREATE TABLE IF NOT EXISTS measurements (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    metric TEXT NOT NULL,
+    value REAL NOT NULL,
+    unit TEXT,
+    better TEXT NOT NULL DEFAULT 'lower',
+    params TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS measurements_run ON measurements(run_id);
+CREATE INDEX IF NOT EXISTS runs_name ON runs(kind, name);
+"""
+
+
+def current_commit():
+    """Short hash of the checked-out commit, or None outside a git checkout"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _params_key(params):
+    return json.dumps(params or {}, sort_keys=True)
+
+
+class ResultsStore:
+    """Runs and their measurements in one SQLite file"""
+
+    def __init__(self, path=RESULTS_DB):
+        self.path = Path(path)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def start_run(self, kind, name, profile=None, host=None, config=None):
+        """Create a run (kind: sweep, benchmark, generation or metric); returns its id"""
+        with self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO runs (kind, name, created_at, git_commit, profile, host, config) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, name, time.strftime("%Y-%m-%d %H:%M:%S"), current_commit(), profile,
+                 json.dumps(host) if host is not None else None, json.dumps(config or {}))
+            )
+        return cursor.lastrowid
+
+    def record(self, run_id, metric, value, unit="s", better="lower", params=None):
+        """Add one measured value to a run"""
+        self.record_many(run_id, [(metric, value, unit, better, params)])
+
+    def record_many(self, run_id, rows):
+        """Add (metric, value, unit, better, params) rows to a run in one transaction"""
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO measurements (run_id, metric, value, unit, better, params) VALUES (?, ?, ?, ?, ?, ?)",
+                [(run_id, metric, float(value), unit, better, _params_key(params))
+                 for metric, value, unit, better, params in rows]
+            )
+
+    def runs(self, kind=None, name=None, limit=None):
+        """Runs, newest first"""
+        query, args = "SELECT * FROM runs WHERE 1=1", []
+        if kind:
+            query += " AND kind = ?"
+            args.append(kind)
+        if name:
+            query += " AND name = ?"
+            args.append(name)
+        query += " ORDER BY id DESC"
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        return [dict(row) for row in self._conn.execute(query, args)]
+
+    def latest_run(self, kind=None, name=None):
+        runs = self.runs(kind, name, limit=1)
+        return runs[0] if runs else None
+
+    def resolve_run(self, ref, name=None):
+        """Run id for a reference: a run id, "latest", or a git commit prefix (latest run of it)"""
+        if str(ref).isdigit() and self._conn.execute("SELECT 1 FROM runs WHERE id = ?", (int(ref),)).fetchone():
+            return int(ref)
+        if ref == "latest":
+            run = self.latest_run(name=name)
+        else:
+            query, args = "SELECT * FROM runs WHERE git_commit LIKE ?", [f"{ref}%"]
+            if name:
+                query += " AND name = ?"
+                args.append(name)
+            run = self._conn.execute(query + " ORDER BY id DESC LIMIT 1", args).fetchone()
+        if run is None:
+            raise ValueError(f"No run matches '{ref}'" + (f" for '{name}'" if name else ""))
+        return run["id"]
+
+    def measurements(self, run_id, metric=None):
+        """Measurements of a run, each with its params decoded"""
+        query, args = "SELECT * FROM measurements WHERE run_id = ?", [run_id]
+        if metric:
+            query += " AND metric = ?"
+            args.append(metric)
+        rows = []
+        for row in self._conn.execute(query, args):
+            row = dict(row)
+            row["params"] = json.loads(row["params"])
+            rows.append(row)
+        return rows
+
+    def latest_values(self, kind, name, metric):
+        """(params, value) pairs of a metric from the latest run of kind/name; [] if there is none"""
+        run = self.latest_run(kind, name)
+        if run is None:
+            return []
+        return [(row["params"], row["value"]) for row in self.measurements(run["id"], metric)]
+
+    def axis_means(self, kind, name, metric, axis):
+        """Mean of a metric per value of one params key in the latest run, in first-seen order"""
+        groups = {}
+        for params, value in self.latest_values(kind, name, metric):
+            if axis in params:
+                groups.setdefault(params[axis], []).append(value)
+        return {key: sum(values) / len(values) for key, values in groups.items()}
+
+    def compare(self, base_run, new_run, latency_threshold=DEFAULT_LATENCY_THRESHOLD,
+                memory_threshold=DEFAULT_MEMORY_THRESHOLD):
+        """Match measurements of two runs by metric and params; returns one dict per matched pair"""
+        base = {(m["metric"], _params_key(m["params"])): m for m in self.measurements(base_run)}
+        changes = []
+        for m in self.measurements(new_run):
+            old = base.get((m["metric"], _params_key(m["params"])))
+            if old is None or old["value"] == 0:
+                continue
+            change = (m["value"] - old["value"]) / abs(old["value"])
+            worse = change > 0 if m["better"] == "lower" else change < 0
+            if m["unit"] in LATENCY_UNITS:
+                threshold = latency_threshold
+            elif m["unit"] in MEMORY_UNITS:
+                threshold = memory_threshold
+            else:
+                threshold = None
+            changes.append({
+                "metric": m["metric"],
+                "params": m["params"],
+                "unit": m["unit"],
+                "base": old["value"],
+                "new": m["value"],
+                "change": change,
+                "regression": threshold is not None and worse and abs(change) > threshold,
+            })
+        return changes
+
+
+def _format_params(params):
+    return " ".join(f"{k}={v}" for k, v in sorted(params.items()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspect and compare stored performance results")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = commands.add_parser("list", help="List recorded runs")
+    list_parser.add_argument("--kind")
+    list_parser.add_argument("--name")
+    list_parser.add_argument("--limit", type=int, default=20)
+
+    compare_parser = commands.add_parser("compare", help="Flag regressions between two runs or commits")
+    compare_parser.add_argument("base", help="Run id, git commit prefix or 'latest'")
+    compare_parser.add_argument("new", help="Run id, git commit prefix or 'latest'")
+    compare_parser.add_argument("--name", help="Restrict commit/latest lookups to runs with this name")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_LATENCY_THRESHOLD,
+                                help="Allowed relative latency increase")
+    compare_parser.add_argument("--memory-threshold", type=float, default=DEFAULT_MEMORY_THRESHOLD,
+                                help="Allowed relative memory increase")
+    args = parser.parse_args()
+
+    store = ResultsStore()
+    if args.command == "list":
+        for run in store.runs(args.kind, args.name, args.limit):
+            print(f"  #{run['id']:<4d} {run['created_at']}  {run['kind']:10s} {run['name']:20s} "
+                  f"commit={run['git_commit'] or '-'} profile={run['profile'] or '-'}")
+        sys.exit(0)
+
+    base_run = store.resolve_run(args.base, args.name)
+    new_run = store.resolve_run(args.new, args.name)
+    print(f"Comparing run #{base_run} → #{new_run} "
+          f"(latency threshold {args.threshold:.0%}, memory threshold {args.memory_threshold:.0%})")
+    print("="*60)
+    changes = store.compare(base_run, new_run, args.threshold, args.memory_threshold)
+    regressions = [c for c in changes if c["regression"]]
+    for c in changes:
+        mark = "❌" if c["regression"] else "  "
+        print(f"{mark} {c['metric']:28s} {_format_params(c['params']):40s} "
+              f"{c['base']:10.3f} → {c['new']:10.3f} {c['unit'] or '':3s} ({c['change']:+.1%})")
+    print("="*60)
+    if not changes:
+        print("No matching measurements between the two runs")
+    print(f"{len(regressions)} regression(s) beyond threshold" if regressions else "✓ No regressions")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,232 @@
+"""
+Batched denoising loop with one guidance scale per image.
+
+pipe(...) takes a single guidance_scale, so comparing K scales costs K full
+generations that each redraw the same starting noise. sample() runs the same
+Stable Diffusion 1.x loop but applies the guidance per batch row. K latent
+trajectories go through the UNet as one batch of 2K (unconditional +
+conditional rows). Text embeddings are passed in pre-computed, and images with
+the same seed share one initial noise draw. With one scale it produces the
+same images as pipe(prompt_embeds=..., generator=[...]) with CPU generators.
+
+Adaptive early exit (early_exit_threshold) tracks each image's predicted clean
+latent x0. Once its relative change between two steps falls below the
+threshold, the image jumps to the final timestep: x0 becomes its final latent
+and it leaves the UNet batch. The loop ends when every image has converged or
+num_inference_steps is reached. The steps each image used are returned.
+
+guidance_interval limits classifier-free guidance to part of the schedule,
+e.g. 0.6 = the first 60% of steps or (0.2, 0.8) = that window. Outside it
+only the conditional branch runs, so those steps evaluate the UNet on half
+the batch.
+
+deep_cache_interval runs the full UNet only every N steps and a shallow
+branch on cached deep features in between (common/deep_cache.py); the
+number of cached steps is returned.
+
+decoder="tiny" decodes with the TAESD tiny autoencoder (common/tiny_vae.py)
+for draft-quality images; output_type="latent" skips decoding.
+
+Passing a StageTimer (common/stage_timer.py) times every UNet step, scheduler
+step, VAE decode and safety check separately.
+
+    output = sample(pipe, prompt_embeds, negative_prompt_embeds,
+                    guidance_scales=[3.0, 7.5, 15.0], seeds=[0, 0, 0])
+    output.images, output.steps_used
+"""
+
+from dataclasses import dataclass
+
+import torch
+
+from common.deep_cache import DeepCache
+from common.stage_timer import no_stage
+from common.tiny_vae import DECODERS, decode_tiny
+
+DEFAULT_EARLY_EXIT_THRESHOLD = 0.02
+DEFAULT_MIN_STEPS = 8
+
+
+@dataclass
+class SampleOutput:
+    """Generated images plus the denoising steps each one used"""
+    images: list
+    steps_used: list
+    cached_steps: int = 0  # steps that reused cached deep UNet features
+    unet_calls: int = 0  # denoising loop iterations; PNDM makes one more than num_inference_steps
+    guided_steps: int = 0  # UNet calls that applied classifier-free guidance
+    unet_rows: int = 0  # latent rows evaluated by the UNet over all calls
+
+
+def initial_latents(pipe, seeds, height, width, dtype, device):
+    """Starting noise for each seed (CPU generators, one draw per distinct seed)"""
+    shape = (1, pipe.unet.config.in_channels, height // pipe.vae_scale_factor, width // pipe.vae_scale_factor)
+    noise = {}
+    for seed in dict.fromkeys(seeds):
+        generator = torch.Generator(device="cpu").manual_seed(seed)
+        noise[seed] = torch.randn(shape, generator=generator, dtype=dtype)
+    latents = torch.cat([noise[seed] for seed in seeds], dim=0).to(device)
+    return latents * pipe.scheduler.init_noise_sigma
+
+
+def decode_latents(pipe, latents, output_type="pil", timer=None, decoder="full"):
+    """VAE-decode final latents (full VAE or TAESD) and run the pipeline's safety checker"""
+    if output_type == "latent":
+        return latents
+    stage = timer.stage if timer else no_stage
+    device = latents.device
+    with stage("vae_decode"):
+        if decoder == "tiny":
+            image = decode_tiny(latents)
+        else:
+            image = pipe.vae.decode(latents / pipe.vae.config.scaling_factor, return_dict=False)[0]
+    with stage("safety_checker"):
+        image, has_nsfw_concept = pipe.run_safety_checker(image, device, latents.dtype)
+    if has_nsfw_concept is None:
+        do_denormalize = [True] * image.shape[0]
+    else:
+        do_denormalize = [not nsfw for nsfw in has_nsfw_concept]
+    with stage("postprocess"):
+        return pipe.image_processor.postprocess(image, output_type=output_type, do_denormalize=do_denormalize)
+
+
+def predicted_x0(scheduler, step, timestep, latents, noise_pred):
+    """Clean-latent estimate implied by an epsilon prediction at this step"""
+    if float(scheduler.init_noise_sigma) != 1.0:
+        # Latents in sigma space (Euler, LMS): x = x0 + sigma * eps. Other schedulers may
+        # expose sigmas too (DPM-Solver) but keep variance-preserving latents
+        sigma = scheduler.sigmas[step].to(latents.device, latents.dtype)
+        return latents - sigma * noise_pred
+    # Variance-preserving latents (PNDM, DDIM, DPM-Solver): x = sqrt(a) * x0 + sqrt(1 - a) * eps
+    alpha_prod = scheduler.alphas_cumprod[int(timestep)].to(latents.device, latents.dtype)
+    return (latents - (1 - alpha_prod) ** 0.5 * noise_pred) / alpha_prod ** 0.5
+
+
+def guidance_active(step, num_steps, guidance_interval):
+    """True if CFG applies at this step; guidance_interval is an end fraction or (start, end) fractions"""
+    if guidance_interval is None:
+        return True
+    if isinstance(guidance_interval, (tuple, list)):
+        start, end = guidance_interval
+    else:
+        start, end = 0.0, guidance_interval
+    return start <= step / num_steps < end
+
+
+def x0_change(x0, previous_x0):
+    """Per-image relative L2 change between two x0 estimates"""
+    difference = (x0 - previous_x0).flatten(1).float().norm(dim=1)
+    return difference / previous_x0.flatten(1).float().norm(dim=1).clamp_min(1e-8)
+
+
+@torch.no_grad()
+def sample(pipe, prompt_embeds, negative_prompt_embeds, guidance_scales, seeds,
+           num_inference_steps=20, height=512, width=512, on_step_end=None, output_type="pil",
+           early_exit_threshold=None, min_steps=DEFAULT_MIN_STEPS, deep_cache_interval=None, decoder="full",
+           guidance_interval=None, timer=None):
+    """Generate one image per row of prompt_embeds, each with its own guidance scale and seed
+
+    on_step_end(step, timestep, latents) is called after every denoising step
+    (e.g. for previews or cancellation). early_exit_threshold enables adaptive
+    stepping; images never exit before min_steps. deep_cache_interval > 1 reuses
+    deep UNet features between full steps. decoder="tiny" gives draft-quality
+    images from TAESD. guidance_interval restricts CFG to part of the steps.
+    timer collects per-stage timings.
+    """
+    batch_size = prompt_embeds.shape[0]
+    if not len(guidance_scales) == len(seeds) == batch_size == negative_prompt_embeds.shape[0]:
+        raise ValueError("prompt_embeds, negative_prompt_embeds, guidance_scales and seeds "
+                         "must all have one entry per image")
+    if decoder not in DECODERS:
+        raise ValueError(f"Unknown decoder '{decoder}'. Choose from: {', '.join(DECODERS)}")
+
+    device = pipe._execution_device
+    dtype = prompt_embeds.dtype
+    scheduler = pipe.scheduler
+    scheduler.set_timesteps(num_inference_steps, device=device)
+    extra_step_kwargs = pipe.prepare_extra_step_kwargs(None, 0.0)
+    stage = timer.stage if timer else no_stage
+
+    # Scales <= 1 mean "no guidance" in pipe(); if no row needs it, skip the unconditional half
+    do_guidance = any(scale > 1.0 for scale in guidance_scales)
+    if do_guidance:
+        encoder_hidden_states = torch.cat([negative_prompt_embeds, prompt_embeds]).to(device)
+    else:
+        encoder_hidden_states = prompt_embeds.to(device)
+    guidance = torch.tensor(guidance_scales, dtype=dtype, device=device).view(-1, 1, 1, 1)
+
+    latents = initial_latents(pipe, seeds, height, width, dtype, device)
+
+    adaptive = bool(early_exit_threshold)
+    # PNDM runs one more UNet call than it has denoising steps; steps are reported
+    # against num_inference_steps, the loop runs over every timestep
+    num_steps = len(scheduler.timesteps)
+    steps_used = [num_inference_steps] * batch_size
+    active = torch.ones(batch_size, dtype=torch.bool, device=device)
+    exited_latents = torch.zeros_like(latents)
+    previous_x0 = None
+    unet_calls = guided_steps = unet_rows = 0
+
+    # Deep features are only reused within this call; the hook is removed even on cancellation
+    use_deep_cache = deep_cache_interval is not None and deep_cache_interval > 1
+    deep_cache = DeepCache(pipe.unet, deep_cache_interval) if use_deep_cache else None
+    try:
+        for step, t in enumerate(scheduler.timesteps):
+            # Exited images are left out of the UNet batch; only the active rows are evaluated
+            rows = active.nonzero().squeeze(1) if adaptive else slice(None)
+            # Outside the guidance interval only the conditional half goes through the UNet
+            guided = do_guidance and guidance_active(step, num_steps, guidance_interval)
+            model_input = torch.cat([latents[rows]] * 2) if guided else latents[rows]
+            unet_calls += 1
+            guided_steps += guided
+            unet_rows += model_input.shape[0]
+            model_input = scheduler.scale_model_input(model_input, t)
+            if do_guidance:
+                hidden_states = encoder_hidden_states.view(2, batch_size, *prompt_embeds.shape[1:])
+                hidden_states = hidden_states[:, rows].flatten(0, 1) if guided else hidden_states[1, rows]
+            else:
+                hidden_states = encoder_hidden_states[rows]
+            with stage("unet_step"):
+                if deep_cache is not None:
+                    rows_key = (tuple(rows.tolist()) if adaptive else None, guided)
+                    noise_pred = deep_cache(step, model_input, t, hidden_states, rows_key)
+                else:
+                    noise_pred = pipe.unet(model_input, t, encoder_hidden_states=hidden_states,
+                                           return_dict=False)[0]
+
+                if guided:
+                    noise_uncond, noise_text = noise_pred.chunk(2)
+                    noise_pred = noise_uncond + guidance[rows] * (noise_text - noise_uncond)
+            if adaptive:
+                # The scheduler still steps the whole batch; exited rows get a zero prediction
+                # and are overwritten with their exit latent below
+                full_pred = torch.zeros_like(latents)
+                full_pred[rows] = noise_pred.to(latents.dtype)
+                noise_pred = full_pred
+                x0 = predicted_x0(scheduler, step, t, latents, noise_pred)
+
+            with stage("scheduler_step"):
+                latents = scheduler.step(noise_pred, t, latents, **extra_step_kwargs, return_dict=False)[0]
+
+            if adaptive:
+                if previous_x0 is not None and min_steps <= step + 1 < num_steps:
+                    converged = active & (x0_change(x0, previous_x0) < early_exit_threshold)
+                    for i in converged.nonzero().squeeze(1).tolist():
+                        steps_used[i] = min(step + 1, num_inference_steps)
+                        # Jump to the final timestep: the x0 estimate is the image's final latent
+                        exited_latents[i] = x0[i]
+                    active &= ~converged
+                latents = torch.where(active.view(-1, 1, 1, 1), latents, exited_latents)
+                previous_x0 = x0
+
+            if on_step_end is not None:
+                on_step_end(step, t, latents)
+            if adaptive and not active.any():
+                break
+    finally:
+        if deep_cache is not None:
+            deep_cache.close()
+
+    return SampleOutput(images=decode_latents(pipe, latents, output_type, timer, decoder), steps_used=steps_used,
+                        cached_steps=deep_cache.cached_steps if deep_cache else 0, unet_calls=unet_calls,
+                        guided_steps=guided_steps, unet_rows=unet_rows)
@@ -0,0 +1,120 @@
+"""
+Fast prompt spell correction (replacement for TextBlob(text).correct()).
+
+TextBlob generates every edit-distance-1 and -2 variant of each word and looks
+them up one by one. That is a large per-word search, repeated on every
+generation. This corrector uses the symmetric-delete method instead. Deletes
+of every dictionary word are indexed once. A query only generates the deletes
+of the input word, looks them up, and verifies the few candidates with a real
+(Damerau-Levenshtein) distance.
+
+It uses TextBlob's own word-frequency model and the same selection rule
+(known word > most frequent distance-1 candidate > most frequent distance-2
+candidate > unchanged), so its corrections match TextBlob's. Word results are
+memoized with an LRU cache. Art and style terms in PROTECTED_TERMS are never
+"corrected".
+"""
+
+import re
+from functools import lru_cache
+
+# Prompt vocabulary that is missing from (or misranked by) the general English model
+PROTECTED_TERMS = {
+    "cyberpunk", "steampunk", "dieselpunk", "solarpunk", "synthwave", "vaporwave",
+    "bokeh", "hdr", "8k", "4k", "anime", "manga", "chibi", "kawaii", "ukiyo",
+    "photorealistic", "hyperrealistic", "photoreal", "cinematic", "isometric",
+    "lowpoly", "voxel", "pixelart", "artstation", "octane", "unreal", "midjourney",
+    "watercolor", "gouache", "impasto", "chiaroscuro", "sfumato", "pointillism",
+    "linework", "brushstrokes", "cel", "ethereal", "dreamlike", "dystopian",
+    "futuristic", "neon", "koi", "bonsai", "acacia", "savanna", "lamplight",
+}
+
+MAX_EDIT_DISTANCE = 2
+PREFIX_LENGTH = 7  # only the first characters are indexed, as in SymSpell
+WORD_PATTERN = re.compile(r"[A-Za-z]+(?:'[A-Za-z]+)?|[^A-Za-z]+")
+
+
+def _deletes(word, max_distance):
+    """All strings reachable from word by deleting up to max_distance characters"""
+    results = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        results |= frontier
+    return results
+
+
+def edit_distance(a, b, max_distance=MAX_EDIT_DISTANCE):
+    """Optimal-string-alignment distance (insert/delete/substitute/transpose)"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return previous[len(b)]
+
+
+def load_textblob_word_counts():
+    """Word frequencies of the model TextBlob.correct() uses"""
+    from textblob.en import spelling
+    return {word: count for word, count in spelling.items()}
+
+
+class SpellCorrector:
+    """Symmetric-delete spell corrector with memoized word results"""
+
+    def __init__(self, word_counts=None, protected_terms=(), cache_size=50_000):
+        self.word_counts = word_counts if word_counts is not None else load_textblob_word_counts()
+        self.protected = {term.lower() for term in PROTECTED_TERMS | set(protected_terms)}
+        self._index = {}
+        for word in self.word_counts:
+            for deleted in _deletes(word[:PREFIX_LENGTH], MAX_EDIT_DISTANCE):
+                self._index.setdefault(deleted, []).append(word)
+        self.correct_word = lru_cache(maxsize=cache_size)(self._correct_word)
+
+    def _candidates(self, word):
+        """Dictionary words within MAX_EDIT_DISTANCE, grouped by distance"""
+        by_distance = {}
+        seen = set()
+        for deleted in _deletes(word[:PREFIX_LENGTH], MAX_EDIT_DISTANCE):
+            for candidate in self._index.get(deleted, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                distance = edit_distance(word, candidate)
+                if distance <= MAX_EDIT_DISTANCE:
+                    by_distance.setdefault(distance, []).append(candidate)
+        return by_distance
+
+    def _correct_word(self, word):
+        lower = word.lower()
+        if len(word) == 1 or lower in self.protected or lower in self.word_counts:
+            return word
+        by_distance = self._candidates(lower)
+        for distance in range(1, MAX_EDIT_DISTANCE + 1):
+            if by_distance.get(distance):
+                best = max(by_distance[distance], key=lambda c: (self.word_counts[c], c))
+                break
+        else:
+            return word
+        if word.isupper():
+            return best.upper()
+        if word.istitle():
+            return best.title()
+        return best
+
+    def correct(self, text):
+        """Correct every word of a prompt, leaving spacing and punctuation untouched"""
+        pieces = []
+        for token in WORD_PATTERN.findall(text):
+            if token[0].isalpha() and "'" not in token:
+                token = self.correct_word(token)
+            pieces.append(token)
+        return "".join(pieces)
@@ -0,0 +1,109 @@
+"""
+Per-stage wall-clock timing for generation benchmarks.
+
+sample() and decode_latents() accept a timer and wrap each stage (UNet step,
+scheduler step, VAE decode, ...) in timer.stage(name). Timings are collected
+with time.perf_counter(). On CUDA, pass synchronize=torch.cuda.synchronize so
+asynchronous kernels are attributed to the right stage.
+
+    timer = StageTimer()
+    with timer.stage("text_encoding"):
+        ...
+    timer.summary()  # {"text_encoding": {"count": 1, "p50": ..., "p95": ..., "max": ...}}
+"""
+
+import math
+import os
+import platform
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers (q in 0-100)"""
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def no_stage(name):
+    """Stand-in for StageTimer.stage when nothing is being timed"""
+    return nullcontext()
+
+
+class StageTimer:
+    """Collects durations per named stage"""
+
+    def __init__(self, synchronize=None):
+        self.synchronize = synchronize
+        self.samples = {}
+
+    @contextmanager
+    def stage(self, name):
+        if self.synchronize:
+            self.synchronize()
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.synchronize:
+                self.synchronize()
+            self.samples.setdefault(name, []).append(time.perf_counter() - start_time)
+
+    def reset(self):
+        self.samples = {}
+
+    def summary(self):
+        """count, total, mean, p50, p95 and max seconds for every stage"""
+        return {
+            name: {
+                "count": len(values),
+                "total": sum(values),
+                "mean": sum(values) / len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "max": max(values),
+            }
+            for name, values in self.samples.items()
+        }
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (None where `resource` is missing, e.g. Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def host_info():
+    """Hardware and torch threading settings to tag benchmark results with"""
+    import torch
+
+    cpu_model = platform.processor()
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    cpu_model = line.split(":", 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    return {
+        "hostname": platform.node(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_model": cpu_model,
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "torch_num_threads": torch.get_num_threads(),
+        "torch_num_interop_threads": torch.get_num_interop_threads(),
+        "omp_num_threads": os.environ.get("OMP_NUM_THREADS"),
+        "mkldnn": torch.backends.mkldnn.is_available(),
+        "cuda": torch.cuda.get_device_name(0) if torch.cuda.is_available() else None,
+    }
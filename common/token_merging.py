@@ -0,0 +1,162 @@
+"""
+Token merging (ToMe for Stable Diffusion) on the UNet's self-attention.
+
+At 512x512 the highest-resolution transformer blocks attend over 64x64 = 4096
+latent tokens, and that attention is a large part of every CPU step. Token
+merging pairs each of `ratio` × N tokens with its most similar token, using
+bipartite soft matching against one random destination per 2x2 patch. The
+pairs are averaged, self-attention (attn1) runs on the shorter sequence, and
+the output is copied back to every merged position, so the rest of the block
+sees the usual N tokens. Cross-attention and the MLP are left alone. Only
+blocks at up to `max_downsample` times the latent resolution merge (1 = just
+the 4096-token blocks).
+
+The random destinations are seeded from the timestep, so the same seed and
+settings always give the same image. The ratio can change between
+generations without reloading the model:
+
+    apply_token_merging(pipe, ratio=0.5)
+    apply_token_merging(pipe, ratio=0.0)   # off again
+"""
+
+import functools
+import math
+from dataclasses import dataclass
+
+import torch
+
+DEFAULT_RATIO = 0.5
+MAX_RATIO = 0.75
+
+
+@dataclass
+class TokenMergingState:
+    """Settings shared by every patched attention layer of one UNet"""
+    ratio: float = 0.0
+    max_downsample: int = 1
+    stride: tuple = (2, 2)
+    seed: int = 0
+    latent_size: tuple = None
+    generator: torch.Generator = None
+
+
+def bipartite_soft_matching(metric, height, width, stride, r, generator):
+    """merge/unmerge functions that remove r of the N tokens in metric (B, N, C)"""
+    batch, num_tokens, _ = metric.shape
+    sy, sx = stride
+    device = metric.device
+
+    with torch.no_grad():
+        hsy, wsx = height // sy, width // sx
+        # One random destination token per sy × sx patch; every other token is a source
+        rand_idx = torch.randint(sy * sx, size=(hsy, wsx, 1), generator=generator).to(device)
+        idx_buffer = torch.zeros(hsy, wsx, sy * sx, device=device, dtype=torch.int64)
+        idx_buffer.scatter_(dim=2, index=rand_idx, src=-torch.ones_like(rand_idx))
+        idx_buffer = idx_buffer.view(hsy, wsx, sy, sx).transpose(1, 2).reshape(hsy * sy, wsx * sx)
+        if hsy * sy < height or wsx * sx < width:
+            padded = torch.zeros(height, width, device=device, dtype=torch.int64)
+            padded[:hsy * sy, :wsx * sx] = idx_buffer
+            idx_buffer = padded
+        order = idx_buffer.reshape(1, -1, 1).argsort(dim=1)
+        num_dst = hsy * wsx
+        a_idx = order[:, num_dst:, :]  # sources
+        b_idx = order[:, :num_dst, :]  # destinations
+
+        def split(x):
+            channels = x.shape[-1]
+            src = torch.gather(x, dim=1, index=a_idx.expand(batch, num_tokens - num_dst, channels))
+            dst = torch.gather(x, dim=1, index=b_idx.expand(batch, num_dst, channels))
+            return src, dst
+
+        metric = metric / metric.norm(dim=-1, keepdim=True)
+        a, b = split(metric)
+        scores = a @ b.transpose(-1, -2)
+        r = min(a.shape[1], r)
+
+        # The r sources most similar to some destination are merged into it
+        node_max, node_idx = scores.max(dim=-1)
+        edge_idx = node_max.argsort(dim=-1, descending=True)[..., None]
+        unm_idx = edge_idx[..., r:, :]
+        src_idx = edge_idx[..., :r, :]
+        dst_idx = torch.gather(node_idx[..., None], dim=-2, index=src_idx)
+
+    def merge(x):
+        src, dst = split(x)
+        n, t1, c = src.shape
+        unm = torch.gather(src, dim=-2, index=unm_idx.expand(n, t1 - r, c))
+        src = torch.gather(src, dim=-2, index=src_idx.expand(n, r, c))
+        dst = dst.scatter_reduce(-2, dst_idx.expand(n, r, c), src, reduce="mean")
+        return torch.cat([unm, dst], dim=1)
+
+    def unmerge(x):
+        unm_len = unm_idx.shape[1]
+        unm, dst = x[..., :unm_len, :], x[..., unm_len:, :]
+        c = unm.shape[-1]
+        src = torch.gather(dst, dim=-2, index=dst_idx.expand(batch, r, c))
+        a_positions = a_idx.expand(batch, a_idx.shape[1], 1)
+        out = torch.zeros(batch, num_tokens, c, device=x.device, dtype=x.dtype)
+        out.scatter_(dim=-2, index=b_idx.expand(batch, num_dst, c), src=dst)
+        out.scatter_(dim=-2, index=torch.gather(a_positions, dim=1, index=unm_idx).expand(batch, unm_len, c),
+                     src=unm)
+        out.scatter_(dim=-2, index=torch.gather(a_positions, dim=1, index=src_idx).expand(batch, r, c), src=src)
+        return out
+
+    return merge, unmerge
+
+
+def _merging_forward(forward, state):
+    @functools.wraps(forward)
+    def wrapped(hidden_states, encoder_hidden_states=None, *args, **kwargs):
+        if state.ratio <= 0 or encoder_hidden_states is not None or state.latent_size is None:
+            return forward(hidden_states, encoder_hidden_states, *args, **kwargs)
+
+        latent_height, latent_width = state.latent_size
+        num_tokens = hidden_states.shape[1]
+        downsample = int(math.ceil(math.sqrt(latent_height * latent_width / num_tokens)))
+        if downsample > state.max_downsample:
+            return forward(hidden_states, encoder_hidden_states, *args, **kwargs)
+
+        height = int(math.ceil(latent_height / downsample))
+        width = int(math.ceil(latent_width / downsample))
+        merge, unmerge = bipartite_soft_matching(hidden_states, height, width, state.stride,
+                                                 int(num_tokens * state.ratio), state.generator)
+        return unmerge(forward(merge(hidden_states), encoder_hidden_states, *args, **kwargs))
+    return wrapped
+
+
+def _record_latent_size(state):
+    def hook(module, args, kwargs):
+        sample = args[0] if args else kwargs["sample"]
+        timestep = args[1] if len(args) > 1 else kwargs.get("timestep", 0)
+        state.latent_size = tuple(sample.shape[-2:])
+        # Same destinations for the same step of every generation; different across steps
+        timestep = int(timestep.flatten()[0]) if torch.is_tensor(timestep) else int(timestep)
+        state.generator.manual_seed(state.seed + timestep)
+    return hook
+
+
+def apply_token_merging(pipe, ratio=DEFAULT_RATIO, max_downsample=1, seed=0):
+    """Enable token merging at this ratio (0 disables it); patches the UNet on first use"""
+    if not 0 <= ratio <= MAX_RATIO:
+        raise ValueError(f"Token merging ratio must be between 0 and {MAX_RATIO}")
+    unet = pipe.unet
+    state = getattr(unet, "_token_merging", None)
+    if state is None:
+        from diffusers.models.attention import BasicTransformerBlock
+
+        state = TokenMergingState(generator=torch.Generator(device="cpu"))
+        for module in unet.modules():
+            if isinstance(module, BasicTransformerBlock):
+                module.attn1.forward = _merging_forward(module.attn1.forward, state)
+        unet.register_forward_pre_hook(_record_latent_size(state), with_kwargs=True)
+        unet._token_merging = state
+    state.ratio = ratio
+    state.max_downsample = max_downsample
+    state.seed = seed
+    return state
+
+
+def token_merging_ratio(pipe):
+    """Current merge ratio of the pipeline's UNet (0 if merging was never applied)"""
+    state = getattr(pipe.unet, "_token_merging", None)
+    return state.ratio if state else 0.0
@@ -1,10 +1,26 @@
 import streamlit as st
-from diffusers import StableDiffusionPipeline
 import torch
 from datetime import datetime
-from textblob import TextBlob
-from transformers import CLIPProcessor, CLIPModel
 from PIL import Image
+import re
+import time
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from generation_scheduler import GenerationRequest, GenerationScheduler
+from result_cache import ResultCache
+from common.clip_scoring import ClipScorer, load_clip
+from common.deep_cache import DEFAULT_CACHE_INTERVAL
+from common.host_profile import host_batch_size
+from common.image_writer import ImageWriter, encode_image
+from common.pipeline_loader import (DEFAULT_PROFILE, MODEL_ID, PERFORMANCE_PROFILES, load_pipeline, resolve_profile,
+                                    token_merging_limit)
+from common.prompt_embeddings import PromptEmbeddingCache
+from common.sampling import DEFAULT_EARLY_EXIT_THRESHOLD
+from common.spell_corrector import SpellCorrector
+from common.tiny_vae import tiny_vae_available
+from common.token_merging import DEFAULT_RATIO, MAX_RATIO
 
 # Page config
 st.set_page_config(
@@ -13,43 +29,176 @@ st.set_page_config(
     layout="centered"
 )
 
+RESULT_CACHE_DIR = Path(__file__).parent / "result_cache"
+
 # ============================================
 # HELPER FUNCTIONS
 # ============================================
 
+@st.cache_resource
+def load_spell_corrector():
+    """Symmetric-delete spell corrector; style preset words are never corrected (cached)"""
+    style_terms = {word for suffix in STYLE_PRESETS.values() for word in re.findall(r"[A-Za-z0-9]+", suffix)}
+    return SpellCorrector(protected_terms=style_terms)
+
 def fix_spelling(text):
     """Fix spelling mistakes in prompt"""
-    blob = TextBlob(text)
-    corrected = str(blob.correct())
-    return corrected
+    return load_spell_corrector().correct(text)
 
 @st.cache_resource
-def load_diffusion_model():
-    """Load Stable Diffusion model (cached)"""
-    with st.spinner("Loading Stable Diffusion model... (first time only)"):
-        model_id = "runwayml/stable-diffusion-v1-5"
-        pipe = StableDiffusionPipeline.from_pretrained(model_id, torch_dtype=torch.float32)
-        device = "mps" if torch.backends.mps.is_available() else "cpu"
-        pipe = pipe.to(device)
+def load_diffusion_model(profile):
+    """Load Stable Diffusion model with a performance profile (cached per profile)"""
+    with st.spinner(f"Loading Stable Diffusion model ({profile})... (first time only)"):
+        pipe = load_pipeline(profile)
+    # Warm the text-encoder memoization with the model, not inside the first generation request
+    with st.spinner("Encoding example prompts... (first time only)"):
+        get_prompt_embedding_cache(profile, pipe)
     return pipe
 
 @st.cache_resource
 def load_clip_model():
-    """Load CLIP model for similarity scoring (cached)"""
-    model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
-    processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
+    """Load CLIP scoring service with cached text/image features (cached)"""
     device = "mps" if torch.backends.mps.is_available() else "cpu"
-    model = model.to(device)
-    return model, processor, device
-
-def calculate_clip_score(image, prompt):
-    """Calculate CLIP similarity between image and prompt"""
-    model, processor, device = load_clip_model()
-    inputs = processor(text=[prompt], images=image, return_tensors="pt", padding=True)
-    inputs = {k: v.to(device) for k, v in inputs.items()}
-    outputs = model(**inputs)
-    similarity = outputs.logits_per_image[0][0].item()
-    return similarity
+    model, processor = load_clip(device)
+    return ClipScorer(model, processor)
+
+@st.cache_resource
+def get_prompt_embedding_cache(profile, _pipe):
+    """Text-encoder memoization warmed with the example prompts and styles (cached per profile)"""
+    cache = PromptEmbeddingCache(_pipe, f"{MODEL_ID}:{profile}")
+    warm_texts = [""] + COMMON_NEGATIVE_PROMPTS
+    for example in EXAMPLE_PROMPTS.values():
+        warm_texts += [example + suffix for suffix in STYLE_PRESETS.values()]
+    cache.warm(warm_texts)
+    return cache
+
+@st.cache_resource
+def get_generation_scheduler(profile):
+    """Generation queue shared by every session using this profile (cached)"""
+    pipe = load_diffusion_model(profile)
+    return GenerationScheduler(pipe, get_prompt_embedding_cache(profile, pipe),
+                               max_batch_images=host_batch_size(4), max_token_merging=token_merging_limit(profile))
+
+@st.cache_resource
+def get_result_cache():
+    """On-disk cache of generated images shared by every session (cached)"""
+    return ResultCache(RESULT_CACHE_DIR)
+
+@st.cache_resource
+def get_image_writer():
+    """Background PNG encoder shared by every session (cached)"""
+    return ImageWriter("png", max_workers=2)
+
+def cancel_active_generation():
+    """Button callback: cancel the generation this session is waiting for"""
+    ticket = st.session_state.get("active_ticket")
+    if ticket is not None and not ticket.future.done():
+        ticket.cancel()
+        st.session_state.generation_cancelled = True
+    st.session_state.active_ticket = None
+
+def wait_for_generation(ticket, label):
+    """Show queue position, ETA and live previews until the ticket's images are ready"""
+    st.session_state.active_ticket = ticket
+    status = st.empty()
+    progress = st.empty()
+    preview_slot = st.empty()
+    cancel_slot = st.empty()
+    cancel_slot.button("⏹️ Cancel", on_click=cancel_active_generation, key="cancel_generation")
+    num_steps = ticket.request.num_steps
+    while not ticket.future.done():
+        position = ticket.position()
+        if position:
+            status.info(f"⏳ {label}: #{position} in queue, ready in ~{ticket.eta():.0f}s")
+        else:
+            status.info(f"🎨 {label}: step {ticket.step}/{num_steps}, ready in ~{ticket.eta():.0f}s")
+            progress.progress(ticket.step / num_steps)
+        if ticket.previews:
+            preview_slot.image(ticket.previews, caption=[f"Preview (step {ticket.step})"] * len(ticket.previews))
+        time.sleep(0.5)
+    status.empty()
+    progress.empty()
+    preview_slot.empty()
+    cancel_slot.empty()
+    st.session_state.active_ticket = None
+    return ticket.future.result()
+
+def generate_with_cache(request, label, profile):
+    """Return one entry per seed, generating only the seeds missing from the cache"""
+    cache = get_result_cache()
+    keys, entries = {}, {}
+    for seed in request.seeds:
+        keys[seed] = ResultCache.make_key(
+            prompt=request.prompt,
+            negative_prompt=request.negative_prompt or "",
+            num_steps=request.num_steps,
+            cfg_scale=request.cfg_scale,
+            scheduler=request.scheduler,
+            seed=seed,
+            model_id=MODEL_ID,
+            profile=profile,
+            early_exit=request.early_exit_threshold,
+            token_merging=request.token_merging,
+            deep_cache=request.deep_cache_interval,
+            decoder=request.decoder,
+            guidance_interval=request.guidance_interval
+        )
+        hit = cache.get(keys[seed])
+        if hit:
+            image, metadata = hit
+            entries[seed] = {"key": keys[seed], "image": image, "clip_score": metadata.get("clip_score"),
+                             "steps_used": metadata.get("steps_used", request.num_steps), "cached": True}
+
+    result = None
+    missing = [seed for seed in request.seeds if seed not in entries]
+    if missing:
+        request.seeds = missing
+        result = wait_for_generation(get_generation_scheduler(profile).submit(request), label)
+        for seed, image, steps_used in zip(result.seeds, result.images, result.steps_used):
+            metadata = {
+                "prompt": request.prompt,
+                "negative_prompt": request.negative_prompt or "",
+                "num_steps": request.num_steps,
+                "cfg_scale": request.cfg_scale,
+                "scheduler": request.scheduler,
+                "seed": seed,
+                "model_id": MODEL_ID,
+                "profile": profile,
+                "early_exit": request.early_exit_threshold,
+                "token_merging": request.token_merging,
+                "deep_cache": request.deep_cache_interval,
+                "decoder": request.decoder,
+                "guidance_interval": request.guidance_interval,
+                "steps_used": steps_used,
+                "seconds_per_image": result.seconds_per_image,
+                "clip_score": None
+            }
+            # Encoded and cached in the background while CLIP scoring and rendering go on
+            def store(data, key=keys[seed], metadata=metadata):
+                cache.put_encoded(key, data, metadata)
+            encoded = get_image_writer().submit_encode(image, metadata, then=store)
+            entries[seed] = {"key": keys[seed], "image": image, "clip_score": None,
+                             "steps_used": steps_used, "cached": False, "encoded": encoded}
+    return [entries[seed] for seed in keys], result
+
+def score_entries(entries, prompt):
+    """Fill in missing CLIP scores for generated entries in one batch and cache them"""
+    missing = [entry for entry in entries if entry["clip_score"] is None]
+    if missing:
+        scores = load_clip_model().score([entry["image"] for entry in missing], prompt)
+        for entry, score in zip(missing, scores):
+            entry["clip_score"] = score
+            if entry.get("encoded") is not None:
+                entry["encoded"].result()  # the cache entry must exist before it can be updated
+            get_result_cache().update_metadata(entry["key"], clip_score=score)
+    return [entry["clip_score"] for entry in entries]
+
+def entry_png(entry):
+    """PNG bytes for the download button, without encoding on the request path when possible"""
+    if entry.get("encoded") is not None:
+        return entry["encoded"].result()
+    data = get_result_cache().get_bytes(entry["key"])
+    return data if data is not None else encode_image(entry["image"], "png")
 
 # ============================================
 # STYLE PRESETS
@@ -66,6 +215,19 @@ STYLE_PRESETS = {
     "Fantasy Art": ", fantasy art, magical, ethereal, dreamlike, mystical"
 }
 
+EXAMPLE_PROMPTS = {
+    "🦁 Lion": "A majestic lion in the African savanna",
+    "🌅 Sunset": "A beautiful sunset over the ocean",
+    "🏰 Castle": "A medieval castle on a cliff",
+    "🌸 Garden": "A peaceful zen garden with cherry blossoms"
+}
+
+COMMON_NEGATIVE_PROMPTS = [
+    "blurry, cartoon, low quality, watermark, text",
+    "blurry, low quality",
+    "watermark, text"
+]
+
 # ============================================
 # SESSION STATE INITIALIZATION
 # ============================================
@@ -73,6 +235,12 @@ STYLE_PRESETS = {
 if 'prompt_history' not in st.session_state:
     st.session_state.prompt_history = []
 
+# Any interaction reruns the script and abandons the generation being waited for,
+# so cancel it instead of letting the worker finish images nobody will see
+if st.session_state.get("active_ticket") is not None:
+    st.session_state.active_ticket.cancel()
+    st.session_state.active_ticket = None
+
 # ============================================
 # MAIN UI
 # ============================================
@@ -98,6 +266,20 @@ cfg_scale = st.sidebar.slider(
     step=0.5,
     help="How closely to follow the prompt (7.5 is optimal)"
 )
+use_guidance_interval = st.sidebar.checkbox(
+    "Guidance interval",
+    value=False,
+    help="Apply CFG only in the early steps; later steps run the UNet on the prompt alone (half the work)"
+)
+guidance_interval = st.sidebar.slider(
+    "CFG for the first fraction of steps",
+    min_value=0.2,
+    max_value=1.0,
+    value=0.6,
+    step=0.1,
+    disabled=not use_guidance_interval,
+    help="0.6 = guidance in the first 60% of steps"
+)
 
 num_steps = st.sidebar.slider(
     "Inference Steps",
@@ -108,6 +290,35 @@ num_steps = st.sidebar.slider(
     help="More steps = better quality but slower"
 )
 
+adaptive_steps = st.sidebar.checkbox(
+    "Adaptive steps (early exit)",
+    value=False,
+    help="Stop denoising an image once its predicted result stops changing; Inference Steps becomes the maximum"
+)
+early_exit_threshold = st.sidebar.slider(
+    "Early-exit threshold",
+    min_value=0.005,
+    max_value=0.1,
+    value=DEFAULT_EARLY_EXIT_THRESHOLD,
+    step=0.005,
+    format="%.3f",
+    disabled=not adaptive_steps,
+    help="Relative change of the predicted image between steps below which denoising stops"
+)
+use_deep_cache = st.sidebar.checkbox(
+    "Feature caching (DeepCache)",
+    value=False,
+    help="Run the full UNet only every few steps and reuse its deep features in between"
+)
+deep_cache_interval = st.sidebar.slider(
+    "Full UNet every N steps",
+    min_value=2,
+    max_value=6,
+    value=DEFAULT_CACHE_INTERVAL,
+    disabled=not use_deep_cache,
+    help="Higher = faster, but images drift further from the uncached result"
+)
+
 # Style presets
 st.sidebar.subheader("🎨 Style Presets")
 selected_style = st.sidebar.selectbox(
@@ -125,13 +336,74 @@ num_variations = st.sidebar.slider(
     value=1,
     help="Generate multiple variations of the same prompt"
 )
+base_seed = st.sidebar.number_input(
+    "Base seed",
+    min_value=0,
+    max_value=2**31 - 1,
+    value=42,
+    step=1,
+    help="Variation i uses seed (base seed + i), so every image can be reproduced"
+)
 
 # Features toggles
 st.sidebar.subheader("✨ Smart Features")
 enable_spell_check = st.sidebar.checkbox("Auto-correct spelling", value=True)
 show_clip_score = st.sidebar.checkbox("Show quality score", value=True)
+show_previews = st.sidebar.checkbox("Live previews", value=True, help="Show a rough preview while denoising")
+preview_every = st.sidebar.slider(
+    "Preview every N steps",
+    min_value=1,
+    max_value=10,
+    value=2,
+    disabled=not show_previews
+)
+# TAESD is only offered once its weights were downloaded (python -m common.tiny_vae)
+has_tiny_vae = tiny_vae_available()
+sharp_previews = st.sidebar.checkbox(
+    "Sharp previews (tiny decoder)",
+    value=has_tiny_vae,
+    disabled=not (show_previews and has_tiny_vae),
+    help="Decode previews with the TAESD tiny autoencoder instead of a color projection"
+)
+draft_quality = st.sidebar.checkbox(
+    "Draft quality (fast decode)",
+    value=False,
+    disabled=not has_tiny_vae,
+    help="Decode the final image with the tiny autoencoder: much faster, slightly softer detail"
+)
+if not has_tiny_vae:
+    st.sidebar.caption("Tiny decoder not installed: python -m common.tiny_vae")
 
 st.sidebar.divider()
+# Performance profile (INT8 and ToMe profiles only take effect once they passed the CLIP quality gate)
+st.sidebar.subheader("⚡ Performance")
+profile_names = list(PERFORMANCE_PROFILES)
+selected_profile = st.sidebar.selectbox(
+    "Performance profile",
+    profile_names,
+    index=profile_names.index(DEFAULT_PROFILE),
+    help="cpu-int8 = INT8 dynamic quantization of the UNet and text encoder, cpu-tome = token merging"
+)
+_, profile_settings = resolve_profile(selected_profile)
+st.sidebar.caption(", ".join(f"{name}={value}" for name, value in profile_settings.items() if value))
+# ToMe changes the images, so it is offered only up to the ratio that passed the gate
+max_token_merging = token_merging_limit(selected_profile)
+use_token_merging = st.sidebar.checkbox(
+    "Token merging (ToMe)",
+    value=max_token_merging > 0,
+    disabled=not max_token_merging,
+    help="Merge similar latent tokens before self-attention in the full-resolution UNet blocks: faster steps, slightly different images"
+         + ("" if max_token_merging else " (needs a ToMe profile that passed python -m common.quality_gate)")
+)
+token_merging = st.sidebar.slider(
+    "Merge ratio",
+    min_value=0.1,
+    max_value=max_token_merging or MAX_RATIO,
+    value=max_token_merging or DEFAULT_RATIO,
+    step=0.05,
+    disabled=not (use_token_merging and max_token_merging),
+    help="Fraction of the 4096 tokens merged away in each full-resolution self-attention"
+)
 
 # Project info
 st.sidebar.markdown("**Group 9:**")
@@ -168,29 +440,18 @@ with st.expander("🚫 Advanced: Negative Prompt (Optional)", expanded=False):
     st.markdown("Specify what you **don't** want in the image:")
     negative_prompt = st.text_input(
         "Negative prompt:",
-        placeholder="blurry, cartoon, low quality, watermark, text",
+        placeholder=COMMON_NEGATIVE_PROMPTS[0],
         help="Elements to avoid in generation"
     )
 
 # Example prompts
 st.markdown("**✨ Try these examples:**")
-col1, col2, col3, col4 = st.columns(4)
-with col1:
-    if st.button("🦁 Lion", use_container_width=True):
-        st.session_state.main_prompt = "A majestic lion in the African savanna"
-        st.rerun()
-with col2:
-    if st.button("🌅 Sunset", use_container_width=True):
-        st.session_state.main_prompt = "A beautiful sunset over the ocean"
-        st.rerun()
-with col3:
-    if st.button("🏰 Castle", use_container_width=True):
-        st.session_state.main_prompt = "A medieval castle on a cliff"
-        st.rerun()
-with col4:
-    if st.button("🌸 Garden", use_container_width=True):
-        st.session_state.main_prompt = "A peaceful zen garden with cherry blossoms"
-        st.rerun()
+example_cols = st.columns(len(EXAMPLE_PROMPTS))
+for col, (label, example_prompt) in zip(example_cols, EXAMPLE_PROMPTS.items()):
+    with col:
+        if st.button(label, use_container_width=True):
+            st.session_state.main_prompt = example_prompt
+            st.rerun()
 
 # Recent prompts
 if st.session_state.prompt_history:
@@ -227,27 +488,42 @@ if st.button("🎨 Generate Image", type="primary", use_container_width=True):
             prompt = prompt + STYLE_PRESETS[selected_style]
             st.info(f"🎨 **Applied style:** {selected_style}")
         
-        # Load model
-        pipe = load_diffusion_model()
+        # Serve cached images; queue only the missing seeds (other sessions may share the batch)
+        pipe = load_diffusion_model(selected_profile)
+        seeds = [int(base_seed) + i for i in range(num_variations)]
+        request = GenerationRequest(
+            prompt=prompt,
+            negative_prompt=negative_prompt,
+            seeds=seeds,
+            num_steps=num_steps,
+            cfg_scale=cfg_scale,
+            scheduler=type(pipe.scheduler).__name__,
+            preview_every=preview_every if show_previews else 0,
+            early_exit_threshold=early_exit_threshold if adaptive_steps else None,
+            token_merging=token_merging if use_token_merging else 0.0,
+            deep_cache_interval=deep_cache_interval if use_deep_cache else None,
+            preview_decoder="tiny" if has_tiny_vae and sharp_previews else "projection",
+            decoder="tiny" if has_tiny_vae and draft_quality else "full",
+            guidance_interval=guidance_interval if use_guidance_interval else None
+        )
         
         # Generate images
         if num_variations == 1:
             # Single image generation
-            with st.spinner(f"🎨 Generating image... (takes ~30-40 seconds)"):
-                start_time = datetime.now()
-                
-                image = pipe(
-                    prompt,
-                    negative_prompt=negative_prompt if negative_prompt else None,
-                    num_inference_steps=num_steps,
-                    guidance_scale=cfg_scale
-                ).images[0]
-                
-                end_time = datetime.now()
-                duration = (end_time - start_time).total_seconds()
+            lookup_start = datetime.now()
+            entries, result = generate_with_cache(request, "Image", selected_profile)
+            entry = entries[0]
+            image = entry["image"]
+            duration = (datetime.now() - lookup_start).total_seconds()
             
             # Display results
-            st.success(f"✅ Image generated in {duration:.1f} seconds!")
+            if entry["cached"]:
+                st.success(f"✅ Loaded from cache in {duration * 1000:.0f} ms!")
+            else:
+                st.success(f"✅ Image generated in {result.batch_seconds:.1f} seconds!")
+                if result.batch_images > 1:
+                    st.caption(f"Shared a batch of {result.batch_images} images with other sessions "
+                               f"(waited {result.queue_seconds:.1f}s in queue)")
             
             col1, col2 = st.columns([3, 1])
             
@@ -257,12 +533,13 @@ if st.button("🎨 Generate Image", type="primary", use_container_width=True):
             with col2:
                 st.metric("⏱️ Time", f"{duration:.1f}s")
                 st.metric("⚙️ CFG", cfg_scale)
-                st.metric("🔢 Steps", num_steps)
+                st.metric("🔢 Steps", f"{entry['steps_used']}/{num_steps}" if adaptive_steps else num_steps)
+                st.metric("🌱 Seed", int(base_seed))
                 
                 # CLIP Score
                 if show_clip_score:
                     with st.spinner("Calculating quality..."):
-                        clip_score = calculate_clip_score(image, original_prompt)
+                        clip_score = score_entries([entry], original_prompt)[0]
                     st.metric("🎯 Match Score", f"{clip_score:.2f}")
                     
                     if clip_score > 30:
@@ -273,53 +550,59 @@ if st.button("🎨 Generate Image", type="primary", use_container_width=True):
                         st.warning("Consider refining")
                 
                 # Download button
-                from io import BytesIO
-                buf = BytesIO()
-                image.save(buf, format="PNG")
                 st.download_button(
                     label="⬇️ Download",
-                    data=buf.getvalue(),
+                    data=entry_png(entry),
                     file_name=f"generated_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png",
                     mime="image/png",
                     use_container_width=True
                 )
         
         else:
-            # Batch generation
-            st.info(f"🔢 Generating {num_variations} variations...")
+            # Batch generation: all uncached variations share one denoising loop
+            st.info(f"🔢 Generating {num_variations} variations (seeds {seeds[0]}-{seeds[-1]})...")
+            
+            entries, result = generate_with_cache(request, f"{num_variations} variations", selected_profile)
+            num_cached = sum(entry["cached"] for entry in entries)
+            per_image_duration = result.seconds_per_image if result else 0.0
+            
+            # Score all variations in one CLIP batch and show the best match first
+            ranked = list(zip(entries, seeds))
+            if show_clip_score:
+                with st.spinner("Calculating quality..."):
+                    score_entries(entries, original_prompt)
+                ranked.sort(key=lambda pair: pair[0]["clip_score"], reverse=True)
             
             cols = st.columns(min(num_variations, 2))
             
-            for i in range(num_variations):
+            for i, (entry, seed) in enumerate(ranked):
+                image = entry["image"]
                 with cols[i % 2]:
-                    with st.spinner(f"Generating #{i+1}..."):
-                        start_time = datetime.now()
-                        
-                        image = pipe(
-                            prompt,
-                            negative_prompt=negative_prompt if negative_prompt else None,
-                            num_inference_steps=num_steps,
-                            guidance_scale=cfg_scale
-                        ).images[0]
-                        
-                        duration = (end_time - start_time).total_seconds()
-                    
-                    st.image(image, caption=f"Variation {i+1} ({duration:.1f}s)")
+                    timing = "cached" if entry["cached"] else f"{per_image_duration:.1f}s/image"
+                    score = f", match {entry['clip_score']:.2f}" if show_clip_score else ""
+                    steps = f", {entry['steps_used']}/{num_steps} steps" if adaptive_steps else ""
+                    st.image(image, caption=f"Variation {i+1} (seed {seed}, {timing}{steps}{score})")
                     
                     # Mini download button
-                    buf = BytesIO()
-                    image.save(buf, format="PNG")
                     st.download_button(
                         label=f"⬇️ Download #{i+1}",
-                        data=buf.getvalue(),
-                        file_name=f"var_{i+1}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png",
+                        data=entry_png(entry),
+                        file_name=f"var_{i+1}_seed{seed}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png",
                         mime="image/png",
                         key=f"download_{i}",
                         use_container_width=True
                     )
             
+            if result:
+                st.metric("⏱️ Batch time", f"{result.batch_seconds:.1f}s",
+                          help=f"{per_image_duration:.1f}s per image, batch of {result.batch_images} images")
+            if num_cached:
+                st.caption(f"♻️ {num_cached} of {num_variations} variations served from cache")
             st.success(f"✅ All {num_variations} variations generated!")
 
+if st.session_state.pop("generation_cancelled", False):
+    st.warning("⏹️ Generation cancelled")
+
 # Footer
 st.divider()
 st.markdown(
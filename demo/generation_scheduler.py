@@ -0,0 +1,304 @@
+"""
+Cross-session generation scheduler for the demo.
+
+Every Streamlit session shares one cached StableDiffusionPipeline. Instead of
+calling it directly, sessions submit requests here. A single worker thread
+takes the oldest request, waits a short batching window for compatible
+requests (same steps, scheduler, resolution, early exit, token merging
+ratio, feature-cache interval, decoder and guidance interval) and runs all
+of them as one batched UNet call. Guidance is applied per image
+(common.sampling), so sessions with different CFG scales still share a
+batch. Each session gets back a ticket with its own future, queue position
+and ETA.
+
+Tickets also expose live previews (a cheap latent projection or a TAESD
+decode every few steps) and can be cancelled. A queued ticket is simply
+dropped; a running batch is aborted from the step callback once every ticket
+in it is cancelled. A cancelled ticket never receives images: its future is
+cancelled, or fails with GenerationCancelled if its batch had started. A
+batch that fails fails its tickets, and the worker goes on with the next one.
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+
+from common.sampling import sample
+from common.token_merging import apply_token_merging, token_merging_ratio
+from previews import latents_to_previews, tiny_vae_previews
+
+# Rough cost of one image for one denoising step before anything was measured
+# (~30s for 20 steps on the hardware in milestone2_summary.md)
+DEFAULT_SECONDS_PER_IMAGE_STEP = 1.5
+
+
+class GenerationCancelled(Exception):
+    """Raised inside the denoising loop to abort a batch nobody waits for"""
+
+
+@dataclass
+class GenerationRequest:
+    """Everything needed to generate the images of one session's click"""
+    prompt: str
+    negative_prompt: str = ""
+    seeds: list = field(default_factory=lambda: [42])
+    num_steps: int = 20
+    cfg_scale: float = 7.5
+    scheduler: str = "PNDMScheduler"
+    height: int = 512
+    width: int = 512
+    preview_every: int = 0  # 0 disables previews
+    preview_decoder: str = "projection"  # "projection" (latent→RGB matmul) or "tiny" (TAESD)
+    early_exit_threshold: float = None  # None = always run num_steps (see common.sampling)
+    token_merging: float = 0.0  # ToMe merge ratio, 0 = off (see common.token_merging)
+    deep_cache_interval: int = None  # full UNet every N steps, None = every step (see common.deep_cache)
+    decoder: str = "full"  # "tiny" = draft-quality TAESD decode (see common.tiny_vae)
+    guidance_interval: float = None  # CFG only for this fraction of the steps, None = all
+
+    def batch_key(self):
+        """Requests with the same key can share one denoising loop"""
+        # CFG is applied per image by the sampler, so it is not part of the key
+        return (self.num_steps, self.scheduler, self.height, self.width, self.early_exit_threshold,
+                self.token_merging, self.deep_cache_interval, self.decoder, self.guidance_interval)
+
+    def cost(self, seconds_per_image_step):
+        """Estimated seconds to generate this request on its own"""
+        return seconds_per_image_step * len(self.seeds) * self.num_steps
+
+
+@dataclass
+class GenerationResult:
+    """Images of one request plus timings of the batch it ran in"""
+    images: list
+    seeds: list
+    steps_used: list
+    batch_seconds: float
+    batch_images: int
+    queue_seconds: float
+
+    @property
+    def seconds_per_image(self):
+        return self.batch_seconds / self.batch_images
+
+
+class GenerationTicket:
+    """Handle returned to a session for one submitted request"""
+
+    def __init__(self, scheduler, request):
+        self.request = request
+        self.future = Future()
+        self.submitted_at = time.time()
+        self.cancelled = False
+        self.step = 0
+        self.previews = []
+        self._scheduler = scheduler
+
+    def position(self):
+        """1-based position in the queue, 0 while running, None once finished"""
+        return self._scheduler.queue_position(self)
+
+    def eta(self):
+        """Estimated seconds until this ticket's images are ready"""
+        return self._scheduler.eta(self)
+
+    def cancel(self):
+        """Stop waiting for this ticket; frees the worker if nobody else needs the batch
+
+        A queued ticket's future is cancelled. Once its batch has started the future
+        can no longer be cancelled, so it fails with GenerationCancelled instead.
+        """
+        self.cancelled = True
+        self.future.cancel()
+
+
+class GenerationScheduler:
+    """Queue in front of a shared pipeline that coalesces compatible requests"""
+
+    def __init__(self, pipe, embedding_cache=None, batch_window=0.5, max_batch_images=4, max_token_merging=0.0):
+        self.pipe = pipe
+        self.embedding_cache = embedding_cache
+        # Highest ToMe ratio that passed the CLIP quality gate; requests are clamped to it
+        self.max_token_merging = max_token_merging
+        self.batch_window = batch_window
+        self.max_batch_images = max_batch_images
+        self.seconds_per_image_step = DEFAULT_SECONDS_PER_IMAGE_STEP
+
+        self._pending = []
+        self._running = []
+        self._running_started = None
+        self._running_estimate = 0.0
+        self._cond = threading.Condition()
+
+        self._worker = threading.Thread(target=self._work_loop, name="generation-scheduler", daemon=True)
+        self._worker.start()
+
+    # ------------------------------------------
+    # Session-facing API
+    # ------------------------------------------
+
+    def submit(self, request):
+        """Queue a request and return its ticket"""
+        ticket = GenerationTicket(self, request)
+        with self._cond:
+            self._pending.append(ticket)
+            self._cond.notify_all()
+        return ticket
+
+    def queue_position(self, ticket):
+        with self._cond:
+            if ticket in self._running:
+                return 0
+            if ticket in self._pending:
+                return self._pending.index(ticket) + 1
+        return None
+
+    def eta(self, ticket):
+        with self._cond:
+            eta = 0.0
+            if self._running:
+                elapsed = time.time() - self._running_started
+                eta += max(self._running_estimate - elapsed, 0.0)
+            if ticket in self._running:
+                return eta
+            for queued in self._pending:
+                eta += queued.request.cost(self.seconds_per_image_step)
+                if queued is ticket:
+                    return eta
+        return 0.0
+
+    # ------------------------------------------
+    # Worker
+    # ------------------------------------------
+
+    def _work_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+
+                # Give other sessions a short window to join the oldest request
+                deadline = self._pending[0].submitted_at + self.batch_window
+                while time.time() < deadline:
+                    self._cond.wait(timeout=deadline - time.time())
+
+                batch = self._take_batch()
+                if not batch:
+                    continue
+                self._running = batch
+                self._running_started = time.time()
+                self._running_estimate = self.seconds_per_image_step * batch[0].request.num_steps * sum(
+                    len(ticket.request.seeds) for ticket in batch
+                )
+
+            try:
+                self._run_batch(batch)
+            except Exception as exc:
+                # The worker is the only one: fail this batch's tickets and keep serving the queue
+                for ticket in batch:
+                    self._finish(ticket, exc=exc)
+            finally:
+                with self._cond:
+                    self._running = []
+                    self._running_started = None
+
+    def _take_batch(self):
+        """Pop the oldest request plus every compatible one that still fits"""
+        key = self._pending[0].request.batch_key()
+        batch, remaining, num_images = [], [], 0
+        for ticket in self._pending:
+            size = len(ticket.request.seeds)
+            fits = not batch or num_images + size <= self.max_batch_images
+            if ticket.request.batch_key() == key and fits:
+                # Sessions that gave up while queued are dropped here
+                if ticket.future.set_running_or_notify_cancel():
+                    batch.append(ticket)
+                    num_images += size
+            else:
+                remaining.append(ticket)
+        self._pending = remaining
+        return batch
+
+    @staticmethod
+    def _finish(ticket, result=None, exc=None):
+        """Resolve a running ticket's future once; cancelled tickets get GenerationCancelled"""
+        if ticket.future.done():
+            return
+        if ticket.cancelled:
+            ticket.future.set_exception(GenerationCancelled())
+        elif exc is not None:
+            ticket.future.set_exception(exc)
+        else:
+            ticket.future.set_result(result)
+
+    def _run_batch(self, batch):
+        first = batch[0].request
+        prompts, negative_prompts, guidance_scales, seeds = [], [], [], []
+        for ticket in batch:
+            for seed in ticket.request.seeds:
+                prompts.append(ticket.request.prompt)
+                negative_prompts.append(ticket.request.negative_prompt or "")
+                guidance_scales.append(ticket.request.cfg_scale)
+                # One seed per image keeps every image reproducible on its own
+                seeds.append(seed)
+
+        def on_step_end(step, timestep, latents):
+            if all(ticket.cancelled for ticket in batch):
+                raise GenerationCancelled()
+            offset = 0
+            for ticket in batch:
+                count = len(ticket.request.seeds)
+                ticket.step = step + 1
+                every = ticket.request.preview_every
+                if every and (step + 1) % every == 0 and not ticket.cancelled:
+                    to_previews = tiny_vae_previews if ticket.request.preview_decoder == "tiny" else latents_to_previews
+                    ticket.previews = to_previews(latents[offset:offset + count])
+                offset += count
+
+        start_time = time.time()
+        # Batches run one at a time, so the shared UNet can switch ratio per batch
+        ratio = min(first.token_merging, self.max_token_merging)
+        if ratio or token_merging_ratio(self.pipe):
+            apply_token_merging(self.pipe, ratio)
+        if self.embedding_cache is not None:
+            # Memoized text-encoder outputs instead of re-encoding every call
+            prompt_embeds = self.embedding_cache.encode_batch(prompts)
+            negative_prompt_embeds = self.embedding_cache.encode_batch(negative_prompts)
+        else:
+            prompt_embeds, negative_prompt_embeds = self.pipe.encode_prompt(
+                prompts, self.pipe.device, 1, True, negative_prompts
+            )
+        output = sample(
+            self.pipe,
+            prompt_embeds=prompt_embeds,
+            negative_prompt_embeds=negative_prompt_embeds,
+            guidance_scales=guidance_scales,
+            seeds=seeds,
+            num_inference_steps=first.num_steps,
+            height=first.height,
+            width=first.width,
+            on_step_end=on_step_end,
+            early_exit_threshold=first.early_exit_threshold,
+            deep_cache_interval=first.deep_cache_interval,
+            decoder=first.decoder,
+            guidance_interval=first.guidance_interval
+        )
+        batch_seconds = time.time() - start_time
+
+        # Update the running estimate used for ETAs (exponential moving average)
+        if sum(output.steps_used):
+            measured = batch_seconds / sum(output.steps_used)
+            self.seconds_per_image_step = 0.7 * self.seconds_per_image_step + 0.3 * measured
+
+        offset = 0
+        for ticket in batch:
+            count = len(ticket.request.seeds)
+            self._finish(ticket, GenerationResult(
+                images=output.images[offset:offset + count],
+                seeds=list(ticket.request.seeds),
+                steps_used=output.steps_used[offset:offset + count],
+                batch_seconds=batch_seconds,
+                batch_images=len(prompts),
+                queue_seconds=start_time - ticket.submitted_at
+            ))
+            offset += count
@@ -0,0 +1,41 @@
+"""
+Cheap previews of in-progress latents.
+
+Decoding with the full VAE costs a large fraction of a denoising step, far too
+much to do every few steps. The 4 SD latent channels map to RGB almost
+linearly, so a fixed 4x3 projection gives a recognisable low-resolution
+preview for the cost of one small matmul. When the TAESD weights are present
+(common/tiny_vae.py), tiny_vae_previews() gives sharp full-detail previews
+for a few milliseconds more per image.
+"""
+
+import torch
+from PIL import Image
+
+from common.tiny_vae import decode_tiny
+
+# Least-squares fit of SD 1.x latent channels to RGB (same factors ComfyUI uses)
+LATENT_RGB_FACTORS = [
+    [0.3512, 0.2297, 0.3227],
+    [0.3250, 0.4974, 0.2350],
+    [-0.2829, 0.1762, 0.2721],
+    [-0.2120, -0.2616, -0.7177],
+]
+
+
+def latents_to_previews(latents, size=256):
+    """Project a (B, 4, h, w) latent batch to a list of RGB preview images"""
+    factors = torch.tensor(LATENT_RGB_FACTORS, dtype=torch.float32)
+    with torch.no_grad():
+        rgb = torch.einsum("bchw,cr->bhwr", latents.detach().float().cpu(), factors)
+        rgb = ((rgb + 1.0) / 2.0).clamp(0.0, 1.0)
+        pixels = (rgb * 255).round().to(torch.uint8).numpy()
+    return [Image.fromarray(array).resize((size, size), Image.BILINEAR) for array in pixels]
+
+
+def tiny_vae_previews(latents, size=256):
+    """Decode a (B, 4, h, w) latent batch with TAESD into a list of RGB preview images"""
+    images = decode_tiny(latents.detach())
+    pixels = ((images.float().cpu() + 1.0) * 127.5).round().clamp(0, 255).to(torch.uint8)
+    pixels = pixels.permute(0, 2, 3, 1).numpy()
+    return [Image.fromarray(array).resize((size, size), Image.BILINEAR) for array in pixels]
@@ -0,0 +1,153 @@
+"""
+Persistent, content-addressed cache of generated images for the demo.
+
+Each entry is one image keyed by a hash of everything that determines it
+(final prompt, negative prompt, steps, CFG, scheduler, seed, model id). An
+entry is stored as <key>.png (generation parameters embedded, see
+common/image_writer.py) plus a <key>.json metadata file that also holds
+the CLIP score once computed. The JSON file is written last and acts as the
+commit marker, and both files are written atomically (temp file + rename), so
+concurrent sessions never read a half-written entry.
+
+Eviction is LRU by last access (the JSON file's mtime is bumped on every hit)
+with both a total size budget and a maximum entry age.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image
+
+from common.image_writer import encode_image
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3       # 2 GB
+DEFAULT_MAX_AGE_SECONDS = 30 * 24 * 3600  # 30 days
+STALE_TEMP_SECONDS = 3600
+
+
+class ResultCache:
+    """On-disk LRU cache of generated images and their metadata"""
+
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES, max_age_seconds=DEFAULT_MAX_AGE_SECONDS):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+
+    @staticmethod
+    def make_key(**params):
+        """Content address of one generated image"""
+        payload = json.dumps(params, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _paths(self, key):
+        return self.root / f"{key}.png", self.root / f"{key}.json"
+
+    def get(self, key):
+        """Return (image, metadata) for a cached entry, or None on a miss"""
+        image_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+            with Image.open(image_path) as img:
+                image = img.convert("RGB")
+            os.utime(meta_path)  # mark as recently used
+        except (OSError, ValueError):
+            # Missing, evicted by another session mid-read, or corrupt
+            return None
+        return image, metadata
+
+    def get_bytes(self, key):
+        """PNG bytes of a cached entry, or None on a miss"""
+        image_path, _ = self._paths(key)
+        try:
+            return image_path.read_bytes()
+        except OSError:
+            return None
+
+    def put(self, key, image, metadata):
+        """Store an image and its metadata, then enforce the size/age budget"""
+        self.put_encoded(key, encode_image(image, "png", metadata=metadata), metadata)
+
+    def put_encoded(self, key, png_bytes, metadata):
+        """Store already encoded PNG bytes (e.g. from an ImageWriter) and their metadata"""
+        image_path, meta_path = self._paths(key)
+        self._atomic_write(image_path, lambda f: f.write(png_bytes))
+        self._write_metadata(meta_path, metadata)
+        self.evict()
+
+    def update_metadata(self, key, **fields):
+        """Add fields (e.g. a CLIP score computed later) to an existing entry"""
+        _, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            return
+        metadata.update(fields)
+        self._write_metadata(meta_path, metadata)
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under budget"""
+        now = time.time()
+        entries = []
+        total_bytes = 0
+        for meta_path in self.root.glob("*.json"):
+            image_path = meta_path.with_suffix(".png")
+            try:
+                last_used = meta_path.stat().st_mtime
+                size = meta_path.stat().st_size + image_path.stat().st_size
+            except OSError:
+                continue
+            if now - last_used > self.max_age_seconds:
+                self._remove(meta_path, image_path)
+                continue
+            entries.append((last_used, size, meta_path, image_path))
+            total_bytes += size
+
+        entries.sort()
+        for _, size, meta_path, image_path in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            self._remove(meta_path, image_path)
+            total_bytes -= size
+
+        # Temp files left behind by a crashed writer
+        for tmp_path in self.root.glob("*.tmp"):
+            try:
+                if now - tmp_path.stat().st_mtime > STALE_TEMP_SECONDS:
+                    tmp_path.unlink()
+            except OSError:
+                pass
+
+    def _write_metadata(self, meta_path, metadata):
+        data = json.dumps(metadata, indent=2, ensure_ascii=False).encode("utf-8")
+        self._atomic_write(meta_path, lambda f: f.write(data))
+
+    def _atomic_write(self, path, write):
+        fd, tmp_name = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_name, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+            raise
+
+    @staticmethod
+    def _remove(meta_path, image_path):
+        # Metadata first so readers see a clean miss rather than a dangling entry
+        for path in (meta_path, image_path):
+            try:
+                path.unlink()
+            except OSError:
+                pass
@@ -1,20 +1,19 @@
-import torch
-from diffusers import StableDiffusionPipeline
 from PIL import Image
 import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.image_writer import ImageWriter
+from common.pipeline_loader import load_pipeline
 
 print("Loading Stable Diffusion model...")
 print("(This will download ~4GB and take 5-10 minutes on first run)")
 
-# Load Stable Diffusion
-model_id = "runwayml/stable-diffusion-v1-5"
-pipe = StableDiffusionPipeline.from_pretrained(model_id, torch_dtype=torch.float32)
-
-# Use CPU or MPS (for Mac)
-device = "mps" if torch.backends.mps.is_available() else "cpu"
-pipe = pipe.to(device)
+# Load Stable Diffusion (device and optimizations come from the shared performance profile)
+pipe = load_pipeline()
 
-print(f"✓ Model loaded on device: {device}")
+print(f"✓ Model loaded on device: {pipe.device}")
 
 # Create output directory
 os.makedirs("generated_images", exist_ok=True)
@@ -32,17 +31,19 @@ print("\n" + "="*50)
 print("Generating 5 sample images...")
 print("="*50)
 
-for i, prompt in enumerate(test_prompts):
-    print(f"\n[{i+1}/5] Generating: '{prompt}'")
-    
-    # Generate image
-    image = pipe(prompt, num_inference_steps=20).images[0]
-    
-    # Save image
-    output_path = f"generated_images/sample_{i+1}.png"
-    image.save(output_path)
-    
-    print(f"✓ Saved to: {output_path}")
+# Encoding and writing happen in the background while the next image generates
+with ImageWriter("png") as writer:
+    for i, prompt in enumerate(test_prompts):
+        print(f"\n[{i+1}/5] Generating: '{prompt}'")
+
+        # Generate image
+        image = pipe(prompt, num_inference_steps=20).images[0]
+
+        # Save image
+        output_path = f"generated_images/sample_{i+1}.png"
+        writer.submit(image, output_path, metadata={"prompt": prompt, "steps": 20})
+
+        print(f"✓ Saving to: {output_path}")
 
 print("\n" + "="*50)
 print("✓ All 5 images generated successfully!")
@@ -1,83 +1,140 @@
-from diffusers import StableDiffusionPipeline
-import torch
+import argparse
 import os
+import sys
 from datetime import datetime
+from pathlib import Path
 
-print("Milestone 2: Final Image Set Generation")
-print("="*60)
-
-# Load model
-model_id = "runwayml/stable-diffusion-v1-5"
-pipe = StableDiffusionPipeline.from_pretrained(model_id, torch_dtype=torch.float32)
-
-device = "mps" if torch.backends.mps.is_available() else "cpu"
-pipe = pipe.to(device)
-print(f"Model loaded on: {device}\n")
-
-# Create output directory
-os.makedirs("final_images", exist_ok=True)
-
-# Optimal settings based on experiments
-optimal_cfg = 7.5
-optimal_steps = 20
-
-print(f"Using optimal settings: CFG={optimal_cfg}, Steps={optimal_steps}\n")
-
-# 10 diverse prompts covering different categories
-prompts = [
-    "A majestic lion resting under an acacia tree in the African savanna",
-    "An astronaut floating in space with Earth in the background",
-    "A medieval castle on a cliff overlooking the ocean at dawn",
-    "A bustling night market in Tokyo with colorful neon signs",
-    "A peaceful mountain lake reflecting snow-capped peaks",
-    "An old library filled with ancient books and warm lamplight",
-    "A field of lavender flowers stretching to the horizon under blue sky",
-    "A steampunk robot playing chess in a Victorian study",
-    "A tropical beach with turquoise water and palm trees at golden hour",
-    "An autumn forest path covered with red and orange leaves"
-]
-
-results = []
-
-for i, prompt in enumerate(prompts, 1):
-    print(f"[{i}/10] Generating: '{prompt[:50]}...'")
-    
-    start_time = datetime.now()
-    
-    # Generate image
-    image = pipe(
-        prompt, 
-        num_inference_steps=optimal_steps,
-        guidance_scale=optimal_cfg
-    ).images[0]
-    
-    end_time = datetime.now()
-    duration = (end_time - start_time).total_seconds()
-    
-    # Save image
-    filename = f"final_images/image_{i:02d}.png"
-    image.save(filename)
-    
-    results.append({
-        'id': i,
-        'prompt': prompt,
-        'time': duration,
-        'file': filename
-    })
-    
-    print(f"    ✓ Saved: {filename} ({duration:.1f}s)\n")
-
-# Summary
-print("="*60)
-print("FINAL IMAGE SET COMPLETE")
-print("="*60)
-print(f"Total images: {len(results)}")
-print(f"Settings: CFG={optimal_cfg}, Steps={optimal_steps}")
-print(f"Total time: {sum(r['time'] for r in results):.1f}s")
-print(f"Average time: {sum(r['time'] for r in results)/len(results):.1f}s per image")
-print("\nGenerated images:")
-for r in results:
-    print(f"  {r['id']:2d}. {r['file']}")
-
-print("\n✓ All images generated successfully!")
-print(f"Check the 'final_images' folder to view all outputs.")
\ No newline at end of file
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.image_writer import FORMATS, ImageWriter
+from common.parallel_generation import ParallelGenerator, autotune_split
+from common.pipeline_loader import DEFAULT_PROFILE, MODEL_ID, load_pipeline
+from common.prompt_embeddings import PromptEmbeddingCache
+from common.prompts import FINAL_SET_PROMPTS
+from common.results_store import RESULTS_DB, ResultsStore
+from common.sampling import sample
+
+
+def generate_in_process(prompts, cfg, steps):
+    """Original path: one process, images generated one after another"""
+    # Load model (optimizations come from the shared performance profile)
+    pipe = load_pipeline()
+    print(f"Model loaded on: {pipe.device}\n")
+
+    # The empty unconditional prompt is encoded once and shared by every image
+    embedding_cache = PromptEmbeddingCache(pipe, MODEL_ID)
+
+    for i, prompt in enumerate(prompts, 1):
+        print(f"[{i}/{len(prompts)}] Generating: '{prompt[:50]}...'")
+
+        start_time = datetime.now()
+
+        # Generate image (seed = prompt index, as in the sharded path, so both give the same image)
+        prompt_embeds, negative_prompt_embeds = embedding_cache.encode_pair(prompt)
+        image = sample(pipe, prompt_embeds, negative_prompt_embeds, guidance_scales=[cfg], seeds=[i - 1],
+                       num_inference_steps=steps).images[0]
+
+        duration = (datetime.now() - start_time).total_seconds()
+        yield i, image, duration
+
+
+def generate_sharded(prompts, cfg, steps, workers, threads):
+    """Prompts sharded across pinned worker processes; images arrive in prompt order"""
+    print(f"Starting {workers} worker(s) × {threads} thread(s)...\n")
+    with ParallelGenerator(workers, threads, num_steps=steps, cfg_scale=cfg) as generator:
+        # Seed = prompt index, so every image is reproducible whichever worker made it
+        jobs = [(prompt, i) for i, prompt in enumerate(prompts)]
+        for position, image, seconds, worker_id in generator.map(jobs):
+            print(f"[{position + 1}/{len(prompts)}] Worker {worker_id}: '{prompts[position][:50]}...'")
+            yield position + 1, image, seconds
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate the final image set")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes (default: one in-process generator)")
+    parser.add_argument("--threads", type=int, default=None, help="Torch threads per worker")
+    parser.add_argument("--autotune", action="store_true",
+                        help="Probe workers × threads splits and use the fastest")
+    parser.add_argument("--format", choices=list(FORMATS), default="png", help="Image file format")
+    parser.add_argument("--effort", type=int, default=None,
+                        help="Encoder effort (PNG compress level 0-9, WebP method 0-6)")
+    args = parser.parse_args()
+
+    print("Milestone 2: Final Image Set Generation")
+    print("="*60)
+
+    # Create output directory
+    os.makedirs("final_images", exist_ok=True)
+
+    # Optimal settings based on experiments
+    optimal_cfg = 7.5
+    optimal_steps = 20
+
+    print(f"Using optimal settings: CFG={optimal_cfg}, Steps={optimal_steps}\n")
+
+    # 10 diverse prompts covering different categories
+    prompts = FINAL_SET_PROMPTS
+
+    workers, threads = args.workers, args.threads
+    if args.autotune:
+        print("Autotuning workers × threads...")
+        (workers, threads), _ = autotune_split(prompts)
+        print(f"✓ Best split: {workers} worker(s) × {threads} thread(s)\n")
+    elif workers and not threads:
+        threads = max((os.cpu_count() or 1) // workers, 1)
+
+    if workers:
+        generated = generate_sharded(prompts, optimal_cfg, optimal_steps, workers, threads)
+    else:
+        generated = generate_in_process(prompts, optimal_cfg, optimal_steps)
+
+    results = []
+    run_start = datetime.now()
+
+    # Images are encoded and written in the background while the next one generates
+    with ImageWriter(args.format, args.effort) as writer:
+        for i, image, duration in generated:
+            filename = str(writer.output_path(f"final_images/image_{i:02d}.png"))
+            writer.submit(image, filename, metadata={
+                "prompt": prompts[i - 1], "seed": i - 1, "cfg": optimal_cfg,
+                "steps": optimal_steps, "model_id": MODEL_ID, "profile": DEFAULT_PROFILE
+            })
+
+            results.append({
+                'id': i,
+                'prompt': prompts[i - 1],
+                'time': duration,
+                'file': filename
+            })
+
+            print(f"    ✓ Queued: {filename} ({duration:.1f}s)\n")
+
+    wall_seconds = (datetime.now() - run_start).total_seconds()
+
+    # Summary
+    print("="*60)
+    print("FINAL IMAGE SET COMPLETE")
+    print("="*60)
+    print(f"Total images: {len(results)}")
+    print(f"Settings: CFG={optimal_cfg}, Steps={optimal_steps}")
+    if workers:
+        print(f"Workers: {workers} × {threads} threads")
+    print(f"Total time: {wall_seconds:.1f}s ({len(results) / wall_seconds * 60:.2f} images/minute)")
+    print(f"Average time: {sum(r['time'] for r in results)/len(results):.1f}s per image")
+    print("\nGenerated images:")
+    for r in results:
+        print(f"  {r['id']:2d}. {r['file']}")
+
+    # Record timings so the analysis plots and regression checks see this run
+    store = ResultsStore()
+    run_id = store.start_run("generation", "final_set", profile=DEFAULT_PROFILE,
+                             config={"cfg": optimal_cfg, "steps": optimal_steps, "num_prompts": len(results),
+                                     "workers": workers or 1, "threads": threads})
+    rows = [("seconds_per_image", r['time'], "s", "lower", {"prompt_index": r['id'] - 1}) for r in results]
+    rows.append(("images_per_minute", len(results) / wall_seconds * 60, "img/min", "higher", None))
+    store.record_many(run_id, rows)
+    store.close()
+    print(f"\n✓ Recorded as run #{run_id} in {RESULTS_DB}")
+
+    print("\n✓ All images generated successfully!")
+    print(f"Check the 'final_images' folder to view all outputs.")
@@ -0,0 +1,344 @@
+"""
+Declarative, resumable parameter sweep engine.
+
+A sweep spec (JSON) describes a grid of prompts × CFG scales × steps ×
+schedulers × seeds. The engine loads the model once, groups the cells that
+can share a denoising loop (same steps and scheduler) into batches, and
+appends one record per finished cell to <output_dir>/manifest.jsonl (timings
+and output path). Re-running an interrupted sweep skips every cell already in
+the manifest. Each batch runs through common.sampling.sample(), which applies
+a guidance scale per image, so a whole CFG sweep on one seed is one batched
+job sharing a single noise draw.
+
+An optional "early_exit_thresholds" axis enables adaptive stepping (see
+common/sampling.py); each record stores the steps the image actually used.
+"deep_cache_intervals" reuses deep UNet features between full steps (see
+common/deep_cache.py). "guidance_intervals" applies CFG only to the first
+fraction of the steps. With "fid_reference" set, each configuration (all
+prompts and seeds of one parameter combination) also gets an FID against that
+folder; its Inception statistics are cached, so only the sweep images are embedded.
+Finished images are CLIP-scored against their prompt ("clip_score": false
+skips this), and every sweep that ran or scored something is recorded in the
+results store (common/results_store.py) that the milestone3 plots read.
+Images are encoded on a background ImageWriter while the next batch generates
+("image_format" png/webp, "encode_effort"); a cell enters the manifest only
+once its file is on disk, with its generation parameters embedded in it.
+
+    python sweep.py sweeps/cfg.json
+    python sweep.py sweeps/cfg.json --fresh   # forget this sweep's cells and start over
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+from diffusers import DDIMScheduler, EulerDiscreteScheduler, LMSDiscreteScheduler, PNDMScheduler
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.clip_evaluator import ClipEvaluator, EmbeddingStore
+from common.clip_scoring import load_clip
+from common.fid_stats import fid_against
+from common.host_profile import host_batch_size
+from common.image_writer import FORMATS, ImageWriter, atomic_write_bytes
+from common.pipeline_loader import MODEL_ID, load_pipeline
+from common.prompt_embeddings import PromptEmbeddingCache
+from common.results_store import RESULTS_DB, ResultsStore
+from common.sampling import sample
+from common.stage_timer import host_info
+
+SCHEDULERS = {
+    'PNDM': PNDMScheduler,
+    'DDIM': DDIMScheduler,
+    'LMS': LMSDiscreteScheduler,
+    'Euler': EulerDiscreteScheduler,
+}
+
+SPEC_DEFAULTS = {
+    "cfg_scales": [7.5],
+    "steps": [20],
+    "schedulers": ["PNDM"],
+    "seeds": [0],
+    "early_exit_thresholds": [None],  # None = fixed num_inference_steps
+    "deep_cache_intervals": [None],  # None = full UNet every step
+    "guidance_intervals": [None],  # fraction of steps (from the start) with CFG, None = all
+    "negative_prompt": "",
+    "filename": "{name}_p{prompt_index}_cfg{cfg}_steps{steps}_{scheduler}_seed{seed}.png",
+    "max_batch_size": None,  # None = the host profile's tuned batch size (see common/autotune.py), else 4
+    "clip_score": True,
+    "image_format": "png",
+    "encode_effort": None,  # None = the format's default (see common/image_writer.py)
+    "fid_reference": None,  # reference image folder for per-config FID (see common/fid_stats.py)
+}
+MANIFEST_NAME = "manifest.jsonl"
+
+
+def load_spec(path):
+    """Read a sweep spec and fill in defaults"""
+    with open(path) as f:
+        spec = dict(SPEC_DEFAULTS, **json.load(f))
+    spec.setdefault("name", Path(path).stem)
+    spec.setdefault("output_dir", f"{spec['name']}_sweep")
+    if spec["max_batch_size"] is None:
+        spec["max_batch_size"] = host_batch_size(4)
+    return spec
+
+
+def expand_cells(spec):
+    """Every grid cell of the spec, in a stable order"""
+    cells = []
+    grid = itertools.product(
+        enumerate(spec["prompts"]), spec["cfg_scales"], spec["steps"], spec["schedulers"], spec["seeds"],
+        spec["early_exit_thresholds"], spec["deep_cache_intervals"], spec["guidance_intervals"]
+    )
+    for (prompt_index, prompt), cfg, steps, scheduler, seed, early_exit, deep_cache, guidance_interval in grid:
+        cell = {
+            "prompt_index": prompt_index,
+            "prompt": prompt,
+            "negative_prompt": spec["negative_prompt"],
+            "cfg": cfg,
+            "steps": steps,
+            "scheduler": scheduler,
+            "seed": seed,
+            "early_exit": early_exit,
+            "deep_cache": deep_cache,
+            "guidance_interval": guidance_interval,
+        }
+        cell["cell_id"] = cell_id(cell)
+        filename = Path(spec["output_dir"]) / spec["filename"].format(name=spec["name"], **cell)
+        cell["file"] = str(filename.with_suffix(FORMATS[spec["image_format"]]["suffix"]))
+        cells.append(cell)
+    files = [cell["file"] for cell in cells]
+    if len(set(files)) != len(files):
+        raise ValueError(f"Sweep '{spec['name']}': filename template maps several cells to the same file")
+    return cells
+
+
+def cell_id(cell):
+    """Stable identity of a cell's generation parameters"""
+    # Unset optional parameters are left out so existing manifests keep their ids
+    params = {k: v for k, v in cell.items() if k not in ("cell_id", "file") and v is not None}
+    payload = json.dumps(params | {"model_id": MODEL_ID}, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def read_manifest(path):
+    """Records of finished cells keyed by cell id (last record wins)"""
+    records = {}
+    if path.exists():
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from an interrupted write
+                records[record["cell_id"]] = record
+    return records
+
+
+def append_manifest(path, record):
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def forget_cells(path, cell_ids):
+    """Drop the manifest records of these cells; records of other sweeps sharing the folder are kept"""
+    if not path.exists():
+        return
+    kept = [record for record in read_manifest(path).values() if record["cell_id"] not in cell_ids]
+    atomic_write_bytes(path, "".join(json.dumps(record) + "\n" for record in kept).encode())
+
+
+def batch_key(cell):
+    """Cells with the same key can share one denoising loop (CFG is applied per image)"""
+    return (cell["steps"], cell["scheduler"], cell["early_exit"], cell["deep_cache"], cell["guidance_interval"])
+
+
+def plan_batches(cells, max_batch_size):
+    """Group cells into batches that share steps and scheduler"""
+    groups = {}
+    for cell in cells:
+        groups.setdefault(batch_key(cell), []).append(cell)
+    batches = []
+    for group in groups.values():
+        for start in range(0, len(group), max_batch_size):
+            batches.append(group[start:start + max_batch_size])
+    return batches
+
+
+def run_batch(pipe, embedding_cache, batch):
+    """Generate one batch of cells; returns (images, steps_used, seconds)"""
+    start_time = time.time()
+    output = sample(
+        pipe,
+        prompt_embeds=embedding_cache.encode_batch([cell["prompt"] for cell in batch]),
+        negative_prompt_embeds=embedding_cache.encode_batch([cell["negative_prompt"] for cell in batch]),
+        guidance_scales=[cell["cfg"] for cell in batch],
+        seeds=[cell["seed"] for cell in batch],
+        num_inference_steps=batch[0]["steps"],
+        early_exit_threshold=batch[0]["early_exit"],
+        deep_cache_interval=batch[0]["deep_cache"],
+        guidance_interval=batch[0]["guidance_interval"]
+    )
+    return output.images, output.steps_used, time.time() - start_time
+
+
+def score_records(records, manifest_path):
+    """CLIP-score finished cells that have no score yet; returns the updated records"""
+    missing = [r for r in records if r.get("clip_score") is None]
+    if not missing:
+        return []
+    print(f"Scoring {len(missing)} image(s) with CLIP...")
+    model, processor = load_clip()
+    store = EmbeddingStore()
+    scores = ClipEvaluator(model, processor, store=store).score_files(
+        [r["file"] for r in missing], [r["prompt"] for r in missing]
+    )
+    store.close()
+    updated = []
+    for record, score in zip(missing, scores):
+        record = dict(record, clip_score=score)
+        append_manifest(manifest_path, record)
+        updated.append(record)
+    return updated
+
+
+def config_params(record):
+    """Generation parameters of a record other than prompt and seed"""
+    return {k: record[k] for k in ("cfg", "steps", "scheduler", "early_exit", "deep_cache", "guidance_interval")
+            if record.get(k) is not None}
+
+
+def fid_by_config(records, reference_dir):
+    """FID of each configuration's images against the reference folder, as (params, fid) pairs"""
+    groups = {}
+    for r in records:
+        params = config_params(r)
+        groups.setdefault(json.dumps(params, sort_keys=True), (params, []))[1].append(Path(r["file"]))
+    print(f"Computing FID for {len(groups)} configuration(s) against {reference_dir}...")
+    return [(params, fid_against(files, reference_dir)) for params, files in groups.values() if len(files) >= 2]
+
+
+def store_results(spec, records, fids=()):
+    """Record a sweep's per-cell timings and scores as one run in the results store"""
+    profiles = {r.get("profile") for r in records}
+    store = ResultsStore()
+    run_id = store.start_run("sweep", spec["name"], profile=profiles.pop() if len(profiles) == 1 else "mixed",
+                             host=host_info(), config=spec)
+    rows = []
+    for r in records:
+        params = {k: r[k] for k in ("prompt_index", "cfg", "steps", "scheduler", "seed", "early_exit", "deep_cache",
+                                         "guidance_interval")
+                  if r.get(k) is not None}
+        rows.append(("seconds_per_image", r["seconds"], "s", "lower", params))
+        rows.append(("steps_used", r.get("steps_used", r["steps"]), "steps", "lower", params))
+        if r.get("clip_score") is not None:
+            rows.append(("clip_score", r["clip_score"], None, "higher", params))
+    for params, fid in fids:
+        rows.append(("fid", fid, None, "lower", params))
+    store.record_many(run_id, rows)
+    store.close()
+    return run_id
+
+
+def run_sweep(spec, pipe=None, fresh=False):
+    """Run (or resume) a sweep; returns the manifest records of all cells in grid order"""
+    output_dir = Path(spec["output_dir"])
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_dir / MANIFEST_NAME
+    cells = expand_cells(spec)
+    if fresh:
+        forget_cells(manifest_path, {cell["cell_id"] for cell in cells})
+    done = {cid: r for cid, r in read_manifest(manifest_path).items() if Path(r["file"]).exists()}
+    todo = [cell for cell in cells if cell["cell_id"] not in done]
+    print(f"Sweep '{spec['name']}': {len(cells)} cells, {len(cells) - len(todo)} already done, {len(todo)} to run")
+
+    if todo:
+        pipe = pipe or load_pipeline()
+        embedding_cache = PromptEmbeddingCache(pipe, MODEL_ID)
+        default_scheduler_config = pipe.scheduler.config
+
+        manifest_lock = threading.Lock()
+
+        def commit(record):
+            """Called by the writer once the image is on disk"""
+            def done_callback(future):
+                if future.exception() is None:
+                    with manifest_lock:
+                        append_manifest(manifest_path, record)
+                        done[record["cell_id"]] = record
+            return done_callback
+
+        batches = plan_batches(todo, spec["max_batch_size"])
+        with ImageWriter(spec["image_format"], spec["encode_effort"]) as writer:
+            for n, batch in enumerate(batches, 1):
+                first = batch[0]
+                pipe.scheduler = SCHEDULERS[first["scheduler"]].from_config(default_scheduler_config)
+                cfgs = ", ".join(str(cfg) for cfg in dict.fromkeys(cell["cfg"] for cell in batch))
+                print(f"[{n}/{len(batches)}] {len(batch)} cell(s): CFG={cfgs}, "
+                      f"steps={first['steps']}, scheduler={first['scheduler']}")
+
+                images, steps_used, batch_seconds = run_batch(pipe, embedding_cache, batch)
+                for cell, image, used in zip(batch, images, steps_used):
+                    record = dict(cell, seconds=batch_seconds / len(batch), batch_seconds=batch_seconds,
+                                  batch_size=len(batch), steps_used=used, profile=pipe.performance_profile,
+                                  finished_at=time.strftime("%Y-%m-%d %H:%M:%S"))
+                    metadata = {k: v for k, v in cell.items() if k not in ("cell_id", "file")}
+                    metadata.update(model_id=MODEL_ID, profile=pipe.performance_profile, steps_used=used)
+                    writer.submit(image, cell["file"], metadata).add_done_callback(commit(record))
+                    print(f"  ✓ Queued: {cell['file']} ({record['seconds']:.1f}s/image)")
+
+    # A cell whose image never reached disk (a failed write) has no record; re-running retries it
+    unfinished = [cell for cell in cells if cell["cell_id"] not in done]
+    if unfinished:
+        listing = "\n".join(f"  {cell['cell_id']}  {cell['file']}" for cell in unfinished)
+        raise RuntimeError(f"Sweep '{spec['name']}': {len(unfinished)} cell(s) were not written; "
+                           f"run it again to retry them:\n{listing}")
+    records = [done[cell["cell_id"]] for cell in cells]
+    scored = []
+    # Drop this function's references to the diffusion model before CLIP/Inception are loaded
+    pipe = embedding_cache = None
+    if spec["clip_score"]:
+        scored = score_records(records, manifest_path)
+        for record in scored:
+            done[record["cell_id"]] = record
+        records = [done[cell["cell_id"]] for cell in cells]
+
+    if todo or scored:
+        fids = fid_by_config(records, spec["fid_reference"]) if spec["fid_reference"] else []
+        for params, fid in fids:
+            print(f"  FID {fid:7.2f}  {params}")
+        run_id = store_results(spec, records, fids)
+        print(f"✓ Recorded as run #{run_id} in {RESULTS_DB}")
+    return records
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a declarative parameter sweep")
+    parser.add_argument("spec", help="Path to a sweep spec JSON file")
+    parser.add_argument("--fresh", action="store_true",
+                        help="Forget this sweep's finished cells (other sweeps in the folder are kept)")
+    args = parser.parse_args()
+
+    spec = load_spec(args.spec)
+    records = run_sweep(spec, fresh=args.fresh)
+
+    print("\n" + "="*60)
+    print("SWEEP SUMMARY")
+    print("="*60)
+    for r in records:
+        steps = f"{r.get('steps_used', r['steps']):2d}/{r['steps']:2d}"
+        clip = f", CLIP {r['clip_score']:.2f}" if r.get("clip_score") is not None else ""
+        print(f"  p{r['prompt_index']} CFG {r['cfg']:4.1f} steps {steps} {r['scheduler']:6s} "
+              f"seed {r['seed']} → {r['seconds']:5.1f}s{clip} → {r['file']}")
+    print(f"\nManifest: {Path(spec['output_dir']) / MANIFEST_NAME}")
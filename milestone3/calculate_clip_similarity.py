@@ -1,63 +1,63 @@
-import torch
-from transformers import CLIPProcessor, CLIPModel
-from PIL import Image
+import argparse
 from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.clip_evaluator import ClipEvaluator, EmbeddingStore, image_files, pair_images
+from common.clip_scoring import load_clip
+from common.prompts import FINAL_SET_PROMPTS
+from common.results_store import RESULTS_DB, ResultsStore
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="CLIP text-image similarity of a folder of generated images")
+    parser.add_argument("--images", default="../milestone2/final_images")
+    parser.add_argument("--manifest", default=None,
+                        help="JSONL with file/prompt records (default: <images>/manifest.jsonl if present)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
     print("Calculating CLIP Similarity (Text-Image Alignment)")
     print("="*60)
 
     # Load CLIP
     print("Loading CLIP model...")
-    model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
-    processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
-    
-    device = 'mps' if torch.backends.mps.is_available() else 'cpu'
-    model = model.to(device)
-    print(f"Model loaded on: {device}\n")
+    model, processor = load_clip()
+    print(f"Model loaded on: {model.device}\n")
 
-    # Original prompts from milestone2
-    prompts = [
-        "A majestic lion resting under an acacia tree in the African savanna",
-        "An astronaut floating in space with Earth in the background",
-        "A medieval castle on a cliff overlooking the ocean at dawn",
-        "A bustling night market in Tokyo with colorful neon signs",
-        "A peaceful mountain lake reflecting snow-capped peaks",
-        "An old library filled with ancient books and warm lamplight",
-        "A field of lavender flowers stretching to the horizon under blue sky",
-        "A steampunk robot playing chess in a Victorian study",
-        "A tropical beach with turquoise water and palm trees at golden hour",
-        "An autumn forest path covered with red and orange leaves"
-    ]
+    gen_dir = Path(args.images)
+    manifest = args.manifest or (gen_dir / "manifest.jsonl")
+    manifest = manifest if Path(manifest).exists() else None
+
+    # Each image is paired with its own prompt (manifest, embedded metadata or the
+    # number in its file name), never by position in a sorted listing
+    pairs, unpaired, missing = pair_images(image_files(gen_dir), FINAL_SET_PROMPTS, manifest)
+    for path in unpaired:
+        print(f"⚠️ No prompt for {path.name}; skipped")
+    for prompt in missing:
+        print(f"⚠️ No image for prompt: {prompt}")
+    if not pairs:
+        print("\n❌ Error: No images could be paired with a prompt")
+        exit(1)
 
-    gen_dir = Path("../milestone2/final_images")
-    images = sorted(list(gen_dir.glob("*.png")))
-    
     print("Calculating similarity scores...\n")
-    
+
+    store = EmbeddingStore()
+    evaluator = ClipEvaluator(model, processor, batch_size=args.batch_size, store=store)
+    evaluation = evaluator.evaluate(pairs)
+    store.close()
+
     results = []
-    
-    for i, (img_path, prompt) in enumerate(zip(images, prompts), 1):
-        # Load image
-        image = Image.open(img_path)
-        
-        # Process
-        inputs = processor(text=[prompt], images=image, return_tensors="pt", padding=True)
-        inputs = {k: v.to(device) for k, v in inputs.items()}
-        
-        # Get similarity
-        outputs = model(**inputs)
-        logits_per_image = outputs.logits_per_image
-        similarity = logits_per_image[0][0].item()
-        
+    for i, ((img_path, prompt, source), similarity) in enumerate(zip(pairs, evaluation["scores"]), 1):
         results.append({
             'image': img_path.name,
             'prompt': prompt,
             'similarity': similarity
         })
-        
-        print(f"[{i:2d}] {img_path.name}: {similarity:.4f}")
-    
+
+        print(f"[{i:2d}] {img_path.name}: {similarity:.4f}  ({source})")
+
+    print(f"\n{evaluator.cache_hits}/{len(pairs)} image embeddings reused from the cache")
+
     # Calculate average
     avg_similarity = sum(r['similarity'] for r in results) / len(results)
     
@@ -65,6 +65,7 @@ if __name__ == '__main__':
     print("CLIP SIMILARITY RESULTS")
     print("="*60)
     print(f"Average Similarity: {avg_similarity:.4f}")
+    print(f"Retrieval accuracy: {evaluation['retrieval_accuracy']:.0%} of images closest to their own prompt")
     print("\nInterpretation:")
     print("  > 0.30 = Excellent alignment")
     print("  0.25-0.30 = Good alignment")
@@ -74,9 +75,18 @@ if __name__ == '__main__':
     
     # Save results
     with open("clip_similarity_results.txt", "w") as f:
-        f.write(f"Average CLIP Similarity: {avg_similarity:.4f}\n\n")
+        f.write(f"Average CLIP Similarity: {avg_similarity:.4f}\n")
+        f.write(f"Retrieval accuracy: {evaluation['retrieval_accuracy']:.4f}\n\n")
         f.write("Individual Results:\n")
         for r in results:
             f.write(f"{r['image']}: {r['similarity']:.4f}\n")
     
-    print(f"\nResults saved to: clip_similarity_results.txt")
\ No newline at end of file
+    print(f"\nResults saved to: clip_similarity_results.txt")
+
+    store = ResultsStore()
+    run_id = store.start_run("metric", "clip_similarity",
+                             config={"images": gen_dir.name, "generated": len(results), "unpaired": len(unpaired)})
+    store.record(run_id, "clip_similarity", avg_similarity, unit=None, better="higher")
+    store.record(run_id, "clip_retrieval_accuracy", evaluation["retrieval_accuracy"], unit=None, better="higher")
+    store.close()
+    print(f"Recorded as run #{run_id} in {RESULTS_DB}")
\ No newline at end of file
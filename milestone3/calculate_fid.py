@@ -1,6 +1,10 @@
-from pytorch_fid import fid_score
-import torch
 from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.fid_stats import fid_against, stats_path
+from common.inception_metrics import image_files
+from common.results_store import RESULTS_DB, ResultsStore
 
 if __name__ == '__main__':
     print("Calculating FID (Fréchet Inception Distance)")
@@ -14,8 +18,8 @@ if __name__ == '__main__':
     print(f"Reference images: {reference_images}")
 
     # Count images
-    gen_count = len(list(generated_images.glob("*.png")))
-    ref_count = len(list(reference_images.glob("*.jpg")))
+    gen_count = len(image_files(generated_images))
+    ref_count = len(image_files(reference_images))
 
     print(f"\nGenerated: {gen_count} images")
     print(f"Reference: {ref_count} images")
@@ -24,20 +28,14 @@ if __name__ == '__main__':
         print("\n❌ Error: Need at least 2 images in each folder")
         exit(1)
 
+    # Reference statistics are computed once and cached by content + weights hash,
+    # so after the first run only the generated images go through Inception
+    cached = stats_path(reference_images).exists()
     print("\nCalculating FID score...")
-    print("(This may take 2-3 minutes...)\n")
-
-    # Set device
-    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    print("(Reference statistics cached, embedding generated images only...)\n" if cached
+          else "(First run: caching reference statistics, this may take 2-3 minutes...)\n")
 
-    # Calculate FID with num_workers=0 to avoid multiprocessing issues
-    fid_value = fid_score.calculate_fid_given_paths(
-        [str(generated_images), str(reference_images)],
-        batch_size=8,
-        device=device,
-        dims=2048,
-        num_workers=0  # Fix for Python 3.13 multiprocessing issue
-    )
+    fid_value = fid_against(generated_images, reference_images)
 
     print("="*60)
     print("FID SCORE RESULTS")
@@ -56,4 +54,11 @@ if __name__ == '__main__':
         f.write(f"Generated images: {gen_count}\n")
         f.write(f"Reference images: {ref_count}\n")
 
-    print(f"\nResults saved to: fid_results.txt")
\ No newline at end of file
+    print(f"\nResults saved to: fid_results.txt")
+
+    store = ResultsStore()
+    run_id = store.start_run("metric", "fid",
+                             config={"images": "final_images", "generated": gen_count, "reference": ref_count})
+    store.record(run_id, "fid", fid_value, unit=None, better="lower")
+    store.close()
+    print(f"Recorded as run #{run_id} in {RESULTS_DB}")
\ No newline at end of file
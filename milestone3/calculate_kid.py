@@ -0,0 +1,56 @@
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.inception_metrics import image_features, image_files, kid
+from common.results_store import RESULTS_DB, ResultsStore
+
+if __name__ == '__main__':
+    print("Calculating KID (Kernel Inception Distance)")
+    print("="*60)
+
+    # Paths
+    generated_images = Path("../milestone2/final_images")
+    reference_images = Path("reference_images_resized")
+
+    print(f"Generated images: {generated_images}")
+    print(f"Reference images: {reference_images}")
+
+    gen_count = len(image_files(generated_images))
+    ref_count = len(image_files(reference_images))
+
+    print(f"\nGenerated: {gen_count} images")
+    print(f"Reference: {ref_count} images")
+
+    if gen_count < 2 or ref_count < 2:
+        print("\n❌ Error: Need at least 2 images in each folder")
+        exit(1)
+
+    # Same cached pool3 features as FID and IS (common/inception_metrics.py);
+    # KID is unbiased, so unlike FID it is comparable on small image sets
+    print("\nCalculating KID...\n")
+    generated = image_features(generated_images)
+    reference = image_features(reference_images)
+    kid_mean, kid_std = kid(generated["pool3"], reference["pool3"])
+
+    print("="*60)
+    print("KID RESULTS")
+    print("="*60)
+    print(f"KID: {kid_mean * 1000:.2f} ± {kid_std * 1000:.2f} (×10⁻³)")
+    print("\nLower is better; 0 means the feature distributions match.")
+    print("\n✓ KID calculation complete!")
+
+    # Save results
+    with open("kid_results.txt", "w") as f:
+        f.write(f"KID: {kid_mean:.5f} ± {kid_std:.5f}\n")
+        f.write(f"Generated images: {gen_count}\n")
+        f.write(f"Reference images: {ref_count}\n")
+
+    print(f"\nResults saved to: kid_results.txt")
+
+    store = ResultsStore()
+    run_id = store.start_run("metric", "kid",
+                             config={"images": "final_images", "generated": gen_count, "reference": ref_count})
+    store.record(run_id, "kid", kid_mean, unit=None, better="lower")
+    store.close()
+    print(f"Recorded as run #{run_id} in {RESULTS_DB}")
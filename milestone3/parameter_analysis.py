@@ -1,36 +1,47 @@
 import matplotlib.pyplot as plt
 import numpy as np
 
+from stored_results import metric_value, open_store, sweep_series, sweep_times
+
 if __name__ == '__main__':
     print("Creating Parameter Sensitivity Visualizations")
     print("="*60)
 
-    # Data from Milestone 2 experiments
+    # Data from the latest Milestone 2 sweeps and metric runs in the results store
+    store = open_store()
     
-    # CFG Scale experiment
-    cfg_scales = [3.0, 5.0, 7.5, 10.0, 15.0]
-    cfg_times = [31.8, 30.1, 31.4, 30.0, 222.5]
+    # CFG Scale experiment: the sweep runs every scale in one batch, so each cell's time is the batch
+    # average and says nothing about the scale (CFG costs the same UNet rows at any scale). Plot CLIP instead.
+    cfg_clip = sweep_series(store, "cfg", "clip_score")
     
     # Inference Steps experiment
-    steps = [10, 20, 30, 50]
-    step_times = [17.1, 30.0, 43.5, 139.4]
+    step_data = sweep_times(store, "steps")
+    steps = list(step_data)
+    step_times = list(step_data.values())
     
     # Scheduler experiment
-    schedulers = ['PNDM', 'DDIM', 'LMS', 'Euler']
-    scheduler_times = [31.9, 29.9, 38.4, 50.3]
+    scheduler_data = sweep_times(store, "schedulers")
+    schedulers = list(scheduler_data)
+    scheduler_times = list(scheduler_data.values())
+    fastest_scheduler = min(scheduler_data, key=scheduler_data.get)
     
     # Create visualizations
     fig, axes = plt.subplots(2, 2, figsize=(14, 10))
     fig.suptitle('Milestone 2: Parameter Sensitivity Analysis', fontsize=16, fontweight='bold')
     
-    # Plot 1: CFG Scale vs Time
-    axes[0, 0].plot(cfg_scales, cfg_times, 'o-', linewidth=2, markersize=8, color='#2E86AB')
+    # Plot 1: CFG Scale vs CLIP Score
     axes[0, 0].set_xlabel('CFG Scale', fontsize=12)
-    axes[0, 0].set_ylabel('Generation Time (seconds)', fontsize=12)
-    axes[0, 0].set_title('CFG Scale Impact on Generation Time', fontsize=13, fontweight='bold')
+    axes[0, 0].set_ylabel('CLIP Score', fontsize=12)
+    axes[0, 0].set_title('CFG Scale Impact on Prompt Alignment', fontsize=13, fontweight='bold')
     axes[0, 0].grid(True, alpha=0.3)
-    axes[0, 0].axhline(y=31.4, color='green', linestyle='--', alpha=0.5, label='Optimal (CFG=7.5)')
-    axes[0, 0].legend()
+    if cfg_clip:
+        axes[0, 0].plot(list(cfg_clip), list(cfg_clip.values()), 'o-', linewidth=2, markersize=8, color='#2E86AB')
+        axes[0, 0].axvline(x=7.5, color='green', linestyle='--', alpha=0.5, label='Optimal (CFG=7.5)')
+        axes[0, 0].legend()
+    else:
+        print("  cfg CLIP scores: none stored; re-run the CFG sweep with \"clip_score\": true")
+        axes[0, 0].text(0.5, 0.5, 'No CLIP-scored CFG sweep stored', ha='center', va='center',
+                        transform=axes[0, 0].transAxes, fontsize=11)
     
     # Plot 2: Inference Steps vs Time
     axes[0, 1].plot(steps, step_times, 's-', linewidth=2, markersize=8, color='#A23B72')
@@ -38,7 +49,8 @@ if __name__ == '__main__':
     axes[0, 1].set_ylabel('Generation Time (seconds)', fontsize=12)
     axes[0, 1].set_title('Inference Steps Impact on Generation Time', fontsize=13, fontweight='bold')
     axes[0, 1].grid(True, alpha=0.3)
-    axes[0, 1].axhline(y=30.0, color='green', linestyle='--', alpha=0.5, label='Optimal (20 steps)')
+    axes[0, 1].axhline(y=step_data.get(20, np.median(step_times)), color='green', linestyle='--', alpha=0.5,
+                       label='Optimal (20 steps)')
     axes[0, 1].legend()
     
     # Plot 3: Scheduler Comparison
@@ -48,12 +60,14 @@ if __name__ == '__main__':
     axes[1, 0].set_ylabel('Generation Time (seconds)', fontsize=12)
     axes[1, 0].set_title('Scheduler Comparison', fontsize=13, fontweight='bold')
     axes[1, 0].grid(True, alpha=0.3, axis='y')
-    axes[1, 0].axhline(y=29.9, color='green', linestyle='--', alpha=0.5, label='Fastest (DDIM)')
+    axes[1, 0].axhline(y=scheduler_data[fastest_scheduler], color='green', linestyle='--', alpha=0.5,
+                       label=f'Fastest ({fastest_scheduler})')
     axes[1, 0].legend()
     
     # Plot 4: Metrics Summary
     metrics = ['FID\n(lower better)', 'Inception\nScore', 'CLIP\nSimilarity']
-    values = [374.47, 5.08, 31.85]
+    values = [metric_value(store, "fid"), metric_value(store, "inception_score"),
+              metric_value(store, "clip_similarity")]
     thresholds = [150, 5.0, 0.30]
     
     bars = axes[1, 1].bar(metrics, values, color=['#C73E1D', '#2E86AB', '#06A77D'], alpha=0.7, edgecolor='black')
@@ -70,19 +84,18 @@ if __name__ == '__main__':
     plt.savefig('parameter_analysis.png', dpi=300, bbox_inches='tight')
     print("\n✓ Visualization saved: parameter_analysis.png")
     
-    # Create a second figure: Time efficiency comparison
+    # Create a second figure: Time efficiency comparison (step counts only; CFG scales share one batch)
     fig2, ax = plt.subplots(figsize=(10, 6))
     
-    all_configs = ['CFG 3.0', 'CFG 5.0', 'CFG 7.5\n(Optimal)', 'CFG 10.0', 'CFG 15.0',
-                   'Steps 10', 'Steps 20\n(Optimal)', 'Steps 30', 'Steps 50']
-    all_times = cfg_times + step_times
-    colors_config = ['#2E86AB']*5 + ['#A23B72']*4
+    all_configs = [f'Steps {n}' + ('\n(Optimal)' if n == 20 else '') for n in steps]
+    all_times = step_times
+    colors_config = ['#A23B72']*len(step_times)
     
     bars = ax.bar(range(len(all_configs)), all_times, color=colors_config, alpha=0.7, edgecolor='black')
     ax.set_xticks(range(len(all_configs)))
     ax.set_xticklabels(all_configs, rotation=45, ha='right')
     ax.set_ylabel('Generation Time (seconds)', fontsize=12)
-    ax.set_title('Configuration Impact on Generation Speed', fontsize=14, fontweight='bold')
+    ax.set_title('Inference Steps Impact on Generation Speed', fontsize=14, fontweight='bold')
     ax.grid(True, alpha=0.3, axis='y')
     ax.axhline(y=30, color='green', linestyle='--', alpha=0.5, linewidth=2, label='Target: ~30s')
     ax.legend()
@@ -0,0 +1,61 @@
+"""
+Numbers for the analysis plots, read from the results store.
+
+Sweeps (milestone2/sweep.py), generate_final_set.py and the metric scripts
+record their results in common/results_store.py. The plots take the latest
+run of each. Until a run exists, they fall back to the Milestone 2/3 values
+that used to be typed into the plotting scripts, and say so.
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.results_store import ResultsStore
+
+# Single-run timings (no warm-up) from the Milestone 2 experiments
+HISTORICAL_SWEEP_TIMES = {
+    "cfg": {3.0: 31.8, 5.0: 30.1, 7.5: 31.4, 10.0: 30.0, 15.0: 222.5},
+    "steps": {10: 17.1, 20: 30.0, 30: 43.5, 50: 139.4},
+    "schedulers": {"PNDM": 31.9, "DDIM": 29.9, "LMS": 38.4, "Euler": 50.3},
+}
+# Milestone 3 metrics of the final image set
+HISTORICAL_METRICS = {"fid": 374.47, "inception_score": 5.08, "clip_similarity": 31.85}
+HISTORICAL_SECONDS_PER_IMAGE = 35.0
+
+SWEEP_AXES = {"cfg": "cfg", "steps": "steps", "schedulers": "scheduler"}
+
+
+def sweep_series(store, name, metric="seconds_per_image"):
+    """{axis value: mean metric} of the latest stored sweep, or None if there is none"""
+    values = store.axis_means("sweep", name, metric, SWEEP_AXES[name])
+    return values or None
+
+
+def sweep_times(store, name):
+    """Seconds per image by axis value, falling back to the Milestone 2 timings"""
+    times = sweep_series(store, name)
+    if times:
+        print(f"  {name} timings: latest '{name}' sweep in the results store")
+        return times
+    print(f"  {name} timings: no stored sweep, using Milestone 2 values")
+    return HISTORICAL_SWEEP_TIMES[name]
+
+
+def metric_value(store, name):
+    """Latest stored value of a final-set metric, falling back to the Milestone 3 value"""
+    values = store.latest_values("metric", name, name)
+    if values:
+        print(f"  {name}: latest stored run")
+        return values[0][1]
+    print(f"  {name}: no stored run, using Milestone 3 value")
+    return HISTORICAL_METRICS[name]
+
+
+def final_set_seconds_per_image(store):
+    values = [value for _, value in store.latest_values("generation", "final_set", "seconds_per_image")]
+    return sum(values) / len(values) if values else HISTORICAL_SECONDS_PER_IMAGE
+
+
+def open_store():
+    return ResultsStore()
@@ -1,9 +1,17 @@
 import matplotlib.pyplot as plt
 import numpy as np
 
+from stored_results import final_set_seconds_per_image, metric_value, open_store, sweep_series, sweep_times
+
 if __name__ == '__main__':
     print("Creating Model & Configuration Comparison Visualizations")
     print("="*60)
+
+    # Measured values from the results store (Milestone 2/3 values where nothing is stored yet)
+    store = open_store()
+    fid_value = metric_value(store, "fid")
+    is_value = metric_value(store, "inception_score")
+    clip_value = metric_value(store, "clip_similarity")
     
     # Create figure with multiple comparison plots
     fig, axes = plt.subplots(2, 2, figsize=(16, 12))
@@ -13,9 +21,9 @@ if __name__ == '__main__':
     # Plot 1: Metrics Comparison Across Configurations
     # ============================================
     configs = ['Baseline\n(M1)', 'Optimized\n(M2)', 'SOTA\nReference']
-    fid_scores = [400, 374.47, 25]  # Lower is better
-    is_scores = [4.5, 5.08, 8.0]    # Higher is better
-    clip_scores = [28, 31.85, 35]   # Higher is better
+    fid_scores = [400, fid_value, 25]  # Lower is better
+    is_scores = [4.5, is_value, 8.0]    # Higher is better
+    clip_scores = [28, clip_value, 35]  # Higher is better
     
     x = np.arange(len(configs))
     width = 0.25
@@ -50,58 +58,61 @@ if __name__ == '__main__':
     # ============================================
     ax2 = axes[0, 1]
     
-    # Different configurations tested
-    config_names = ['CFG 3', 'CFG 5', 'CFG 7.5\n(Optimal)', 'CFG 10', 'CFG 15',
-                    '10 Steps', '20 Steps\n(Optimal)', '30 Steps', '50 Steps']
-    generation_times = [31.8, 30.1, 31.4, 30.0, 222.5, 17.1, 30.0, 43.5, 139.4]
-    quality_estimates = [3.5, 4.0, 5.08, 5.2, 5.3, 3.8, 5.08, 5.3, 5.5]  # Estimated quality
-    
-    # Split into CFG and Steps
-    cfg_times = generation_times[:5]
-    cfg_quality = quality_estimates[:5]
-    step_times = generation_times[5:]
-    step_quality = quality_estimates[5:]
-    
-    scatter1 = ax2.scatter(cfg_times, cfg_quality, s=200, c='#2E86AB', 
-                          alpha=0.7, edgecolors='black', linewidth=2, label='CFG Scale')
-    scatter2 = ax2.scatter(step_times, step_quality, s=200, c='#A23B72', 
+    # Sweeps whose cells were timed per configuration. The CFG sweep runs every scale in one
+    # batch, so its per-cell times are batch averages and are left out of the speed plots.
+    step_data = sweep_times(store, "steps")
+    scheduler_data = sweep_times(store, "schedulers")
+    step_times = list(step_data.values())
+    scheduler_times = list(scheduler_data.values())
+    
+    # Quality = measured CLIP score of each sweep image
+    step_clip = sweep_series(store, "steps", "clip_score")
+    scheduler_clip = sweep_series(store, "schedulers", "clip_score")
+    if not (step_clip and scheduler_clip):
+        raise SystemExit("❌ The stored sweeps have no CLIP scores; re-run them with \"clip_score\": true")
+    step_quality = [step_clip[n] for n in step_data]
+    scheduler_quality = [scheduler_clip[name] for name in scheduler_data]
+    optimal_time = step_data.get(20, np.median(step_times))
+    optimal_quality = step_clip.get(20, np.median(step_quality))
+    
+    scatter1 = ax2.scatter(step_times, step_quality, s=200, c='#A23B72', 
                           alpha=0.7, edgecolors='black', linewidth=2, marker='s', label='Inference Steps')
+    scatter2 = ax2.scatter(scheduler_times, scheduler_quality, s=200, c='#F18F01', 
+                          alpha=0.7, edgecolors='black', linewidth=2, marker='D', label='Scheduler')
     
     # Annotate optimal point
-    ax2.scatter([31.4], [5.08], s=400, c='#06A77D', marker='*', 
-               edgecolors='black', linewidth=2, label='Optimal (CFG 7.5, 20 Steps)', zorder=5)
+    ax2.scatter([optimal_time], [optimal_quality], s=400, c='#06A77D', marker='*', 
+               edgecolors='black', linewidth=2, label='Optimal (20 Steps)', zorder=5)
     
     ax2.set_xlabel('Generation Time (seconds)', fontsize=12, fontweight='bold')
-    ax2.set_ylabel('Estimated Quality Score', fontsize=12, fontweight='bold')
+    ax2.set_ylabel('CLIP Score', fontsize=12, fontweight='bold')
     ax2.set_title('Quality vs Speed Trade-off', fontsize=14, fontweight='bold')
     ax2.legend(loc='lower right', fontsize=10)
     ax2.grid(True, alpha=0.3)
-    ax2.set_xlim(0, 240)
-    ax2.set_ylim(3, 6)
+    all_quality = step_quality + scheduler_quality
+    ax2.set_xlim(0, max(step_times + scheduler_times) * 1.08)
+    ax2.set_ylim(min(all_quality) - 0.5, max(all_quality) + 0.5)
     
     # ============================================
     # Plot 3: Configuration Efficiency Score
     # ============================================
     ax3 = axes[1, 0]
     
-    configs_eff = ['CFG 3.0', 'CFG 5.0', 'CFG 7.5\n★', 'CFG 10.0', 'CFG 15.0',
-                   'Steps 10', 'Steps 20\n★', 'Steps 30', 'Steps 50']
+    configs_eff = [f'Steps {n}' + ('\n★' if n == 20 else '') for n in step_data] + \
+                  list(scheduler_data)
     
     # Efficiency = Quality / Time (normalized)
-    efficiency = [
-        3.5/31.8, 4.0/30.1, 5.08/31.4, 5.2/30.0, 5.3/222.5,  # CFG
-        3.8/17.1, 5.08/30.0, 5.3/43.5, 5.5/139.4  # Steps
-    ]
+    efficiency = [q / t for q, t in zip(step_quality + scheduler_quality, step_times + scheduler_times)]
     efficiency = [e * 100 for e in efficiency]  # Scale up
     
-    colors_eff = ['#2E86AB']*5 + ['#A23B72']*4
+    colors_eff = ['#A23B72']*len(step_times) + ['#F18F01']*len(scheduler_times)
     bars = ax3.barh(configs_eff, efficiency, color=colors_eff, alpha=0.7, edgecolor='black', linewidth=1.5)
     
     # Highlight optimal
-    bars[2].set_color('#06A77D')
-    bars[2].set_alpha(0.9)
-    bars[6].set_color('#06A77D')
-    bars[6].set_alpha(0.9)
+    for i, label in enumerate(configs_eff):
+        if '★' in label:
+            bars[i].set_color('#06A77D')
+            bars[i].set_alpha(0.9)
     
     for i, (bar, eff) in enumerate(zip(bars, efficiency)):
         ax3.text(eff + 0.5, bar.get_y() + bar.get_height()/2, 
@@ -119,9 +130,9 @@ if __name__ == '__main__':
     ax4 = axes[1, 1]
     
     milestones = ['M1\nSetup', 'M2\nOptimize', 'M3\nEvaluate', 'M4\nFinalize']
-    fid_progress = [400, 374.47, 374.47, 374.47]  # FID (lower better)
-    is_progress = [4.5, 5.08, 5.08, 5.08]         # IS (higher better)
-    clip_progress = [28, 31.85, 31.85, 31.85]     # CLIP (higher better)
+    fid_progress = [400, fid_value, fid_value, fid_value]     # FID (lower better)
+    is_progress = [4.5, is_value, is_value, is_value]         # IS (higher better)
+    clip_progress = [28, clip_value, clip_value, clip_value]  # CLIP (higher better)
     
     x_m = np.arange(len(milestones))
     
@@ -145,9 +156,9 @@ if __name__ == '__main__':
     # Add annotations
     ax4.annotate('Baseline\nEstablished', xy=(0, 1), xytext=(0, 0.5),
                 fontsize=9, ha='center', color='gray', style='italic')
-    ax4.annotate('Parameters\nOptimized', xy=(1, 5.08), xytext=(1, 5.5),
+    ax4.annotate('Parameters\nOptimized', xy=(1, is_value), xytext=(1, 5.5),
                 fontsize=9, ha='center', color='gray', style='italic')
-    ax4.annotate('Metrics\nCalculated', xy=(2, 5.08), xytext=(2, 5.5),
+    ax4.annotate('Metrics\nCalculated', xy=(2, is_value), xytext=(2, 5.5),
                 fontsize=9, ha='center', color='gray', style='italic')
     
     plt.tight_layout()
@@ -195,7 +206,7 @@ if __name__ == '__main__':
     # Bar chart: Our system vs SOTA
     ax_bar = axes2[1]
     metrics_names = ['FID\n(lower=better)', 'Inception\nScore', 'CLIP\nSimilarity', 'Avg Gen\nTime (s)']
-    our_values = [374.47, 5.08, 31.85, 35]
+    our_values = [fid_value, is_value, clip_value, final_set_seconds_per_image(store)]
     sota_values = [25, 8.5, 35, 10]
     
     x_bar = np.arange(len(metrics_names))
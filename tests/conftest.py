@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# Same layout as the scripts: common/ from the repo root, demo modules from demo/
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "demo"))
@@ -0,0 +1,54 @@
+import pytest
+
+pytest.importorskip("torch")
+
+from common import autotune
+
+
+@pytest.fixture
+def fake_trials(monkeypatch):
+    """Replaces the spawned trials: throughput grows with threads and batch size"""
+    ran = []
+
+    def run_trial(config, profile, num_steps, repeats):
+        ran.append(config)
+        return {"config": config, "images_per_minute": config["num_threads"] * config["batch_size"],
+                "batch_latency_p50": 1.0}
+
+    monkeypatch.setattr(autotune, "ensure_snapshot", lambda profile: None)
+    monkeypatch.setattr(autotune, "available_cores", lambda: list(range(8)))
+    monkeypatch.setattr(autotune, "run_trial", run_trial)
+    return ran
+
+
+def test_budget_stops_the_whole_search(fake_trials, capsys):
+    best, trials = autotune.autotune(max_trials=3)
+    assert len(trials) == len(fake_trials) == 3
+    assert capsys.readouterr().out.count("Trial budget reached") == 1
+    assert best["config"]["num_threads"] == 8
+
+
+def test_full_search_tunes_every_knob(fake_trials):
+    best, trials = autotune.autotune(max_trials=100)
+    assert best["config"]["num_threads"] == 8
+    assert best["config"]["batch_size"] == max(autotune.BATCH_SIZES)
+    assert len({tuple(sorted(trial["config"].items())) for trial in trials}) == len(trials)
+
+
+def test_no_trials(fake_trials):
+    assert autotune.autotune(max_trials=0) == (None, [])
+
+
+def test_failed_trials_are_skipped_and_counted(fake_trials, monkeypatch, capsys):
+    succeed = autotune.run_trial
+
+    def run_trial(config, profile, num_steps, repeats):
+        if config["batch_size"] == max(autotune.BATCH_SIZES):
+            raise RuntimeError(f"Autotune trial {config} crashed with exit code -9")
+        return succeed(config, profile, num_steps, repeats)
+
+    monkeypatch.setattr(autotune, "run_trial", run_trial)
+    best, trials = autotune.autotune(max_trials=100)
+    assert best["config"]["batch_size"] == sorted(autotune.BATCH_SIZES)[-2]
+    assert all(trial["config"]["batch_size"] != max(autotune.BATCH_SIZES) for trial in trials)
+    assert "crashed with exit code -9" in capsys.readouterr().out
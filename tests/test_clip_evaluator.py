@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+pytest.importorskip("torch")
+Image = pytest.importorskip("PIL.Image")
+
+from common.clip_evaluator import pair_images, read_manifest
+from common.image_writer import write_image
+
+PROMPTS = ["a koi pond", "a red bridge", "a bonsai tree"]
+
+
+def save(path, metadata=None):
+    if metadata:
+        write_image(Image.new("RGB", (8, 8)), path, metadata=metadata)
+    else:
+        Image.new("RGB", (8, 8)).save(path)
+    return path
+
+
+def test_pairs_by_file_index_and_reports_gaps(tmp_path):
+    files = [save(tmp_path / "image_01.png"), save(tmp_path / "image_03.png"), save(tmp_path / "cover.png")]
+    pairs, unpaired, missing = pair_images(files, PROMPTS)
+    assert [(path.name, prompt, source) for path, prompt, source in pairs] == [
+        ("image_01.png", "a koi pond", "filename"), ("image_03.png", "a bonsai tree", "filename")]
+    assert unpaired == [tmp_path / "cover.png"]
+    # image_02 is missing: its prompt is reported, not paired with image_03
+    assert missing == ["a red bridge"]
+
+
+def test_manifest_wins_over_metadata_over_filename(tmp_path):
+    files = [save(tmp_path / "image_01.png", {"prompt": "a red bridge"}),
+             save(tmp_path / "image_02.png", {"prompt": "a red bridge"}),
+             save(tmp_path / "image_99.png")]
+    manifest = tmp_path / "manifest.jsonl"
+    manifest.write_text(json.dumps({"file": str(files[0]), "prompt": "a bonsai tree"}) + "\n{torn")
+    assert read_manifest(manifest) == {"image_01.png": "a bonsai tree"}
+
+    pairs, unpaired, missing = pair_images(files, PROMPTS, manifest)
+    assert [(prompt, source) for _, prompt, source in pairs] == [("a bonsai tree", "manifest"),
+                                                                  ("a red bridge", "metadata")]
+    assert unpaired == [files[2]]
+    assert missing == ["a koi pond"]
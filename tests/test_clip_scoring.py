@@ -0,0 +1,64 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from common.clip_scoring import ClipScorer, clip_scores
+
+
+class FakeInputs(dict):
+    def to(self, device):
+        return self
+
+
+class FakeProcessor:
+    """Passes a number per item through to the fake model"""
+
+    def __call__(self, text=None, images=None, return_tensors=None, padding=None):
+        return FakeInputs(values=torch.tensor([float(len(t)) for t in text] if text else [float(i) for i in images]))
+
+
+class FakeClip:
+    """Feature of item x is the unit vector (1, x); counts forward passes"""
+    device = "cpu"
+    logit_scale = torch.tensor(0.0)
+
+    def __init__(self):
+        self.passes = 0
+
+    def _features(self, values):
+        self.passes += 1
+        return torch.stack([torch.ones_like(values), values], dim=1)
+
+    def get_text_features(self, values):
+        return self._features(values)
+
+    def get_image_features(self, values):
+        return self._features(values)
+
+
+def test_calls_larger_than_the_cache_return_every_row():
+    model = FakeClip()
+    scorer = ClipScorer(model, FakeProcessor(), batch_size=2, max_text_entries=2, max_image_entries=2)
+    images, hashes = [1, 2, 3, 4, 5], ["a", "b", "c", "d", "e"]
+    features = scorer.image_features(images, hashes)
+    assert features.shape == (5, 2)
+    assert torch.allclose(features[4], torch.tensor([1.0, 5.0]) / torch.tensor([1.0, 5.0]).norm())
+    assert scorer.text_features(["a", "bb", "ccc", "a"]).shape == (4, 2)
+
+
+def test_cached_features_skip_the_model():
+    model = FakeClip()
+    scorer = ClipScorer(model, FakeProcessor())
+    scorer.image_features([1, 2], ["a", "b"])
+    passes = model.passes
+    scorer.image_features([2, 1], ["b", "a"])
+    assert model.passes == passes
+
+
+def test_clip_scores_reuses_its_scorer():
+    model, processor = FakeClip(), FakeProcessor()
+    first = clip_scores(model, processor, [1], ["a"])
+    passes = model.passes
+    assert clip_scores(model, processor, [1], ["a"]) == first
+    assert model.passes == passes
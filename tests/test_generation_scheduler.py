@@ -0,0 +1,80 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("PIL")
+
+import generation_scheduler
+from generation_scheduler import GenerationCancelled, GenerationRequest, GenerationScheduler
+
+
+class FakeEmbeddings:
+    def encode_batch(self, texts):
+        return list(texts)
+
+
+@pytest.fixture
+def fake_sample(monkeypatch):
+    """Replaces the sampler; `behaviour` decides what each batch does"""
+    state = SimpleNamespace(behaviour=None, started=threading.Event(), release=threading.Event())
+
+    def sample(pipe, prompt_embeds, seeds, on_step_end, **kwargs):
+        return state.behaviour(seeds, on_step_end)
+
+    monkeypatch.setattr(generation_scheduler, "sample", sample)
+    return state
+
+
+def scheduler(batch_window=0.0):
+    return GenerationScheduler(SimpleNamespace(unet=SimpleNamespace()), FakeEmbeddings(), batch_window=batch_window)
+
+
+def output(seeds, steps_used=None):
+    return SimpleNamespace(images=list(seeds), steps_used=steps_used or [1] * len(seeds))
+
+
+def test_worker_survives_a_failing_batch(fake_sample):
+    # steps_used of zero used to divide by zero after sampling and kill the worker thread
+    fake_sample.behaviour = lambda seeds, on_step_end: SimpleNamespace(images=None, steps_used=[0])
+    gen = scheduler()
+    failed = gen.submit(GenerationRequest("a koi pond", seeds=[1]))
+    with pytest.raises(TypeError):
+        failed.future.result(timeout=5)
+
+    fake_sample.behaviour = lambda seeds, on_step_end: output(seeds)
+    ok = gen.submit(GenerationRequest("a red bridge", seeds=[2, 3]))
+    assert ok.future.result(timeout=5).images == [2, 3]
+
+
+def test_cancelled_running_ticket_never_gets_images(fake_sample):
+    def behaviour(seeds, on_step_end):
+        fake_sample.started.set()
+        fake_sample.release.wait(5)
+        on_step_end(0, 999, None)
+        return output(seeds)
+
+    fake_sample.behaviour = behaviour
+    # A batching window long enough for both tickets to share one batch
+    gen = scheduler(batch_window=0.5)
+    kept = gen.submit(GenerationRequest("a koi pond", seeds=[1]))
+    dropped = gen.submit(GenerationRequest("a koi pond", seeds=[2]))
+    assert fake_sample.started.wait(5)
+    dropped.cancel()
+    fake_sample.release.set()
+
+    assert kept.future.result(timeout=5).images == [1]
+    with pytest.raises(GenerationCancelled):
+        dropped.future.result(timeout=5)
+
+
+def test_queued_ticket_is_cancelled(fake_sample):
+    fake_sample.behaviour = lambda seeds, on_step_end: (fake_sample.release.wait(5), output(seeds))[1]
+    gen = scheduler()
+    running = gen.submit(GenerationRequest("a koi pond", seeds=[1], num_steps=10))
+    queued = gen.submit(GenerationRequest("a koi pond", seeds=[2], num_steps=30))
+    queued.cancel()
+    fake_sample.release.set()
+    assert running.future.result(timeout=5).images == [1]
+    assert queued.future.cancelled()
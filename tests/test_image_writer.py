@@ -0,0 +1,27 @@
+import logging
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from common.image_writer import ImageWriter, read_metadata
+
+
+def test_writes_image_with_metadata(tmp_path):
+    with ImageWriter("png") as writer:
+        path = writer.submit(Image.new("RGB", (8, 8)), tmp_path / "image_01.png", {"seed": 3}).result()
+    assert read_metadata(path) == {"seed": 3}
+
+
+def test_failed_write_is_logged_dropped_and_raised_once(tmp_path, caplog):
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("")
+    writer = ImageWriter("png")
+    with caplog.at_level(logging.ERROR, logger="common.image_writer"):
+        writer.submit(Image.new("RGB", (8, 8)), blocker / "image.png")
+        with pytest.raises(OSError):
+            writer.wait()
+    assert "Background image write failed" in caplog.text
+    assert not writer._pending
+    writer.wait()  # the failure was reported already
+    writer.close()
@@ -0,0 +1,68 @@
+import itertools
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("torch")
+pytest.importorskip("pytorch_fid")
+
+from common.inception_metrics import MIN_IMAGES_PER_SPLIT, fid, inception_score, kid
+
+
+def one_hot_logits(classes, num_classes=8, confidence=50.0):
+    logits = np.zeros((len(classes), num_classes))
+    logits[np.arange(len(classes)), classes] = confidence
+    return logits
+
+
+def test_inception_score_of_uninformative_predictions_is_one():
+    mean, std, splits = inception_score(np.zeros((200, 8)))
+    assert (mean, std, splits) == (pytest.approx(1.0), pytest.approx(0.0), 4)
+
+
+def test_inception_score_counts_confident_distinct_classes():
+    # Every split holds 4 classes equally often, each predicted with certainty: IS = 4
+    mean, std, splits = inception_score(one_hot_logits([i % 4 for i in range(240)]), splits=4)
+    assert mean == pytest.approx(4.0, rel=1e-6)
+    assert std == pytest.approx(0.0, abs=1e-6)
+
+
+def test_inception_score_uses_fewer_splits_for_small_sets():
+    assert inception_score(np.zeros((MIN_IMAGES_PER_SPLIT - 1, 8)))[2] == 1
+    assert inception_score(np.zeros((3 * MIN_IMAGES_PER_SPLIT, 8)), splits=10)[2] == 3
+
+
+def unbiased_mmd(x, y):
+    """Direct unbiased MMD² with the cubic polynomial kernel, pair by pair"""
+    kernel = lambda a, b: (a @ b / len(a) + 1) ** 3
+    within = lambda s: np.mean([kernel(s[i], s[j]) for i, j in itertools.permutations(range(len(s)), 2)])
+    across = np.mean([kernel(a, b) for a in x for b in y])
+    return within(x) + within(y) - 2 * across
+
+
+def test_kid_matches_pairwise_definition():
+    rng = np.random.default_rng(0)
+    x, y = rng.normal(size=(12, 5)), rng.normal(0.5, 1.0, size=(12, 5))
+    # One subset of every image: the sample order does not change the estimate
+    mean, std = kid(x, y, subsets=1)
+    assert mean == pytest.approx(unbiased_mmd(x, y))
+    assert std == 0.0
+
+
+def test_kid_grows_with_distribution_shift():
+    rng = np.random.default_rng(1)
+    reference = rng.normal(size=(200, 16))
+    same = kid(rng.normal(size=(200, 16)), reference, subsets=20, subset_size=100)[0]
+    shifted = kid(rng.normal(1.0, 1.0, size=(200, 16)), reference, subsets=20, subset_size=100)[0]
+    assert abs(same) < shifted
+
+
+def test_kid_needs_two_images():
+    with pytest.raises(ValueError):
+        kid(np.zeros((1, 4)), np.zeros((5, 4)))
+
+
+def test_fid_of_identical_features_is_zero():
+    features = np.random.default_rng(2).normal(size=(64, 6))
+    assert fid(features, features) == pytest.approx(0.0, abs=1e-4)
+    assert fid(features + 1.0, features) == pytest.approx(6.0, rel=1e-3)
@@ -0,0 +1,37 @@
+import queue
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("torch")
+
+from common import parallel_generation
+from common.parallel_generation import ParallelGenerator
+
+
+def generator_with(processes, messages=()):
+    generator = ParallelGenerator(workers=len(processes), threads=1)
+    generator._results = queue.Queue()
+    for message in messages:
+        generator._results.put(message)
+    generator._processes = processes
+    return generator
+
+
+def process(alive, exitcode=None):
+    return SimpleNamespace(is_alive=lambda: alive, pid=1234, exitcode=exitcode)
+
+
+def test_dead_worker_is_reported_instead_of_blocking(monkeypatch):
+    monkeypatch.setattr(parallel_generation, "LIVENESS_POLL_SECONDS", 0.01)
+    generator = generator_with([process(True), process(False, exitcode=-9)])
+    with pytest.raises(RuntimeError, match=r"worker 1 \(pid 1234\) died with exit code -9"):
+        generator._next_result()
+
+
+def test_messages_already_sent_are_read_before_the_liveness_check(monkeypatch):
+    monkeypatch.setattr(parallel_generation, "LIVENESS_POLL_SECONDS", 0.01)
+    generator = generator_with([process(False, exitcode=0)], [("done", 0, ("image", 1.0, 0))])
+    assert generator._next_result() == ("done", 0, ("image", 1.0, 0))
+    with pytest.raises(RuntimeError):
+        generator._next_result()
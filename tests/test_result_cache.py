@@ -0,0 +1,63 @@
+import json
+import os
+import time
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from result_cache import ResultCache
+
+ENTRY_BYTES = b"x" * 1000
+
+
+def age(cache, key, seconds):
+    """Pretend an entry was last used `seconds` ago"""
+    _, meta_path = cache._paths(key)
+    then = time.time() - seconds
+    os.utime(meta_path, (then, then))
+
+
+def entry_size(cache, key):
+    return sum(path.stat().st_size for path in cache._paths(key))
+
+
+def test_keys_depend_on_every_parameter():
+    key = ResultCache.make_key(prompt="a koi pond", seed=0, steps=20)
+    assert key == ResultCache.make_key(steps=20, seed=0, prompt="a koi pond")
+    assert key != ResultCache.make_key(prompt="a koi pond", seed=1, steps=20)
+
+
+def test_size_budget_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(tmp_path, max_bytes=10 ** 9)
+    for n, key in enumerate(["old", "middle", "new"]):
+        cache.put_encoded(key, ENTRY_BYTES, {"seed": n})
+        age(cache, key, 300 - 100 * n)
+    cache.max_bytes = entry_size(cache, "middle") + entry_size(cache, "new")
+    cache.evict()
+    assert cache.get_bytes("old") is None
+    assert cache.get_bytes("middle") == cache.get_bytes("new") == ENTRY_BYTES
+    assert not cache._paths("old")[1].exists()
+
+
+def test_expired_entries_and_stale_temp_files_are_removed(tmp_path):
+    cache = ResultCache(tmp_path, max_age_seconds=3600)
+    cache.put_encoded("fresh", ENTRY_BYTES, {})
+    cache.put_encoded("expired", ENTRY_BYTES, {})
+    age(cache, "expired", 7200)
+    stale = tmp_path / "crashed.tmp"
+    stale.write_bytes(b"")
+    os.utime(stale, (0, 0))
+    cache.evict()
+    assert cache.get_bytes("fresh") == ENTRY_BYTES
+    assert cache.get_bytes("expired") is None
+    assert not stale.exists()
+
+
+def test_update_metadata_keeps_existing_fields(tmp_path):
+    cache = ResultCache(tmp_path)
+    cache.put_encoded("key", ENTRY_BYTES, {"seed": 3})
+    cache.update_metadata("key", clip_score=31.5)
+    cache.update_metadata("missing", clip_score=1.0)
+    assert json.loads(cache._paths("key")[1].read_text()) == {"seed": 3, "clip_score": 31.5}
+    assert not cache._paths("missing")[1].exists()
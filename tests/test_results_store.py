@@ -0,0 +1,70 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from common.results_store import REPO_ROOT, ResultsStore
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return tmp_path / "results.sqlite"
+
+
+def record_run(path, rows):
+    store = ResultsStore(path)
+    run_id = store.start_run("benchmark", "stages")
+    store.record_many(run_id, rows)
+    store.close()
+    return run_id
+
+
+def baseline_rows():
+    return [
+        ("seconds_per_image", 10.0, "s", "lower", {"steps": 20}),
+        ("peak_rss", 4000.0, "MB", "lower", None),
+        ("images_per_minute", 6.0, "img/min", "higher", None),
+        ("clip_score", 31.0, None, "higher", None),
+    ]
+
+
+def compare_cli(path, base, new, *args):
+    env = dict(os.environ, T2I_RESULTS_DB=str(path))
+    return subprocess.run([sys.executable, "-m", "common.results_store", "compare", str(base), str(new), *args],
+                          cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+
+
+def test_compare_flags_only_latency_and_memory_beyond_threshold(store_path):
+    base = record_run(store_path, baseline_rows())
+    new = record_run(store_path, [
+        ("seconds_per_image", 10.5, "s", "lower", {"steps": 20}),  # +5%: within threshold
+        ("peak_rss", 5000.0, "MB", "lower", None),  # +25%
+        ("images_per_minute", 3.0, "img/min", "higher", None),  # worse, but not a compared unit
+        ("clip_score", 20.0, None, "higher", None),
+        ("seconds_per_image", 99.0, "s", "lower", {"steps": 50}),  # nothing to match
+    ])
+    store = ResultsStore(store_path)
+    changes = {c["metric"]: c for c in store.compare(base, new)}
+    store.close()
+    assert set(changes) == {"seconds_per_image", "peak_rss", "images_per_minute", "clip_score"}
+    assert changes["seconds_per_image"]["change"] == pytest.approx(0.05)
+    assert [m for m, c in changes.items() if c["regression"]] == ["peak_rss"]
+
+
+def test_compare_exit_codes(store_path):
+    base = record_run(store_path, baseline_rows())
+    faster = record_run(store_path, [("seconds_per_image", 8.0, "s", "lower", {"steps": 20})])
+    slower = record_run(store_path, [("seconds_per_image", 12.0, "s", "lower", {"steps": 20})])
+
+    result = compare_cli(store_path, base, faster)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "No regressions" in result.stdout
+
+    result = compare_cli(store_path, base, slower)
+    assert result.returncode == 1
+    assert "1 regression(s)" in result.stdout
+
+    # A looser threshold accepts the same +20%
+    assert compare_cli(store_path, base, slower, "--threshold", "0.25").returncode == 0
+    assert compare_cli(store_path, base, "latest", "--name", "stages").returncode == 1
@@ -0,0 +1,112 @@
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+diffusers = pytest.importorskip("diffusers")
+
+from common.sampling import guidance_active, predicted_x0, sample
+
+# Stable Diffusion 1.5 scheduler configuration
+SD_SCHEDULER_CONFIG = {
+    "num_train_timesteps": 1000,
+    "beta_start": 0.00085,
+    "beta_end": 0.012,
+    "beta_schedule": "scaled_linear",
+    "steps_offset": 1,
+}
+SCHEDULERS = {
+    "PNDM": lambda: diffusers.PNDMScheduler(**SD_SCHEDULER_CONFIG, skip_prk_steps=True, set_alpha_to_one=False),
+    "DDIM": lambda: diffusers.DDIMScheduler(**SD_SCHEDULER_CONFIG, set_alpha_to_one=False),
+    "Euler": lambda: diffusers.EulerDiscreteScheduler(**SD_SCHEDULER_CONFIG),
+    "LMS": lambda: diffusers.LMSDiscreteScheduler(**SD_SCHEDULER_CONFIG),
+    "DPMSolver": lambda: diffusers.DPMSolverMultistepScheduler(**SD_SCHEDULER_CONFIG),
+}
+
+
+class ZeroUNet(torch.nn.Module):
+    """Stands in for the UNet: predicts zero noise and counts batch rows per call"""
+
+    def __init__(self):
+        super().__init__()
+        self.config = SimpleNamespace(in_channels=4)
+        self.calls = []
+
+    def forward(self, sample, timestep, encoder_hidden_states, return_dict=False):
+        self.calls.append(sample.shape[0])
+        return (torch.zeros_like(sample),)
+
+
+class TinyPipeline:
+    vae_scale_factor = 8
+    _execution_device = torch.device("cpu")
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.unet = ZeroUNet()
+
+    def prepare_extra_step_kwargs(self, generator, eta):
+        return {}
+
+
+def run(scheduler_name="PNDM", num_steps=20, batch=2, **kwargs):
+    pipe = TinyPipeline(SCHEDULERS[scheduler_name]())
+    embeds = torch.zeros(batch, 77, 8)
+    output = sample(pipe, embeds, embeds, guidance_scales=[7.5] * batch, seeds=list(range(batch)),
+                    num_inference_steps=num_steps, height=64, width=64, output_type="latent", **kwargs)
+    return pipe, output
+
+
+@pytest.mark.parametrize("name", sorted(SCHEDULERS))
+def test_predicted_x0_recovers_clean_latent(name):
+    scheduler = SCHEDULERS[name]()
+    scheduler.set_timesteps(20)
+    generator = torch.Generator().manual_seed(0)
+    x0 = torch.randn(1, 4, 8, 8, generator=generator)
+    eps = torch.randn(1, 4, 8, 8, generator=generator)
+    step = 5
+    t = scheduler.timesteps[step]
+    if float(scheduler.init_noise_sigma) != 1.0:
+        latents = x0 + scheduler.sigmas[step] * eps
+    else:
+        alpha_prod = scheduler.alphas_cumprod[int(t)]
+        latents = alpha_prod ** 0.5 * x0 + (1 - alpha_prod) ** 0.5 * eps
+    assert torch.allclose(predicted_x0(scheduler, step, t, latents, eps), x0, atol=1e-4)
+
+
+def test_predicted_x0_uses_alphas_for_dpm_solver_despite_sigmas():
+    scheduler = SCHEDULERS["DPMSolver"]()
+    scheduler.set_timesteps(20)
+    assert hasattr(scheduler, "sigmas")
+    t = scheduler.timesteps[3]
+    alpha_prod = scheduler.alphas_cumprod[int(t)]
+    x0, eps = torch.ones(1, 4, 8, 8), torch.full((1, 4, 8, 8), 0.5)
+    latents = alpha_prod ** 0.5 * x0 + (1 - alpha_prod) ** 0.5 * eps
+    assert torch.allclose(predicted_x0(scheduler, 3, t, latents, eps), x0, atol=1e-4)
+
+
+@pytest.mark.parametrize("name", ["PNDM", "DDIM", "Euler"])
+def test_steps_used_never_exceeds_requested_steps(name):
+    pipe, output = run(name, num_steps=20)
+    assert output.steps_used == [20, 20]
+    # PNDM evaluates the UNet once more than it has denoising steps
+    assert len(pipe.unet.calls) == len(pipe.scheduler.timesteps)
+
+
+def test_early_exit_steps_are_within_bounds():
+    _, output = run("PNDM", num_steps=20, early_exit_threshold=0.5, min_steps=4)
+    assert all(4 <= steps <= 20 for steps in output.steps_used)
+
+
+def test_guidance_active_end_fraction_and_window():
+    assert [guidance_active(step, 10, 0.6) for step in range(10)] == [True] * 6 + [False] * 4
+    assert [guidance_active(step, 10, (0.2, 0.5)) for step in range(10)] == [False] * 2 + [True] * 3 + [False] * 5
+    assert all(guidance_active(step, 10, None) for step in range(10))
+
+
+def test_guidance_interval_counts_match_unet_calls():
+    pipe, output = run("PNDM", num_steps=20, batch=2, guidance_interval=0.5)
+    assert output.unet_calls == len(pipe.unet.calls) == 21
+    assert output.guided_steps == sum(guidance_active(step, 21, 0.5) for step in range(21))
+    assert output.unet_rows == sum(pipe.unet.calls)
+    assert output.unet_rows == 4 * output.guided_steps + 2 * (21 - output.guided_steps)
@@ -0,0 +1,45 @@
+import pytest
+
+from common.spell_corrector import SpellCorrector, edit_distance
+
+WORD_COUNTS = {"the": 500, "garden": 40, "japanese": 10, "bridge": 30, "red": 60, "bride": 5, "over": 80,
+               "pond": 8, "cyber": 3}
+
+
+@pytest.fixture
+def corrector():
+    return SpellCorrector(WORD_COUNTS, protected_terms={"koi"})
+
+
+@pytest.mark.parametrize("a, b, distance", [
+    ("garden", "garden", 0),
+    ("gardn", "garden", 1),
+    ("gadren", "garden", 1),  # transposition counts as one edit
+    ("gradn", "garden", 2),
+    ("brdige", "bridge", 1),
+    ("abc", "abcdef", 3),  # length gap alone exceeds the maximum
+])
+def test_edit_distance(a, b, distance):
+    assert edit_distance(a, b) == distance
+
+
+def test_corrects_and_keeps_case_and_punctuation(corrector):
+    assert corrector.correct("A Japanse gardn, with a RED brdige!") == "A Japanese garden, with a RED bridge!"
+
+
+def test_prefers_most_frequent_candidate_at_smallest_distance(corrector):
+    # "bridg" is one edit from both "bridge" (30) and "bride" (5)
+    assert corrector.correct_word("bridg") == "bridge"
+    assert corrector.correct_word("pnd") == "pond"
+
+
+def test_leaves_known_protected_and_unmatched_words(corrector):
+    assert corrector.correct("koi over the pond") == "koi over the pond"
+    assert corrector.correct("cyberpunk xylophone") == "cyberpunk xylophone"
+    assert corrector.correct("don't x") == "don't x"
+
+
+def test_word_results_are_memoized(corrector):
+    corrector.correct("gardn gardn gardn")
+    info = corrector.correct_word.cache_info()
+    assert (info.misses, info.hits) == (1, 2)
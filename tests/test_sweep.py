@@ -0,0 +1,142 @@
+import json
+from concurrent.futures import Future
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("diffusers")
+
+from milestone2 import sweep
+
+
+def make_spec(tmp_path, **overrides):
+    spec = dict(sweep.SPEC_DEFAULTS, name="test", output_dir=str(tmp_path / "out"), prompts=["a koi pond", "a bridge"],
+                cfg_scales=[3.0, 7.5], max_batch_size=4, clip_score=False)
+    spec["filename"] = "p{prompt_index}_cfg{cfg}_seed{seed}.png"
+    return dict(spec, **overrides)
+
+
+def test_cell_id_ignores_unset_parameters_and_output_path(tmp_path):
+    cell = sweep.expand_cells(make_spec(tmp_path))[0]
+    legacy = {k: v for k, v in cell.items() if v is not None and k not in ("cell_id", "file")}
+    assert sweep.cell_id(legacy) == cell["cell_id"]
+    assert sweep.cell_id(dict(cell, file="elsewhere.png")) == cell["cell_id"]
+    assert sweep.cell_id(dict(cell, cfg=5.0)) != cell["cell_id"]
+    assert sweep.cell_id(dict(cell, deep_cache=2)) != cell["cell_id"]
+
+
+def test_expand_cells_rejects_colliding_filenames(tmp_path):
+    assert len(sweep.expand_cells(make_spec(tmp_path, seeds=[0, 1]))) == 8
+    with pytest.raises(ValueError):
+        sweep.expand_cells(make_spec(tmp_path, seeds=[0, 1], filename="p{prompt_index}_cfg{cfg}.png"))
+
+
+def test_plan_batches_splits_by_loop_settings_and_size(tmp_path):
+    cells = sweep.expand_cells(make_spec(tmp_path, steps=[10, 20], seeds=[0, 1, 2]))
+    batches = sweep.plan_batches(cells, 4)
+    assert sorted(len(batch) for batch in batches) == [4, 4, 4, 4, 4, 4]
+    assert all(len({sweep.batch_key(cell) for cell in batch}) == 1 for batch in batches)
+
+
+def test_read_manifest_skips_torn_lines(tmp_path):
+    path = tmp_path / sweep.MANIFEST_NAME
+    path.write_text('{"cell_id": "a", "seconds": 1}\n\n{"cell_id": "a", "seconds": 2}\n{"cell_id": "b", "sec')
+    assert sweep.read_manifest(path) == {"a": {"cell_id": "a", "seconds": 2}}
+
+
+class FakeWriter:
+    """Writes a placeholder file synchronously instead of encoding an image"""
+
+    def __init__(self, *args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def submit(self, image, path, metadata=None):
+        with open(path, "w") as f:
+            f.write(image)
+        future = Future()
+        future.set_result(path)
+        return future
+
+
+@pytest.fixture
+def generated(monkeypatch):
+    """Stands in for the model: records the cells of every generated batch"""
+    batches = []
+
+    def run_batch(pipe, embedding_cache, batch):
+        batches.append(batch)
+        return [cell["cell_id"] for cell in batch], [cell["steps"] for cell in batch], 2.0 * len(batch)
+
+    monkeypatch.setattr(sweep, "run_batch", run_batch)
+    monkeypatch.setattr(sweep, "ImageWriter", FakeWriter)
+    monkeypatch.setattr(sweep, "PromptEmbeddingCache", lambda pipe, model_id: None)
+    monkeypatch.setattr(sweep, "store_results", lambda spec, records, fids=(): 1)
+    return batches
+
+
+def fake_pipe():
+    return SimpleNamespace(scheduler=SimpleNamespace(config={}), performance_profile="test")
+
+
+def test_resume_runs_only_unfinished_cells(tmp_path, generated):
+    spec = make_spec(tmp_path)
+    records = sweep.run_sweep(spec, pipe=fake_pipe())
+    assert len(records) == 4 and len(generated) == 1
+    assert all(record["seconds"] == 2.0 and record["batch_size"] == 4 for record in records)
+
+    # Lose one image: only that cell is generated again
+    lost = records[1]
+    Path(lost["file"]).unlink()
+    records = sweep.run_sweep(spec, pipe=fake_pipe())
+    assert [cell["cell_id"] for cell in generated[1]] == [lost["cell_id"]]
+    assert [r["cell_id"] for r in records] == [c["cell_id"] for c in sweep.expand_cells(spec)]
+
+    # Nothing left to do: no generation at all
+    sweep.run_sweep(spec, pipe=fake_pipe())
+    assert len(generated) == 2
+
+    sweep.run_sweep(spec, pipe=fake_pipe(), fresh=True)
+    assert len(generated) == 3 and len(generated[2]) == 4
+    manifest = (tmp_path / "out" / sweep.MANIFEST_NAME).read_text().splitlines()
+    assert len(manifest) == 4 and all(json.loads(line)["file"] for line in manifest)
+
+
+def test_fresh_forgets_only_its_own_cells(tmp_path, generated):
+    cfg = make_spec(tmp_path)
+    steps = make_spec(tmp_path, name="steps", cfg_scales=[7.5], steps=[10], seeds=[0, 1],
+                      filename="steps_p{prompt_index}_seed{seed}.png")
+    sweep.run_sweep(cfg, pipe=fake_pipe())
+    sweep.run_sweep(steps, pipe=fake_pipe())
+    assert len(generated) == 2
+
+    sweep.run_sweep(steps, pipe=fake_pipe(), fresh=True)
+    assert len(generated) == 3
+    sweep.run_sweep(cfg, pipe=fake_pipe())
+    assert len(generated) == 3  # the cfg sweep's cells survived the other sweep's --fresh
+
+
+def test_bundled_specs_do_not_share_output_folders():
+    specs = [json.loads(path.read_text()) for path in sorted((Path(sweep.__file__).parent / "sweeps").glob("*.json"))]
+    output_dirs = [spec["output_dir"] for spec in specs]
+    assert len(set(output_dirs)) == len(output_dirs)
+
+
+def test_unwritten_cells_are_named(tmp_path, generated, monkeypatch):
+    class FailingWriter(FakeWriter):
+        def submit(self, image, path, metadata=None):
+            future = Future()
+            future.set_exception(OSError("disk full"))
+            return future
+
+    monkeypatch.setattr(sweep, "ImageWriter", FailingWriter)
+    spec = make_spec(tmp_path)
+    with pytest.raises(RuntimeError, match="4 cell\\(s\\) were not written") as error:
+        sweep.run_sweep(spec, pipe=fake_pipe())
+    assert all(cell["cell_id"] in str(error.value) for cell in sweep.expand_cells(spec))